@@ -0,0 +1,162 @@
+import re
+import logging
+import threading
+from pathlib import Path
+from difflib import SequenceMatcher
+from typing import Any, Dict, List, NamedTuple, Tuple
+
+logger = logging.getLogger(__name__)
+
+_SECTION = re.compile(r"^##\s+(.+?)\s*$")
+_DATES = re.compile(r"(\d{4}-\d{2}-\d{2})\s+to\s+(\d{4}-\d{2}-\d{2})")
+_FORMULA = re.compile(r"^-\s*([A-Za-z][\w ]*?)\s*=\s*(.+?)\s*$")
+_ABBREVIATION = re.compile(r"\(([A-Za-z]{2,})\)")
+_CATEGORIES = re.compile(r"Categories include\s+(.+?)\.\s*(?:\n|$)", re.IGNORECASE | re.DOTALL)
+_QUOTED = re.compile(r"['\"]([^'\"]{3,})['\"]")
+_YEAR = re.compile(r"\b(?:in|during|for|of)\s+((?:19|20)\d\d)\b", re.IGNORECASE)
+_WORDS = re.compile(r"[a-z0-9/]+")
+
+# Phrases that promise a constraint from the docs; left unresolved they send the question to the LLM.
+_PERIOD_CUES = re.compile(r"marketing calendar|campaign", re.IGNORECASE)
+_KPI_CUES = re.compile(r"\bkpi\b|definition", re.IGNORECASE)
+
+def _normalize(text: str) -> List[str]:
+    return _WORDS.findall(text.lower())
+
+def _similar(a: str, b: str, threshold: float) -> bool:
+    a, b = " ".join(_normalize(a)), " ".join(_normalize(b))
+    return a in b or b in a or SequenceMatcher(None, a, b).ratio() >= threshold
+
+class Resolution(NamedTuple):
+    constraints: Dict[str, Any]
+    complete: bool
+    unresolved: List[str]
+
+class ConstraintResolver:
+    """
+    Resolves planner constraints from the question with lookup tables built
+    from the docs at load time, so most hybrid questions skip the planner LLM.
+
+    - campaign name -> date range (sections with a `Dates: A to B` line)
+    - KPI name, abbreviation or symbol -> formula (`- AOV = ...` lines)
+    - category names (the catalog's "Categories include ..." line)
+
+    Campaign names match exactly or fuzzily (a window of the question with
+    the same number of words scoring at least `fuzzy_threshold`); without a
+    campaign, "in 1997" resolves to the whole year. A resolution is
+    incomplete when a quoted name or a calendar/KPI reference in the
+    question did not resolve; the planner then asks the LLM and keeps the
+    resolved values. An incomplete resolution carries no whole-year range,
+    since the unresolved name may be the period the LLM finds in the docs.
+    """
+    def __init__(self, periods: Dict[str, Tuple[str, str]], kpis: Dict[str, str],
+                 categories: List[str], fuzzy_threshold: float = 0.85):
+        self.periods = periods
+        self.kpis = kpis
+        self.categories = categories
+        self.fuzzy_threshold = fuzzy_threshold
+        self._lock = threading.Lock()
+        self.resolved = 0
+        self.partial = 0
+        self.unresolved = 0
+
+    @classmethod
+    def from_directory(cls, directory: str, **kwargs) -> "ConstraintResolver":
+        periods, kpis, categories = {}, {}, []
+        for path in sorted(Path(directory).glob("**/*.md")):
+            text = path.read_text(encoding="utf-8")
+            for name, lines in cls._sections(text):
+                dates = next((_DATES.search(line) for line in lines if _DATES.search(line)), None)
+                if dates:
+                    periods[name] = dates.groups()
+                for line in lines:
+                    formula = _FORMULA.match(line)
+                    if formula:
+                        aliases = {formula.group(1), re.sub(r"\s*\(.*?\)", "", name), *_ABBREVIATION.findall(name)}
+                        for alias in aliases:
+                            kpis[" ".join(_normalize(alias))] = f"{formula.group(1)} = {formula.group(2)}"
+            match = _CATEGORIES.search(text)
+            if match:
+                categories += [c.strip() for c in re.split(r",|\band\b", " ".join(match.group(1).split())) if c.strip()]
+
+        logger.info("Constraint resolver: %d periods, %d KPI aliases, %d categories",
+                    len(periods), len(kpis), len(categories))
+        return cls(periods, kpis, categories, **kwargs)
+
+    @staticmethod
+    def _sections(text):
+        name, lines = None, []
+        for line in text.splitlines():
+            header = _SECTION.match(line)
+            if header:
+                if name:
+                    yield name, lines
+                name, lines = header.group(1), []
+            elif name:
+                lines.append(line.strip())
+        if name:
+            yield name, lines
+
+    def _match_period(self, words):
+        """
+        Returns `(name, start, end)` of the best-matching campaign window, or None.
+        """
+        best = None
+        for name in self.periods:
+            target = " ".join(_normalize(name))
+            size = len(target.split())
+            for start in range(max(len(words) - size + 1, 0)):
+                score = SequenceMatcher(None, target, " ".join(words[start:start + size])).ratio()
+                if score >= self.fuzzy_threshold and (best is None or score > best[0]):
+                    best = (score, name, start, start + size)
+        return best[1:] if best else None
+
+    def resolve(self, question: str) -> Resolution:
+        words = _normalize(question)
+        constraints = {"date_ranges": [], "kpis": [], "categories": []}
+        matched_names = []
+
+        period = self._match_period(words)
+        if period:
+            name, start, end = period
+            constraints["date_ranges"].append("{} to {}".format(*self.periods[name]))
+            matched_names.append(name)
+            # Words of the campaign name are not category mentions ("Summer Beverages 1997").
+            words = words[:start] + ["|"] + words[end:]
+
+        text = f" {' '.join(words)} "
+        for alias, formula in self.kpis.items():
+            if f" {alias} " in text and formula not in constraints["kpis"]:
+                constraints["kpis"].append(formula)
+        for category in self.categories:
+            if f" {' '.join(_normalize(category))} " in text:
+                constraints["categories"].append(category)
+                matched_names.append(category)
+
+        unresolved = []
+        for quoted in _QUOTED.findall(question):
+            if not any(_similar(quoted, name, self.fuzzy_threshold) for name in matched_names):
+                unresolved.append(quoted)
+        if _PERIOD_CUES.search(question) and not period:
+            unresolved.append("period")
+        if _KPI_CUES.search(question) and not constraints["kpis"]:
+            unresolved.append("kpi")
+
+        if not period and not unresolved:
+            # A bare year means the whole year, unless an unresolved name may be the period the question means.
+            years = _YEAR.findall(question)
+            constraints["date_ranges"] += [f"{year}-01-01 to {year}-12-31" for year in dict.fromkeys(years)]
+
+        complete = not unresolved and any(constraints.values())
+        with self._lock:
+            if complete:
+                self.resolved += 1
+            elif any(constraints.values()):
+                self.partial += 1
+            else:
+                self.unresolved += 1
+        return Resolution({key: values or None for key, values in constraints.items()}, complete, unresolved)
+
+    def stats(self):
+        with self._lock:
+            return {"resolved": self.resolved, "partial": self.partial, "unresolved": self.unresolved}
@@ -0,0 +1,160 @@
+import re
+import json
+from typing import Any, Dict, List
+
+_PIECES = re.compile(r"\w+|[^\w\s]")
+_TERMS = re.compile(r"[a-z0-9]+")
+_HEADER = re.compile(r"^#{1,6}\s")
+
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "by", "for", "from", "in", "is", "it", "of", "on", "or",
+    "per", "the", "to", "was", "what", "which", "who", "with", "return", "using", "during",
+}
+
+def count_tokens(text: str) -> int:
+    """
+    Local token estimate: one token per word or punctuation mark, plus one
+    per 8 characters of long words and numbers (BPE splits those).
+    """
+    return sum(1 + len(piece) // 8 for piece in _PIECES.findall(text))
+
+def terms(text: str) -> set:
+    return {t for t in _TERMS.findall(text.lower()) if t not in STOPWORDS and len(t) > 1}
+
+def truncate_to_tokens(text: str, budget: int) -> str:
+    lines, used = [], 0
+    for line in text.splitlines():
+        cost = count_tokens(line) + 1
+        if used + cost > budget:
+            break
+        lines.append(line)
+        used += cost
+    return "\n".join(lines)
+
+class ContextPacker:
+    """
+    Fits retrieved chunks and SQL results into a per-node token budget.
+
+    Chunks are packed in retrieval order: lines already packed from an
+    earlier (overlapping) chunk are dropped, and sections whose header and
+    text share no terms with the question are cut, unless that would empty
+    the chunk. SQL results are reduced to the row count, the first rows
+    and per-column aggregates.
+    """
+    def __init__(self, budgets: Dict[str, int] = None, max_rows: int = 20):
+        self.budgets = {"planner": 500, "synthesizer": 600, **(budgets or {})}
+        self.max_rows = max_rows
+
+    def _sections(self, text):
+        sections, current = [], []
+        for line in text.splitlines():
+            if _HEADER.match(line) and current:
+                sections.append(current)
+                current = []
+            current.append(line)
+        if current:
+            sections.append(current)
+        return sections
+
+    def _trim(self, text, question_terms, seen):
+        kept = []
+        for section in self._sections(text):
+            lines = [line for line in section if line.strip() and line.strip().lower() not in seen]
+            if not lines:
+                continue
+            if question_terms and not terms(" ".join(section)) & question_terms:
+                continue
+            kept += lines
+        if not kept:
+            # Nothing matched the question: keep the unseen lines of the chunk as is.
+            kept = [line for line in text.splitlines() if line.strip() and line.strip().lower() not in seen]
+        return kept
+
+    def pack_chunks(self, chunks, question: str, budget: int) -> str:
+        question_terms = terms(question or "")
+        seen, packed, used = set(), [], 0
+        for chunk in chunks:
+            lines = self._trim(chunk.page_content, question_terms, seen)
+            if not lines:
+                continue
+            text = "\n".join(lines)
+            cost = count_tokens(text) + 1
+            if used + cost > budget:
+                text = truncate_to_tokens(text, budget - used)
+                if text:
+                    packed.append(text)
+                break
+            packed.append(text)
+            seen.update(line.strip().lower() for line in lines)
+            used += cost
+        return "\n\n".join(packed)
+
+    def summarize_sql_result(self, sql_result: Dict[str, Any], budget: int) -> str:
+        """
+        Columns, row count and error, then as many leading rows as fit in
+        `budget` (at most `max_rows`), then min/max/sum/avg of the numeric
+        columns when rows were left out. One JSON value per line.
+        """
+        if not sql_result:
+            return ""
+        rows = sql_result.get("rows") or []
+        columns = sql_result.get("columns") or []
+        rows_kept = sql_result.get("rows_kept", len(rows))
+
+        if sql_result.get("truncated"):
+            row_line = f"row_count: at least {rows_kept} (result truncated by the row/byte/time limit)"
+        else:
+            row_line = f"row_count: {rows_kept}"
+        lines = [f"columns: {json.dumps(columns, default=str)}", row_line]
+        if sql_result.get("error"):
+            lines.append(f"error: {sql_result['error']}")
+
+        aggregates = ""
+        if len(rows) > self.max_rows:
+            scope = f"the {len(rows)} rows kept" if sql_result.get("truncated") else f"all {len(rows)} rows"
+            aggregates = f"aggregates over {scope}: {json.dumps(self._aggregates(columns, rows), default=str)}"
+        used = count_tokens("\n".join(lines + [aggregates])) + 2
+
+        head = []
+        for row in rows[:self.max_rows]:
+            line = json.dumps(row, default=str)
+            cost = count_tokens(line) + 1
+            if used + cost > budget:
+                break
+            head.append(line)
+            used += cost
+
+        if head:
+            lines.append(f"rows (first {len(head)} of {len(rows)}):" if len(head) < len(rows) else "rows:")
+            lines += head
+        if len(head) < len(rows) and not aggregates:
+            scope = f"the {len(rows)} rows kept" if sql_result.get("truncated") else f"all {len(rows)} rows"
+            aggregates = f"aggregates over {scope}: {json.dumps(self._aggregates(columns, rows), default=str)}"
+        if aggregates:
+            lines.append(aggregates)
+        return "\n".join(lines)
+
+    @staticmethod
+    def _aggregates(columns, rows):
+        aggregates = {}
+        for idx, name in enumerate(columns):
+            values = [row[idx] for row in rows if isinstance(row[idx], (int, float)) and not isinstance(row[idx], bool)]
+            if values:
+                aggregates[name] = {
+                    "min": min(values), "max": max(values),
+                    "sum": round(sum(values), 4), "avg": round(sum(values) / len(values), 4),
+                }
+        return aggregates
+
+    def pack_planner(self, chunks: List, question: str) -> str:
+        return self.pack_chunks(chunks, question, self.budgets["planner"])
+
+    def pack_synthesizer(self, chunks: List, question: str, sql_result: Dict[str, Any]):
+        """
+        Returns `(rag_output, sql_output)`. The SQL summary may use up to
+        half the budget when there are chunks; the chunks get the rest.
+        """
+        budget = self.budgets["synthesizer"]
+        sql_output = self.summarize_sql_result(sql_result, budget // 2 if chunks else budget)
+        rag_output = self.pack_chunks(chunks, question, budget - count_tokens(sql_output))
+        return rag_output, sql_output
@@ -0,0 +1,220 @@
+import re
+import json
+import logging
+import threading
+from pathlib import Path
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+from sklearn.pipeline import make_pipeline
+from sklearn.linear_model import LogisticRegression
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.model_selection import StratifiedKFold, cross_val_predict
+
+logger = logging.getLogger(__name__)
+
+ROUTES = ["rag", "sql", "hybrid"]
+ROUTER_LABELS = Path(__file__).resolve().parents[1] / "data" / "router_labels.jsonl"
+# How a prediction was reached: rules and model agree, or the stronger of two disagreeing votes won.
+VOTES = ["agree", "rule", "model"]
+
+# Phrases that point at the docs (policy, KPI definitions, marketing calendar, catalog).
+DOC_SIGNALS = re.compile(
+    r"according to|per the|as defined|definition|defined in|the (?:kpi|policy|catalog|calendar|docs?)\b"
+    r"|marketing calendar|kpi docs?|policy|campaign|'[^']*\b(?:19|20)\d\d'",
+    re.IGNORECASE,
+)
+# Phrases that need a computation over the database.
+COMPUTE_SIGNALS = re.compile(
+    r"\b(?:total|sum|revenue|average order value|aov|margin|quantity|units|count|how many|number of"
+    r"|top \d+|highest|lowest|most|least|compute|calculate)\b|sum\(",
+    re.IGNORECASE,
+)
+# Questions about what the docs say, not about the data.
+LOOKUP_SIGNALS = re.compile(
+    r"return window|return policy|to return|how is .+ defined|what formula|formula does|what are the dates"
+    r"|which categories does|focus on|approximated",
+    re.IGNORECASE,
+)
+# A lookup question turns into a computation once it asks about a period or result.
+DATA_SCOPE = re.compile(r"\b(?:19|20)\d\d\b|during|compute|calculate|top \d+|which (?:customer|product|category) had", re.IGNORECASE)
+
+def load_labeled_questions(path: str) -> Tuple[List[str], List[str]]:
+    """
+    Reads {"question", "route"} records; records without a route use the
+    rag_/sql_/hybrid_ prefix of their id (as in the eval file).
+    """
+    questions, routes = [], []
+    with open(path, "r", encoding="utf-8") as file:
+        for line in file:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            route = record.get("route") or str(record.get("id", "")).split("_", 1)[0]
+            if route in ROUTES:
+                questions.append(record["question"])
+                routes.append(route)
+    return questions, routes
+
+class FastRouter:
+    """
+    Local route classifier that answers confident cases without an LLM call.
+
+    Signal-phrase rules (the ones listed in ROUTER_PROMPT) are combined
+    with a TF-IDF + logistic regression model trained on labeled
+    questions. `predict` returns a route and a confidence; the router node
+    only trusts it at or above `threshold`.
+
+    The confidence is calibrated on held-out labels: `fit` cross-validates
+    the model, and each kind of vote (agree / rule wins / model wins) gets
+    its add-one smoothed accuracy over the held-out predictions. Without
+    enough labels to cross-validate, the winning vote's own confidence is
+    used.
+    """
+    def __init__(self, threshold: float = 0.8, shadow_rate: float = 0.0):
+        self.threshold = threshold
+        self.shadow_rate = shadow_rate
+        self.model = None
+        self.calibration: Dict[str, float] = {}
+        self.heldout_accuracy = None
+
+        self._lock = threading.Lock()
+        self.fast_routes = 0
+        self.llm_routes = 0
+        self.compared = 0
+        self.agreed = 0
+        self.fast_time = 0.0
+        self.llm_time = 0.0
+
+    @staticmethod
+    def _pipeline():
+        return make_pipeline(
+            TfidfVectorizer(ngram_range=(1, 2), sublinear_tf=True),
+            LogisticRegression(max_iter=1000, C=10.0),
+        )
+
+    def fit(self, questions: List[str], routes: List[str], folds: int = 5):
+        self.model = self._pipeline().fit(questions, routes)
+        self._calibrate(questions, routes, folds)
+        return self
+
+    def _calibrate(self, questions, routes, folds):
+        folds = min(folds, min(Counter(routes).values()))
+        if folds < 2:
+            self.calibration, self.heldout_accuracy = {}, None
+            return
+
+        cv = StratifiedKFold(folds, shuffle=True, random_state=0)
+        probs = cross_val_predict(self._pipeline(), questions, routes, cv=cv, method="predict_proba")
+        classes = sorted(set(routes))
+        correct, total = Counter(), Counter()
+        for question, route, p in zip(questions, routes, probs):
+            predicted, vote = self._vote(*self.rule_route(question), classes[p.argmax()], float(p.max()))
+            correct[vote] += predicted == route
+            total[vote] += 1
+
+        self.calibration = {vote: (correct[vote] + 1) / (total[vote] + 2) for vote in VOTES}
+        self.heldout_accuracy = sum(correct.values()) / len(routes)
+        logger.info("FastRouter held-out accuracy %.3f, calibration %s", self.heldout_accuracy,
+                    {vote: round(conf, 3) for vote, conf in self.calibration.items()})
+
+    @classmethod
+    def from_labeled_files(cls, paths: List[str], **kwargs):
+        questions, routes = [], []
+        for path in paths:
+            if not path:
+                continue
+            if not Path(path).exists():
+                logger.warning("Router labels file %s not found; it is skipped", path)
+                continue
+            q, r = load_labeled_questions(path)
+            questions += q
+            routes += r
+
+        router = cls(**kwargs)
+        if len(set(routes)) > 1:
+            router.fit(questions, routes)
+        else:
+            logger.warning("FastRouter has too few labeled questions to train its model; routing with rules only")
+        logger.info("FastRouter trained on %s labeled questions", len(questions))
+        return router
+
+    @staticmethod
+    def rule_route(question: str) -> Tuple[Optional[str], float]:
+        doc = bool(DOC_SIGNALS.search(question))
+        compute = bool(COMPUTE_SIGNALS.search(question))
+        lookup = bool(LOOKUP_SIGNALS.search(question)) and not DATA_SCOPE.search(question)
+
+        if lookup:
+            return "rag", 0.95
+        if doc and compute:
+            return "hybrid", 0.9
+        if doc:
+            return "rag", 0.8
+        if compute:
+            return "sql", 0.85
+        return None, 0.0
+
+    @staticmethod
+    def _vote(rule, rule_conf, model_route, model_conf) -> Tuple[str, str]:
+        if rule is None:
+            return model_route, "model"
+        if rule == model_route:
+            return rule, "agree"
+        # Disagreement keeps the stronger vote.
+        if rule_conf >= model_conf:
+            return rule, "rule"
+        return model_route, "model"
+
+    def predict(self, question: str) -> Tuple[Optional[str], float]:
+        rule, rule_conf = self.rule_route(question)
+        if self.model is None:
+            return rule, rule_conf
+
+        probs = self.model.predict_proba([question])[0]
+        best = probs.argmax()
+        model_route, model_conf = str(self.model.classes_[best]), float(probs[best])
+
+        route, vote = self._vote(rule, rule_conf, model_route, model_conf)
+        if vote in self.calibration:
+            return route, self.calibration[vote]
+        own = {"agree": max(rule_conf, model_conf), "rule": rule_conf, "model": model_conf}
+        return route, own[vote]
+
+    def record_fast(self, elapsed: float):
+        with self._lock:
+            self.fast_routes += 1
+            self.fast_time += elapsed
+
+    def record_llm(self, elapsed: float, fast_route: Optional[str], llm_route: str):
+        with self._lock:
+            self.llm_routes += 1
+            self.llm_time += elapsed
+            if fast_route is not None:
+                self.compared += 1
+                self.agreed += fast_route == llm_route
+
+    def stats(self):
+        with self._lock:
+            avg_llm = self.llm_time / self.llm_routes if self.llm_routes else None
+            avg_fast = self.fast_time / self.fast_routes if self.fast_routes else 0.0
+            return {
+                "fast_routes": self.fast_routes,
+                "llm_routes": self.llm_routes,
+                "agreement": round(self.agreed / self.compared, 3) if self.compared else None,
+                "compared": self.compared,
+                "avg_fast_ms": round(avg_fast * 1000, 3),
+                "avg_llm_ms": round(avg_llm * 1000, 1) if avg_llm is not None else None,
+                "est_saved_s": round(self.fast_routes * (avg_llm - avg_fast), 2) if avg_llm is not None else None,
+                "heldout_accuracy": round(self.heldout_accuracy, 3) if self.heldout_accuracy is not None else None,
+            }
+
+if __name__ == "__main__":
+    # Calibration on the training labels, then agreement on the eval questions (not part of the labels).
+    router = FastRouter.from_labeled_files([str(ROUTER_LABELS)])
+    print(f"held-out accuracy: {router.heldout_accuracy:.3f}, calibration: {router.calibration}")
+
+    eval_questions, eval_routes = load_labeled_questions("sample_questions_hybrid_eval.jsonl")
+    for question, route in zip(eval_questions, eval_routes):
+        predicted, confidence = router.predict(question)
+        fast = "fast" if confidence >= router.threshold else "llm"
+        print(f"{route:<7}{predicted:<7}{confidence:>6.3f}  {fast}  {question[:70]}")
@@ -1,184 +1,315 @@
+import time
+import random
+import asyncio
+import inspect
 import logging
-from langgraph.graph import StateGraph, END
+from contextlib import nullcontext
+from langgraph.graph import StateGraph, START, END
 from langchain_core.runnables import RunnableConfig
 
 from .models import AgentState, RouterState, ConstraintPlan, SQLGeneration, SQLExecutionResult, SynthesizerOutput
 from .prompts import ROUTER_PROMPT, PLANNER_PROMPT, SQL_PROMPT, SYNTH_PROMPT
-from helper.clients import groq_llm, ollama_llm, retriever, db
-
-logging.basicConfig(
-    filename="logs/agentlog.log",
-    format='%(asctime)s %(levelname)s %(message)s',
-    filemode='a',
-    level=logging.INFO)
-
-logger = logging.getLogger()
-
-def router_node(state: AgentState, config: RunnableConfig) -> AgentState:
-    question = state["question"]
+from .sql_templates import format_examples
+from .retry_policy import RetryPolicy
+from .streaming import RunEvents
+from helper.clients import get_llm, get_retriever, get_db, get_table_names, get_llm_cache, get_sql_validator, get_fast_router, get_constraint_resolver, get_tracer, get_context_packer, get_sql_templates, get_retry_policy
+from helper.tracing import span
+from helper.logging_setup import setup_logging
+
+setup_logging()
+
+logger = logging.getLogger(__name__)
+
+def model_id(llm) -> str:
+    name = getattr(llm, "model", None) or getattr(llm, "model_name", None)
+    return f"{type(llm).__name__}:{name}"
+
+def invoke_structured(prompt, schema, inputs, config: RunnableConfig):
+    """
+    Runs `prompt | llm.with_structured_output(schema)`, reading through the
+    optional `llm_cache` from the config. Answers from a gateway fallback
+    backend are not cached under the primary model's key.
+    """
     llm = config["configurable"].get("llm")
-
-    router_chain = ROUTER_PROMPT | llm.with_structured_output(RouterState)
-    out = router_chain.invoke(question)
-
-    state["route"] = out.route
-    logger.info(f"router_node: {out=}")
-    return state
-
-def retriever_node(state: AgentState, config: RunnableConfig) -> AgentState:
+    cache = config["configurable"].get("llm_cache")
+
+    with span(f"llm.{schema.__name__}", kind="llm", model=model_id(llm)) as llm_span:
+        if cache is None:
+            return _invoke_llm(prompt, schema, inputs, llm, llm_span)["parsed"]
+
+        key = cache.make_key(model_id(llm), prompt.template, prompt.format(**inputs), schema.__name__)
+        cached = cache.get(key)
+        llm_span.set(cache_hit=cached is not None)
+        if cached is not None:
+            return schema.model_validate_json(cached)
+
+        out = _invoke_llm(prompt, schema, inputs, llm, llm_span)
+        if not out.get("fallback"):
+            cache.set(key, out["parsed"].model_dump_json())
+        return out["parsed"]
+
+def _invoke_llm(prompt, schema, inputs, llm, llm_span):
+    # include_raw keeps the AIMessage so its token usage can be recorded.
+    out = (prompt | llm.with_structured_output(schema, include_raw=True)).invoke(inputs)
+    if out.get("parsing_error") is not None:
+        raise out["parsing_error"]
+    if out.get("parsed") is None:
+        raise ValueError(f"LLM returned no {schema.__name__}")
+
+    usage = getattr(out["raw"], "usage_metadata", None) or {}
+    llm_span.set(prompt_tokens=usage.get("input_tokens", 0), completion_tokens=usage.get("output_tokens", 0))
+    if "backend" in out:
+        llm_span.set(backend=out["backend"], fallback=out["fallback"])
+    return out
+
+def traced(name, node):
+    """
+    Wraps a graph node in a `node` span under the run's root span, when the config carries a tracer.
+    """
+    takes_config = "config" in inspect.signature(node).parameters
+
+    def run(state: AgentState, config: RunnableConfig):
+        tracer = config["configurable"].get("tracer")
+        context = nullcontext() if tracer is None else tracer.span(
+            name, parent=config["configurable"].get("trace"), kind="node", attempt_count=state.get("attempt_count", 0)
+        )
+        with context:
+            return node(state, config) if takes_config else node(state)
+
+    run.__name__ = node.__name__
+    return run
+
+def router_node(state: AgentState, config: RunnableConfig) -> dict:
+    question = state["question"]
+    fast_router = config["configurable"].get("fast_router")
+
+    fast_route = None
+    if fast_router is not None:
+        started = time.perf_counter()
+        fast_route, confidence = fast_router.predict(question)
+        elapsed = time.perf_counter() - started
+
+        # A `shadow_rate` share of confident routes still goes to the LLM to keep measuring agreement.
+        if confidence >= fast_router.threshold and random.random() >= fast_router.shadow_rate:
+            fast_router.record_fast(elapsed)
+            logger.info("router_node: fast route=%s confidence=%.3f", fast_route, confidence)
+            return {"route": fast_route}
+
+    started = time.perf_counter()
+    out = invoke_structured(ROUTER_PROMPT, RouterState, {"query": question}, config)
+    if fast_router is not None:
+        fast_router.record_llm(time.perf_counter() - started, fast_route, out.route)
+        logger.info("router_node: llm route=%s fast route=%s", out.route, fast_route, extra={"agree": fast_route == out.route})
+
+    return {"route": out.route}
+
+def retriever_node(state: AgentState, config: RunnableConfig) -> dict:
+    # Runs alongside the router (speculatively); SQL-only routes ignore the result.
     question = state["question"]
     retriever = config["configurable"].get("retriever") 
 
-    state["retrieved_docs"] = retriever.query(question, 4)
-    logger.info(f"retriever_node: {state["retrieved_docs"]=}")
-    return state
+    retrieved_docs = retriever.query(question, 4)
+    logger.info("retriever_node: %d chunks", len(retrieved_docs), extra={"chunks": [(d.metadata.get("source"), d.metadata.get("chunk_id"), d.score) for d in retrieved_docs]})
+    return {"retrieved_docs": retrieved_docs}
 
-def planner_node(state: AgentState, config: RunnableConfig) -> AgentState:
-    chunks_text = "\n\n".join([doc.page_content for doc in state["retrieved_docs"]])
-    llm = config["configurable"].get("llm")
-
-    planner_chain = PLANNER_PROMPT | llm.with_structured_output(ConstraintPlan)
-    constraints = planner_chain.invoke({"chunks": chunks_text})
-    
-    state["constraints"] = constraints.model_dump()
-    logger.info(f"retriever_node: {state["constraints"]=}")
-    return state
-
-def nl_to_sql_node(state: AgentState, config: RunnableConfig) -> AgentState:
-    question = state["question"]
-    constraints = state.get("constraints", {})
-    sql_error = state.get("sql_result", {}).get("error")
-    sql_query = state.get("sql_query", "")
-
-    llm = config["configurable"].get("llm")
+def schema_node(state: AgentState, config: RunnableConfig) -> dict:
     db = config["configurable"].get("db")
 
+    schema_str = ""
     try:
-        db.connect()
         schema_str = db.extract_schema(state["table_names"])
     except Exception as e:
-        logger.error(f"nl_to_sql_node: {e}")
-    finally:
-        db.disconnect()
+        logger.error("schema_node: %s", e)
+    return {"schema": schema_str}
+
+def planner_node(state: AgentState, config: RunnableConfig) -> dict:
+    resolver = config["configurable"].get("constraint_resolver")
+    resolution = resolver.resolve(state["question"]) if resolver is not None else None
+    if resolution is not None and resolution.complete:
+        logger.info("planner_node: constraints resolved from the docs", extra={"constraints": resolution.constraints})
+        return {"constraints": resolution.constraints}
+
+    packer = config["configurable"].get("context_packer")
+    chunks_text = packer.pack_planner(state["retrieved_docs"], state["question"])
+
+    constraints = invoke_structured(PLANNER_PROMPT, ConstraintPlan, {"chunks": chunks_text}, config).model_dump()
+    if resolution is not None:
+        # Values looked up in the docs beat the LLM's; it only fills what did not resolve.
+        constraints.update({key: values for key, values in resolution.constraints.items() if values})
 
-    nl_to_sql_chain = SQL_PROMPT | llm.with_structured_output(SQLGeneration)
-    result = nl_to_sql_chain.invoke({
-        "schema": schema_str,
+    logger.info("planner_node: constraints", extra={"constraints": constraints})
+    return {"constraints": constraints}
+
+def nl_to_sql_node(state: AgentState, config: RunnableConfig) -> dict:
+    question = state["question"]
+    constraints = state.get("constraints") or {}
+    sql_error = state.get("sql_feedback")
+    sql_query = state.get("sql_query") or ""
+    templates = config["configurable"].get("sql_templates")
+
+    examples = None
+    # Retries fix the previous SQL, so templates are only consulted on the first attempt.
+    if templates is not None and not sql_error:
+        match = templates.match(question, constraints, state.get("format_hint"))
+        if match.sql is not None:
+            logger.info("nl_to_sql_node: reused SQL template (score=%.3f)", match.score, extra={"sql": match.sql})
+            return {"sql_query": match.sql, "sql_source": "template"}
+        examples = match.examples
+
+    result = invoke_structured(SQL_PROMPT, SQLGeneration, {
+        "schema": state.get("schema", ""),
         "constraints": constraints,
+        "examples": format_examples(examples),
         "question": question,
         "error": sql_error,
         "previous_sql": sql_query
-    })
+    }, config)
+
+    logger.info("nl_to_sql_node: generated SQL", extra={"sql": result.sql})
+    return {"sql_query": result.sql, "sql_source": "llm"}
+
+def sql_validator_node(state: AgentState, config: RunnableConfig) -> dict:
+    validator = config["configurable"].get("sql_validator")
+    if validator is None:
+        return {"sql_validation": {"ok": True}}
 
-    state["sql_query"] = result.sql
-    logger.info(f"nl_to_sql_node: {state["sql_query"]=}")
-    return state
+    with span("sql_validate", kind="db"):
+        result = validator.validate(state["sql_query"], state["table_names"])
+    update = {"sql_query": result.sql, "sql_validation": result._asdict()}
+    if not result.ok:
+        update["sql_result"] = SQLExecutionResult(error=f"Validation error: {result.error}").model_dump()
+    logger.info("sql_validator_node: ok=%s", result.ok, extra={"error": result.error, "warnings": result.warnings})
+    return update
 
-def sql_executor_node(state: AgentState, config: RunnableConfig) -> AgentState:
+def sql_executor_node(state: AgentState, config: RunnableConfig) -> dict:
     sql_query = state["sql_query"]
     db = config["configurable"].get("db")
 
     try:
-        db.connect()
-        rows, col_names, error = db.execute_query(sql_query)
-        result = SQLExecutionResult(columns=col_names, rows=rows, error=str(error))
+        with span("db_query", kind="db") as db_span:
+            rows, col_names, error, truncated, rows_kept = db.execute_query(sql_query)
+            db_span.set(rows_kept=rows_kept, truncated=truncated, error=error is not None)
+        templates = config["configurable"].get("sql_templates")
+        if templates is not None and error is None and not truncated and state.get("sql_source") == "llm":
+            templates.add(state["question"], state.get("constraints"), sql_query, col_names, rows, state.get("format_hint"))
+        result = SQLExecutionResult(columns=col_names, rows=rows, error=str(error) if error is not None else None, truncated=truncated, rows_kept=rows_kept)
     except Exception as e:
-        logger.error(f"sql_executor_node: {e}")
+        logger.error("sql_executor_node: %s", e)
         result = SQLExecutionResult(columns=None, rows=None, error=str(e))
-    finally:
-        db.disconnect()
-        state["sql_result"] = result.model_dump()
-    logger.info(f"sql_executor_node: {state["sql_result"]=}")
-    return state
-
-def retry_counter_node(state: AgentState) -> AgentState:
-    state["attempt_count"] += 1
-    return state
-
-def Synthesizer_node(state: AgentState, config: RunnableConfig) -> AgentState:
-    chunks = state.get("retrieved_docs", [])
-    llm = config["configurable"].get("llm")
-    synth_chain = SYNTH_PROMPT | llm.with_structured_output(SynthesizerOutput)
+    logger.info("sql_executor_node: rows_kept=%d truncated=%s", result.rows_kept, result.truncated, extra={"error": result.error})
+    return {"sql_result": result.model_dump()}
+
+DEFAULT_RETRY_POLICY = RetryPolicy()
 
-    result = synth_chain.invoke({
+def retry_policy_node(state: AgentState, config: RunnableConfig) -> dict:
+    policy = config["configurable"].get("retry_policy") or DEFAULT_RETRY_POLICY
+    attempt_count = state["attempt_count"] + 1
+    decision = policy.decide({**state, "attempt_count": attempt_count})
+
+    update = {
+        "attempt_count": attempt_count,
+        "retry_action": decision.action,
+        "retry_cause": decision.cause,
+        "sql_feedback": decision.feedback,
+    }
+    if decision.action == "repair":
+        update["sql_query"] = decision.sql
+        update["sql_repairs"] = (state.get("sql_repairs") or []) + [decision.repair]
+    return update
+
+def route_docs(state: AgentState):
+    # Docs are retrieved for every question; only RAG and hybrid routes use them.
+    if state["route"] not in ["rag", "hybrid"]:
+        return []
+    return state.get("retrieved_docs") or []
+
+def Synthesizer_node(state: AgentState, config: RunnableConfig) -> dict:
+    packer = config["configurable"].get("context_packer")
+    rag_output, sql_output = packer.pack_synthesizer(route_docs(state), state["question"], state.get("sql_result") or {})
+
+    result = invoke_structured(SYNTH_PROMPT, SynthesizerOutput, {
         "format_hint": state["format_hint"],
         "question": state["question"],
-        "rag_output": "\n\n".join(doc.page_content for doc in chunks),
-        "sql_output": state.get("sql_result", {}),
-    })
+        "rag_output": rag_output,
+        "sql_output": sql_output,
+    }, config)
 
-    state["final_answer"] = result.final_answer
-    state["explanation"] = result.explanation
-    logger.info(f"Synthesizer_node: {state["final_answer"]=}")
-    return state
+    logger.info("Synthesizer_node: answered", extra={"final_answer": result.final_answer})
+    return {"final_answer": result.final_answer, "explanation": result.explanation}
 
-def format_output(state: AgentState, config: RunnableConfig) -> AgentState:
-    state["citations"] = []
+def join_node(state: AgentState) -> dict:
+    return {}
+
+def format_output(state: AgentState, config: RunnableConfig) -> dict:
+    citations = []
     rag_score = 1
     sql_score = 1
     rows_score = 1
 
-    if state["route"] in ["rag", "hybrid"] and state.get("retrieved_docs", []):
-        chunks = state.get("retrieved_docs", [])
-        state["citations"] += [f"{chunk.metadata["source"]}:chunk_{chunk.metadata["chunk_id"]}" for chunk in chunks] 
-        rag_score = sum([chunk.metadata["score"] for chunk in chunks]) / len(chunks)
+    chunks = route_docs(state)
+    if chunks:
+        citations += [f"{chunk.metadata['source']}:chunk_{chunk.metadata['chunk_id']}" for chunk in chunks] 
+        rag_score = sum([chunk.score for chunk in chunks]) / len(chunks)
 
     if state["route"] in ["sql", "hybrid"] and state["table_names"]:
-        state["citations"] += state["table_names"]
-        sql_score = 1 if not state.get("sql_result", {}).get("error") else 0
-        rows_score = 1 if state["sql_result"].get("rows", {}) else 0
+        citations += state["table_names"]
+        sql_score = 1 if not (state.get("sql_result") or {}).get("error") else 0
+        rows_score = 1 if (state.get("sql_result") or {}).get("rows", {}) else 0
 
-    state["confidence"] = round((rag_score + sql_score + rows_score) / 3, 3)
-    return state
+    return {"citations": citations, "confidence": round((rag_score + sql_score + rows_score) / 3, 3)}
 
 graph_agent = StateGraph(AgentState)
 
-graph_agent.add_node("router", router_node)
-graph_agent.add_node("retriever", retriever_node)
-graph_agent.add_node("planner", planner_node)
-graph_agent.add_node("nl_to_sql", nl_to_sql_node)
-graph_agent.add_node("sql_executor", sql_executor_node)
-graph_agent.add_node("retry_counter", retry_counter_node)
-graph_agent.add_node("Synthesizer", Synthesizer_node)
-graph_agent.add_node("format_output", format_output)
-
-graph_agent.set_entry_point("router")
+graph_agent.add_node("router", traced("router", router_node))
+graph_agent.add_node("retriever", traced("retriever", retriever_node))
+graph_agent.add_node("schema", traced("schema", schema_node))
+graph_agent.add_node("planner", traced("planner", planner_node))
+graph_agent.add_node("nl_to_sql", traced("nl_to_sql", nl_to_sql_node))
+graph_agent.add_node("sql_validator", traced("sql_validator", sql_validator_node))
+graph_agent.add_node("sql_executor", traced("sql_executor", sql_executor_node))
+graph_agent.add_node("retry_policy", traced("retry_policy", retry_policy_node))
+graph_agent.add_node("Synthesizer", traced("Synthesizer", Synthesizer_node))
+graph_agent.add_node("format_output", traced("format_output", format_output))
+
+# Routing, retrieval and schema loading don't depend on each other: they run
+# in the same step and the graph continues once all three have finished.
+graph_agent.add_edge(START, "router")
+graph_agent.add_edge(START, "retriever")
+graph_agent.add_edge(START, "schema")
+
+graph_agent.add_node("join", join_node)
+graph_agent.add_edge(["router", "retriever", "schema"], "join")
 
 graph_agent.add_conditional_edges(
-    "router",
-    lambda x: "rag" if x["route"] in ["rag", "hybrid"] else "sql",
+    "join",
+    lambda x: x["route"],
     {
-        "rag": "retriever",
-        "sql": "nl_to_sql"
+        "rag": "Synthesizer",
+        "sql": "nl_to_sql",
+        "hybrid": "planner"
     }
 )
 
+graph_agent.add_edge("planner", "nl_to_sql")
+graph_agent.add_edge("nl_to_sql", "sql_validator")
+
 graph_agent.add_conditional_edges(
-    "retriever",
-    lambda x: "sql" if x["route"] in ["sql", "hybrid"] else "end",
+    "sql_validator",
+    lambda x: "valid" if x["sql_validation"]["ok"] else "invalid",
     {
-        "sql": "planner",
-        "end": "Synthesizer"
+        "valid": "sql_executor",
+        "invalid": "retry_policy"
     }
 )
 
-graph_agent.add_edge("planner", "nl_to_sql")
-graph_agent.add_edge("nl_to_sql", "sql_executor")
-graph_agent.add_edge("sql_executor", "retry_counter")
-
-def sql_retry(state: AgentState) -> str:
-    sql_rows = state["sql_result"].get("rows", [])
-    if sql_rows:
-        return "success"
-    elif state["attempt_count"] <= 2:
-        return "retry"
-    return "fallback"
+graph_agent.add_edge("sql_executor", "retry_policy")
 
 graph_agent.add_conditional_edges(
-    "retry_counter",
-    sql_retry,
+    "retry_policy",
+    lambda x: x["retry_action"],
     {
         "success": "Synthesizer",
+        "repair": "sql_validator",
         "retry": "nl_to_sql",
         "fallback": "Synthesizer"
     }
@@ -189,27 +320,107 @@ graph_agent.add_edge("format_output", END)
 
 northwind_agent = graph_agent.compile()
 
-def invoke_agent(id, question, format_hint):
+TARGET_KEYS = ["id", "final_answer", "sql_query", "confidence", "explanation", "citations"]
+
+def build_run(id, question, format_hint, llm=None, configurable=None):
+    """
+    Returns the `(input, config)` pair for one agent run, building shared clients on first use.
+    Entries in `configurable` replace the default clients (e.g. a stub `llm`).
+    """
     config = {
         "configurable": {
-            "llm": ollama_llm, # ollama_llm, groq_llm
-            "retriever": retriever, 
-            "db": db
-        },
-        "recursion_limit": 15
+            "llm": get_llm(llm),
+            "retriever": get_retriever(),
+            "db": get_db(),
+            "llm_cache": get_llm_cache(),
+            "sql_validator": get_sql_validator(),
+            "fast_router": get_fast_router(),
+            "constraint_resolver": get_constraint_resolver(),
+            "tracer": get_tracer(),
+            "context_packer": get_context_packer(),
+            "sql_templates": get_sql_templates(),
+            "retry_policy": get_retry_policy()
+        }
     }
+    config["configurable"].update(configurable or {})
+    policy = config["configurable"]["retry_policy"] or DEFAULT_RETRY_POLICY
+    config["recursion_limit"] = 6 + policy.max_steps()
 
     input = {
         "id": id,
         "question": question,
         "format_hint": format_hint,
-        "table_names": ["demo_orders", "demo_order_details", "demo_products"],
+        "table_names": get_table_names(),
         "attempt_count": 0
     }
-
-    out = northwind_agent.invoke(input, config)
-    target_keys = ["id", "final_answer", "sql_query", "confidence", "explanation", "citations"]
-    return {key: out.get(key) for key in target_keys}
+    return input, config
+
+def traced_run(id, config):
+    """
+    Root `agent` span for one question; the nodes attach to it through the config.
+    """
+    tracer = config["configurable"].get("tracer")
+    if tracer is None:
+        return nullcontext()
+    return tracer.span("agent", kind="run", id=id)
+
+def finish_run(out, config):
+    trace = config["configurable"].get("trace")
+    if trace is not None:
+        trace.set(route=out.get("route"), attempt_count=out.get("attempt_count", 0))
+    return {key: out.get(key) for key in TARGET_KEYS}
+
+def invoke_agent(id, question, format_hint, llm=None, configurable=None):
+    """
+    Runs the agent on one question. `llm` is a backend name registered in
+    `helper.clients.LLM_FACTORIES` (default: the `LLM_BACKEND` setting);
+    `configurable` overrides entries of the graph config.
+    """
+    input, config = build_run(id, question, format_hint, llm, configurable)
+    with traced_run(id, config) as trace:
+        config["configurable"]["trace"] = trace
+        out = northwind_agent.invoke(input, config)
+        return finish_run(out, config)
+
+async def ainvoke_agent(id, question, format_hint, llm=None, configurable=None):
+    """
+    Async `invoke_agent`: questions awaited together share the event loop,
+    and the parallel branches of each run overlap.
+    """
+    input, config = await asyncio.to_thread(build_run, id, question, format_hint, llm, configurable)
+    with traced_run(id, config) as trace:
+        config["configurable"]["trace"] = trace
+        out = await northwind_agent.ainvoke(input, config)
+        return finish_run(out, config)
+
+STREAM_MODES = ["updates", "messages", "values"]
+
+def stream_agent(id, question, format_hint, llm=None, configurable=None):
+    """
+    `invoke_agent` that yields events (see agent/streaming.py) as the graph
+    runs, including the synthesizer's answer token by token when the chat
+    model streams, and ends with a `final` event holding the output.
+    """
+    input, config = build_run(id, question, format_hint, llm, configurable)
+    with traced_run(id, config) as trace:
+        config["configurable"]["trace"] = trace
+        events = RunEvents()
+        for mode, payload in northwind_agent.stream(input, config, stream_mode=STREAM_MODES):
+            yield from events.feed(mode, payload)
+        yield {"event": "final", "output": finish_run(events.state, config)}
+
+async def astream_agent(id, question, format_hint, llm=None, configurable=None):
+    """
+    Async `stream_agent`.
+    """
+    input, config = await asyncio.to_thread(build_run, id, question, format_hint, llm, configurable)
+    with traced_run(id, config) as trace:
+        config["configurable"]["trace"] = trace
+        events = RunEvents()
+        async for mode, payload in northwind_agent.astream(input, config, stream_mode=STREAM_MODES):
+            for event in events.feed(mode, payload):
+                yield event
+        yield {"event": "final", "output": finish_run(events.state, config)}
 
 if __name__ == "__main__":
     id = "rag_policy_beverages_return_days"
@@ -8,8 +8,15 @@ class AgentState(TypedDict):
     route: Optional[Literal["rag", "sql", "hybrid"]]
     retrieved_docs: List[Dict[str, Any]]
     constraints: Dict[str, Any]
+    schema: Optional[str]
     sql_query: Optional[str]
+    sql_source: Optional[Literal["template", "llm"]]
+    sql_validation: Optional[Dict[str, Any]]
     sql_result: Optional[Dict[str, Any]]
+    sql_feedback: Optional[str]
+    sql_repairs: List[str]
+    retry_action: Optional[Literal["success", "repair", "retry", "fallback"]]
+    retry_cause: Optional[str]
     final_answer: Optional[str]
     error: Optional[str]
     attempt_count: int
@@ -33,6 +40,8 @@ class SQLExecutionResult(BaseModel):
     columns: Optional[List[str]] = None
     rows: Optional[List[List]] = None
     error: Optional[str] = None
+    rows_kept: int = 0
+    truncated: bool = False
 
 class SynthesizerOutput(BaseModel):
     final_answer: str
@@ -97,6 +97,7 @@ You will receive:
 - The **database schema**
 - Extracted **constraints**
 - The **user question**
+- (Optional) **Similar questions** answered before, with the SQL that worked for them
 - (Optional) An **error message** from the previous failed query
 - (Optional) The **previous SQL query** that caused the error
 
@@ -109,6 +110,9 @@ Follow the rules carefully.
 ### CONSTRAINTS (date ranges, categories, KPIs, entities)
 {constraints}
 
+### SIMILAR ANSWERED QUESTIONS (optional; adapt their SQL to this question's constraints)
+{examples}
+
 ### USER QUESTION
 {question}
 
@@ -130,6 +134,8 @@ Follow the rules carefully.
    - The error message describes exactly what to correct.
    - Maintain user intent.
 7. Never hallucinate columns or tables.
+8. If `fact_order_lines` is in the schema, prefer it over joining the demo_* tables: it already has
+   `Revenue` (UnitPrice * Quantity * (1 - Discount)), ISO `OrderDate` ('YYYY-MM-DD'), `OrderYear`, `CategoryName` and `CustomerName`.
 
 ### YOUR TASK
 Generate the corrected SQL query (or the initial SQL if no error exists).
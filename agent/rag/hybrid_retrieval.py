@@ -0,0 +1,163 @@
+import json
+import hashlib
+import logging
+import threading
+import faiss
+import numpy as np
+from pathlib import Path
+from typing import List
+from scipy import sparse
+from sklearn.feature_extraction.text import CountVectorizer
+
+from .retrieval import RetrievedChunk, top_k_indices
+
+logger = logging.getLogger(__name__)
+
+class SentenceTransformerEmbedder:
+    """
+    CPU sentence embeddings from a local sentence-transformers model.
+    """
+    def __init__(self, model_name: str = "sentence-transformers/all-MiniLM-L6-v2", batch_size: int = 32):
+        from sentence_transformers import SentenceTransformer
+
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.model = SentenceTransformer(model_name, device="cpu")
+        self.dim = self.model.get_embedding_dimension()
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        return self.model.encode(
+            texts, batch_size=self.batch_size, normalize_embeddings=True, convert_to_numpy=True
+        ).astype(np.float32)
+
+class BM25Index:
+    """
+    Okapi BM25 over a fixed chunk list, with document weights precomputed
+    into a sparse matrix so a query is one sparse dot product.
+    """
+    def __init__(self, texts: List[str], k1: float = 1.5, b: float = 0.75):
+        self.vectorizer = CountVectorizer()
+        tf = sparse.csr_matrix(self.vectorizer.fit_transform(texts), dtype=np.float64)
+
+        n_docs = tf.shape[0]
+        df = np.bincount(tf.indices, minlength=tf.shape[1])
+        self.idf = np.log((n_docs - df + 0.5) / (df + 0.5) + 1)
+
+        doc_len = np.asarray(tf.sum(axis=1)).ravel()
+        avg_len = doc_len.mean() if n_docs else 0.0
+        norm = k1 * (1 - b + b * doc_len / (avg_len or 1.0))
+
+        # w(d, t) = idf(t) * tf * (k1 + 1) / (tf + k1 * (1 - b + b * |d| / avgdl))
+        row_norm = np.repeat(norm, np.diff(tf.indptr))
+        weights = tf.copy()
+        weights.data = self.idf[tf.indices] * tf.data * (k1 + 1) / (tf.data + row_norm)
+        self.weights = weights
+
+    def scores(self, query_strs: List[str]) -> np.ndarray:
+        query_terms = self.vectorizer.transform(query_strs)
+        query_terms.data[:] = 1
+        return (query_terms @ self.weights.T).toarray()
+
+class DenseANNIndex:
+    """
+    Scalar-quantized HNSW index (faiss `IndexHNSWSQ`) over normalized embeddings.
+
+    `hnsw_m` and `ef_construction` set graph quality at build time;
+    `ef_search` trades recall for latency at query time.
+    """
+    def __init__(self, dim: int, hnsw_m: int = 32, ef_construction: int = 80, ef_search: int = 64):
+        self.dim = dim
+        self.ef_search = ef_search
+        self.index = faiss.IndexHNSWSQ(dim, faiss.ScalarQuantizer.QT_8bit, hnsw_m, faiss.METRIC_INNER_PRODUCT)
+        self.index.hnsw.efConstruction = ef_construction
+
+    def build(self, vectors: np.ndarray):
+        self.index.train(vectors)
+        self.index.add(vectors)
+
+    def search(self, vectors: np.ndarray, k: int):
+        self.index.hnsw.efSearch = max(self.ef_search, k)
+        return self.index.search(vectors, k)
+
+    def save(self, path: str):
+        faiss.write_index(self.index, str(path))
+
+    @classmethod
+    def load(cls, path: str, ef_search: int = 64):
+        ann = cls.__new__(cls)
+        ann.index = faiss.read_index(str(path))
+        ann.dim = ann.index.d
+        ann.ef_search = ef_search
+        return ann
+
+class HybridRetriever:
+    """
+    BM25 + dense ANN retriever fused with reciprocal-rank fusion.
+
+    Exposes the same `query(query_str, k)` interface as `TfidfRetriever`.
+    Each ranker contributes its top `candidates` chunks; the fused score is
+    `sum(1 / (rrf_k + rank))`, scaled so a chunk ranked first by both
+    rankers scores 1.0.
+    """
+    def __init__(self, documents, embedder, k=5, index_path: str = None, candidates: int = 20,
+                 rrf_k: int = 60, hnsw_m: int = 32, ef_construction: int = 80, ef_search: int = 64):
+        self.docs = documents
+        self.k = k
+        self.embedder = embedder
+        self.candidates = candidates
+        self.rrf_k = rrf_k
+        self._lock = threading.Lock()
+
+        texts = [doc.page_content for doc in documents]
+        self.bm25 = BM25Index(texts)
+        self.ann = self._load_or_build_ann(texts, index_path, hnsw_m, ef_construction, ef_search)
+
+    def _load_or_build_ann(self, texts, index_path, hnsw_m, ef_construction, ef_search):
+        fingerprint = hashlib.sha256(
+            json.dumps([getattr(self.embedder, "model_name", type(self.embedder).__name__), hnsw_m, texts]).encode("utf-8")
+        ).hexdigest()
+
+        if index_path:
+            index_file = Path(index_path) / "dense.faiss"
+            manifest_file = Path(index_path) / "dense.json"
+            if index_file.exists() and manifest_file.exists():
+                with open(manifest_file, "r", encoding="utf-8") as file:
+                    if json.load(file).get("fingerprint") == fingerprint:
+                        logger.info("Loaded dense index from %s", index_file)
+                        return DenseANNIndex.load(index_file, ef_search=ef_search)
+
+        ann = DenseANNIndex(self.embedder.dim, hnsw_m=hnsw_m, ef_construction=ef_construction, ef_search=ef_search)
+        ann.build(self.embedder.encode(texts))
+
+        if index_path:
+            Path(index_path).mkdir(parents=True, exist_ok=True)
+            ann.save(index_file)
+            with open(manifest_file, "w", encoding="utf-8") as file:
+                json.dump({"fingerprint": fingerprint, "n_chunks": len(texts)}, file)
+            logger.info("Built dense index in %s", index_file)
+        return ann
+
+    def _fuse(self, bm25_scores, dense_ids, k):
+        fused = np.zeros(len(self.docs))
+        for rank, idx in enumerate(top_k_indices(bm25_scores, self.candidates), 1):
+            if bm25_scores[idx] > 0:
+                fused[idx] += 1 / (self.rrf_k + rank)
+        for rank, idx in enumerate(i for i in dense_ids if i >= 0):
+            fused[idx] += 1 / (self.rrf_k + rank + 1)
+        fused *= (self.rrf_k + 1) / 2
+
+        return [
+            RetrievedChunk.from_document(self.docs[idx], round(float(fused[idx]), 4))
+            for idx in top_k_indices(fused, k or self.k)
+        ]
+
+    def query_batch(self, query_strs: List[str], k: int = None) -> List[List[RetrievedChunk]]:
+        bm25_scores = self.bm25.scores(query_strs)
+        query_vecs = self.embedder.encode(query_strs)
+        with self._lock:
+            # efSearch is index state, so searches are serialized.
+            _, dense_ids = self.ann.search(query_vecs, min(self.candidates, len(self.docs)))
+        return [self._fuse(bm25_scores[i], dense_ids[i], k) for i in range(len(query_strs))]
+
+    def query(self, query_str: str, k: int = None) -> List[RetrievedChunk]:
+        return self.query_batch([query_str], k)[0]
@@ -1,23 +1,106 @@
+import os
+import json
+import hashlib
+import logging
+import threading
+import numpy as np
+from collections import Counter
+from dataclasses import dataclass
 from pathlib import Path
+from types import MappingProxyType
+from typing import Any, List, Mapping
+from scipy import sparse
 from langchain_core.documents import Document
 from langchain_community.document_loaders import TextLoader
 from langchain_text_splitters import MarkdownHeaderTextSplitter
-from sklearn.metrics.pairwise import cosine_similarity
+from sklearn.preprocessing import normalize
 from sklearn.feature_extraction.text import TfidfVectorizer
 
+logger = logging.getLogger(__name__)
+
+INDEX_FORMAT_VERSION = 2
+
+def corpus_manifest(directory: str, previous: dict = None) -> dict:
+    """
+    Content hash, mtime and size of every markdown file under `directory`,
+    plus a combined corpus hash.
+
+    Files whose mtime and size match `previous` reuse its hash instead of
+    being read again.
+    """
+    directory = Path(directory)
+    known = (previous or {}).get("files", {})
+    files = {}
+    for path in sorted(directory.glob("**/*.md")):
+        rel = path.relative_to(directory).as_posix()
+        stat = path.stat()
+        entry = known.get(rel)
+        if entry and entry.get("mtime_ns") == stat.st_mtime_ns and entry.get("size") == stat.st_size:
+            files[rel] = entry
+        else:
+            files[rel] = {
+                "sha256": hashlib.sha256(path.read_bytes()).hexdigest(),
+                "mtime_ns": stat.st_mtime_ns,
+                "size": stat.st_size,
+            }
+
+    hashes = {rel: entry["sha256"] for rel, entry in files.items()}
+    corpus_hash = hashlib.sha256(json.dumps(hashes, sort_keys=True).encode("utf-8")).hexdigest()
+    return {"version": INDEX_FORMAT_VERSION, "files": files, "corpus_hash": corpus_hash}
+
+
+@dataclass(frozen=True)
+class RetrievedChunk:
+    """
+    A retrieval hit: read-only view of a chunk plus the score of this query.
+    """
+    page_content: str
+    metadata: Mapping[str, Any]
+    score: float
+
+    @classmethod
+    def from_document(cls, doc: Document, score: float):
+        return cls(page_content=doc.page_content, metadata=MappingProxyType(doc.metadata), score=score)
+
+def top_k_indices(scores: np.ndarray, k: int) -> np.ndarray:
+    """
+    Indices of the `k` highest scores, best first, via argpartition instead of a full sort.
+    """
+    k = min(k, scores.shape[0])
+    if k <= 0:
+        return np.empty(0, dtype=np.intp)
+    if k < scores.shape[0]:
+        candidates = np.argpartition(-scores, k - 1)[:k]
+    else:
+        candidates = np.arange(scores.shape[0])
+    return candidates[np.argsort(-scores[candidates], kind="stable")]
 
 class MarkdownLoaderAndSplitter:
-    def __init__(self, directory: str):
+    def __init__(self, directory: str, load: bool = True):
         self.directory = Path(directory)
         self.docs = []
         self.chunks = []
+        self.manifest = {"version": INDEX_FORMAT_VERSION, "files": {}, "corpus_hash": None}
 
-        self._load_documents()
-        self._chunk_documents()
+        if load:
+            self.manifest = corpus_manifest(self.directory)
+            self._load_documents()
+            self._chunk_documents()
 
-    def _load_documents(self):
+    @classmethod
+    def restore(cls, directory: str, manifest: dict, chunks):
+        """
+        Rebuilds the loader state from a saved manifest and chunk list without reading the docs.
+        """
+        loader = cls(directory, load=False)
+        loader.manifest = manifest
+        loader.chunks = list(chunks)
+        return loader
+
+    def _load_documents(self, paths=None):
         docs = []
-        for path in self.directory.glob("**/*.md"):
+        paths = self.directory.glob("**/*.md") if paths is None else paths
+        for path in paths:
             loader = TextLoader(str(path), encoding="utf-8")
             file_docs = loader.load()
             for d in file_docs:
@@ -26,7 +109,7 @@ class MarkdownLoaderAndSplitter:
 
         self.docs = docs
 
-    def _chunk_documents(self):
+    def _chunk_documents(self, first_parent_id=0):
         docs_chunks = []
 
         headers_to_split_on = [
@@ -40,7 +123,7 @@ class MarkdownLoaderAndSplitter:
             strip_headers=False
         )
 
-        for doc_idx, doc in enumerate(self.docs):
+        for doc_idx, doc in enumerate(self.docs, first_parent_id):
             chunk_id = 0
             split_docs = splitter.split_text(doc.page_content)
 
@@ -60,6 +143,39 @@ class MarkdownLoaderAndSplitter:
 
         self.chunks = docs_chunks
 
+    def refresh(self):
+        """
+        Re-splits only the files added or modified since the last load and
+        drops the chunks of deleted files.
+
+        Returns the new chunks and the set of sources whose old chunks were removed.
+        """
+        manifest = corpus_manifest(self.directory, previous=self.manifest)
+        old_files, new_files = self.manifest["files"], manifest["files"]
+
+        changed = [
+            rel for rel, entry in new_files.items()
+            if rel not in old_files or old_files[rel]["sha256"] != entry["sha256"]
+        ]
+        removed = [rel for rel in old_files if rel not in new_files or rel in changed]
+        self.manifest = manifest
+        if not changed and not removed:
+            return [], set()
+
+        removed_sources = {str(self.directory / rel) for rel in removed}
+        kept_docs = [d for d in self.docs if d.metadata.get("source") not in removed_sources]
+        kept_chunks = [c for c in self.chunks if c.metadata.get("source") not in removed_sources]
+        first_parent_id = max((c.metadata.get("parent_id", -1) for c in self.chunks), default=-1) + 1
+
+        self._load_documents([self.directory / rel for rel in changed])
+        self._chunk_documents(first_parent_id)
+        new_chunks = self.chunks
+
+        self.docs = kept_docs + self.docs
+        self.chunks = kept_chunks + new_chunks
+        logger.info("Re-indexed %s changed and %s deleted docs", len(changed), len(removed) - len(set(removed) & set(changed)))
+        return new_chunks, removed_sources
+
 class TfidfRetriever:
     def __init__(self, documents, k=5):
         """
@@ -68,28 +184,255 @@ class TfidfRetriever:
         self.docs = documents
         self.k = k
         self.texts = [doc.page_content for doc in documents]
+        self.loader = None
+        self.index_dir = None
+        self.watcher = None
+        self._lock = threading.RLock()
 
         # Build TF-IDF matrix
         self.vectorizer = TfidfVectorizer()
         self.tfidf_matrix = self.vectorizer.fit_transform(self.texts)
 
-    def query(self, query_str: str, k: int = None):
-        query_vec = self.vectorizer.transform([query_str])
-        scores = cosine_similarity(query_vec, self.tfidf_matrix)[0]
+    def _snapshot(self):
+        with self._lock:
+            return self.vectorizer, self.tfidf_matrix, self.docs
+
+    def _results(self, docs, scores, k) -> List[RetrievedChunk]:
+        return [
+            RetrievedChunk.from_document(docs[idx], round(float(scores[idx]), 4))
+            for idx in top_k_indices(scores, k or self.k)
+        ]
+
+    def query(self, query_str: str, k: int = None) -> List[RetrievedChunk]:
+        # Rows of the matrix and the query vector are L2-normalized, so the
+        # sparse dot product is the cosine similarity.
+        vectorizer, tfidf_matrix, docs = self._snapshot()
+        query_vec = vectorizer.transform([query_str])
+        scores = (tfidf_matrix @ query_vec.T).toarray().ravel()
+        return self._results(docs, scores, k)
+
+    def query_batch(self, query_strs: List[str], k: int = None) -> List[List[RetrievedChunk]]:
+        """
+        Scores all queries against the corpus in one sparse matrix multiply.
+        """
+        vectorizer, tfidf_matrix, docs = self._snapshot()
+        query_matrix = vectorizer.transform(query_strs)
+        scores = (query_matrix @ tfidf_matrix.T).toarray()
+        return [self._results(docs, row, k) for row in scores]
+
+    def update(self, new_chunks, removed_sources):
+        """
+        Updates the index in place: drops rows of `removed_sources`, appends
+        `new_chunks` and re-weights by the new document frequencies.
+
+        Existing chunks are not re-tokenized. Since rows are L2-normalized
+        `tf * idf` vectors, rescaling each column by `new_idf / old_idf` and
+        re-normalizing gives the same weights a full re-fit would; new
+        terms are appended to the vocabulary.
+        """
+        with self._lock:
+            vectorizer, matrix, docs = self.vectorizer, sparse.csr_matrix(self.tfidf_matrix), self.docs
+
+        keep = [i for i, doc in enumerate(docs) if doc.metadata.get("source") not in removed_sources]
+        vocabulary = dict(vectorizer.vocabulary_)
+        old_idf = vectorizer.idf_
+
+        analyzer = vectorizer.build_analyzer()
+        rows, cols, counts = [], [], []
+        for row, chunk in enumerate(new_chunks):
+            for term, count in Counter(analyzer(chunk.page_content)).items():
+                rows.append(row)
+                cols.append(vocabulary.setdefault(term, len(vocabulary)))
+                counts.append(count)
+
+        n_terms = len(vocabulary)
+        kept = matrix[keep]
+        kept = sparse.csr_matrix((kept.data, kept.indices, kept.indptr), shape=(kept.shape[0], n_terms))
+        new_counts = sparse.csr_matrix((counts, (rows, cols)), shape=(len(new_chunks), n_terms), dtype=np.float64)
+
+        # smooth_idf=True: idf = ln((1 + n) / (1 + df)) + 1
+        n_docs = kept.shape[0] + new_counts.shape[0]
+        df = np.bincount(kept.indices, minlength=n_terms) + np.bincount(new_counts.indices, minlength=n_terms)
+        idf = np.log((1 + n_docs) / (1 + df)) + 1
+
+        padded_old_idf = np.ones(n_terms)
+        padded_old_idf[:len(old_idf)] = old_idf
+        tfidf_matrix = normalize(sparse.vstack([
+            kept @ sparse.diags(idf / padded_old_idf),
+            new_counts @ sparse.diags(idf),
+        ]).tocsr())
+
+        updated = TfidfVectorizer()
+        updated.vocabulary_ = vocabulary
+        updated.idf_ = idf
+        docs = [docs[i] for i in keep] + list(new_chunks)
+
+        with self._lock:
+            self.vectorizer = updated
+            self.tfidf_matrix = tfidf_matrix
+            self.docs = docs
+            self.texts = [doc.page_content for doc in docs]
+
+    def refresh(self) -> bool:
+        """
+        Picks up added, modified and deleted docs through the attached loader
+        and saves the updated index when it was loaded from `index_dir`.
+        """
+        if self.loader is None:
+            return False
+
+        new_chunks, removed_sources = self.loader.refresh()
+        if not new_chunks and not removed_sources:
+            return False
+
+        self.update(new_chunks, removed_sources)
+        if self.index_dir:
+            self.save(self.index_dir, self.loader.manifest)
+        return True
+
+    def save(self, index_dir: str, manifest: dict):
+        """
+        Writes the fitted index to `index_dir`.
+
+        The sparse matrix is stored as separate `.npy` arrays so `load` can
+        memory-map them; `manifest.json` is written last and marks the
+        artifact as complete.
+        """
+        index_dir = Path(index_dir)
+        index_dir.mkdir(parents=True, exist_ok=True)
+
+        with self._lock:
+            vectorizer, matrix, docs = self.vectorizer, sparse.csr_matrix(self.tfidf_matrix), self.docs
+
+        # Arrays are replaced atomically so a process that memory-mapped the
+        # previous files keeps reading a consistent copy.
+        for name, array in [
+            ("matrix_data.npy", matrix.data),
+            ("matrix_indices.npy", matrix.indices),
+            ("matrix_indptr.npy", matrix.indptr),
+            ("idf.npy", vectorizer.idf_),
+        ]:
+            tmp_path = index_dir / f"{name}.tmp"
+            with open(tmp_path, "wb") as file:
+                np.save(file, array)
+            os.replace(tmp_path, index_dir / name)
+
+        vocabulary = [None] * len(vectorizer.vocabulary_)
+        for term, idx in vectorizer.vocabulary_.items():
+            vocabulary[idx] = term
+        with open(index_dir / "vocabulary.json", "w", encoding="utf-8") as file:
+            json.dump(vocabulary, file, ensure_ascii=False)
+
+        with open(index_dir / "chunks.json", "w", encoding="utf-8") as file:
+            json.dump(
+                [{"page_content": doc.page_content, "metadata": doc.metadata} for doc in docs],
+                file, ensure_ascii=False
+            )
+
+        manifest = dict(manifest, shape=list(matrix.shape))
+        tmp_path = index_dir / "manifest.json.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            json.dump(manifest, file, indent=2)
+        os.replace(tmp_path, index_dir / "manifest.json")
+
+    @classmethod
+    def load(cls, index_dir: str, k=5):
+        """
+        Loads an index written by `save` without re-fitting the vectorizer.
+        """
+        index_dir = Path(index_dir)
+        with open(index_dir / "manifest.json", "r", encoding="utf-8") as file:
+            manifest = json.load(file)
+        with open(index_dir / "vocabulary.json", "r", encoding="utf-8") as file:
+            vocabulary = json.load(file)
+        with open(index_dir / "chunks.json", "r", encoding="utf-8") as file:
+            chunks = json.load(file)
+
+        retriever = cls.__new__(cls)
+        retriever.docs = [Document(page_content=c["page_content"], metadata=c["metadata"]) for c in chunks]
+        retriever.k = k
+        retriever.texts = [doc.page_content for doc in retriever.docs]
+        retriever.loader = None
+        retriever.index_dir = None
+        retriever.watcher = None
+        retriever._lock = threading.RLock()
+
+        retriever.vectorizer = TfidfVectorizer()
+        retriever.vectorizer.vocabulary_ = {term: idx for idx, term in enumerate(vocabulary)}
+        retriever.vectorizer.idf_ = np.load(index_dir / "idf.npy")
+
+        retriever.tfidf_matrix = sparse.csr_matrix(
+            (
+                np.load(index_dir / "matrix_data.npy", mmap_mode="r"),
+                np.load(index_dir / "matrix_indices.npy", mmap_mode="r"),
+                np.load(index_dir / "matrix_indptr.npy", mmap_mode="r"),
+            ),
+            shape=tuple(manifest["shape"]),
+            copy=False,
+        )
+        return retriever
+
+    @staticmethod
+    def read_manifest(index_dir: str):
+        path = Path(index_dir) / "manifest.json"
+        if not path.exists():
+            return None
+        with open(path, "r", encoding="utf-8") as file:
+            return json.load(file)
+
+    @classmethod
+    def from_directory(cls, directory: str, index_dir: str = None, k=5):
+        """
+        Returns a retriever over the markdown corpus in `directory`.
+
+        With `index_dir`, a saved index is reused; files changed since it was
+        saved are re-indexed incrementally and the index is saved again.
+        """
+        saved = cls.read_manifest(index_dir) if index_dir else None
+        if saved and saved.get("version") == INDEX_FORMAT_VERSION:
+            retriever = cls.load(index_dir, k=k)
+            retriever.loader = MarkdownLoaderAndSplitter.restore(directory, saved, retriever.docs)
+            retriever.index_dir = index_dir
+            if retriever.refresh():
+                logger.info("Updated retrieval index in %s", index_dir)
+            else:
+                logger.info("Loaded retrieval index from %s", index_dir)
+            return retriever
 
-        if not k:
-            k = self.k
+        loader = MarkdownLoaderAndSplitter(directory)
+        retriever = cls(loader.chunks, k=k)
+        retriever.loader = loader
+        if index_dir:
+            retriever.index_dir = index_dir
+            retriever.save(index_dir, loader.manifest)
+            logger.info("Rebuilt retrieval index in %s", index_dir)
+        return retriever
 
-        ranked_idx = scores.argsort()[::-1][:k]
+class DocsWatcher:
+    """
+    Polls the docs directory of a retriever and applies edits while the process runs.
+    Started by `get_retriever` when DOCS_WATCH_INTERVAL is set.
+    """
+    def __init__(self, retriever: TfidfRetriever, interval: float = 2.0):
+        self.retriever = retriever
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="docs-watcher", daemon=True)
 
-        results = []
-        for idx in ranked_idx:
-            doc = self.docs[idx]
-            doc.metadata["score"] = round(float(scores[idx]), 4)
-            results.append(doc)
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.retriever.refresh()
+            except Exception as e:
+                logger.error("DocsWatcher: %s", e)
 
-        return results
+    def start(self):
+        self._thread.start()
+        return self
 
+    def stop(self):
+        self._stop.set()
+        self._thread.join(timeout=self.interval + 1)
 
 if __name__ == "__main__":
     docs = MarkdownLoaderAndSplitter("docs")
@@ -98,6 +441,6 @@ if __name__ == "__main__":
     results = retriever.query("what is average order value ?", 10)
 
     for r in results:
-        print(r.metadata)
+        print(r.score, dict(r.metadata))
         print(r.page_content)
         print("-" * 40)
\ No newline at end of file
@@ -0,0 +1,208 @@
+import re
+import logging
+import threading
+from collections import Counter
+from typing import Any, Dict, List, NamedTuple, Optional
+
+import sqlglot
+from sqlglot import exp
+
+logger = logging.getLogger(__name__)
+
+# (cause, pattern over the lower-cased error message), first match wins.
+ERROR_CLASSES = [
+    ("timeout", re.compile(r"interrupted|timeout")),
+    ("syntax", re.compile(r"syntax error|incomplete input|unrecognized token")),
+    ("no_such_table", re.compile(r"no such table|unknown table")),
+    ("no_such_column", re.compile(r"no such column|unknown column|ambiguous column")),
+    ("too_expensive", re.compile(r"cartesian join|query plan scans")),
+    ("not_select", re.compile(r"only select|single select|empty query")),
+]
+
+_DATE_LITERAL = re.compile(
+    r"'(?:(?P<y1>\d{4})[/.-](?P<m1>\d{1,2})[/.-](?P<d1>\d{1,2})"
+    r"|(?P<m2>\d{1,2})/(?P<d2>\d{1,2})/(?P<y2>\d{4}))'"
+)
+
+_STRING_LITERAL = re.compile(r"('(?:[^']|'')*')")
+
+# Base tables the demo views expose; the validator only allows the views.
+TABLE_ALIASES = {
+    "Order Details": "demo_order_details",
+    "Orders": "demo_orders",
+    "Products": "demo_products",
+    "Customers": "demo_customers",
+}
+
+def classify_error(error: Optional[str]) -> str:
+    if not error:
+        return "ok"
+    message = error.lower()
+    for cause, pattern in ERROR_CLASSES:
+        if pattern.search(message):
+            return cause
+    return "other"
+
+def rewrite_table_names(sql: str, aliases: Dict[str, str], table_names: List[str]) -> str:
+    """
+    Points the query at the tables the agent may use: a table named in
+    `aliases` (e.g. Order Details) becomes the allowed table it is exposed
+    through (demo_order_details), or is only quoted when it is allowed
+    itself. Names not allowed either way are left for the LLM to fix.
+
+    Bare names with spaces are quoted outside string literals so the query
+    parses; the renaming itself goes through sqlglot, so only table
+    identifiers (and column qualifiers naming them) change.
+    """
+    allowed = {t.lower(): t for t in table_names}
+    targets = {}
+    for name, target in aliases.items():
+        if name.lower() in allowed:
+            targets[name.lower()] = allowed[name.lower()]
+        elif target.lower() in allowed:
+            targets[name.lower()] = allowed[target.lower()]
+    if not targets:
+        return sql
+
+    parts = _STRING_LITERAL.split(sql)
+    for name in aliases:
+        if " " in name and name.lower() in targets:
+            pattern = re.compile(rf'(?<!["\[`]){re.escape(name)}(?!["\]`])', re.IGNORECASE)
+            parts = [part if part.startswith("'") else pattern.sub(f'"{name}"', part) for part in parts]
+
+    quoted = "".join(parts)
+    try:
+        tree = sqlglot.parse_one(quoted, read="sqlite")
+    except sqlglot.errors.ParseError:
+        return sql
+
+    ctes = {cte.alias_or_name.lower() for cte in tree.find_all(exp.CTE)}
+    renamed = {}
+    for table in tree.find_all(exp.Table):
+        key = table.name.lower()
+        if key in targets and key not in ctes:
+            if table.name != targets[key]:
+                renamed[key] = targets[key]
+                table.set("this", exp.to_identifier(targets[key]))
+    for column in tree.find_all(exp.Column):
+        if column.table.lower() in renamed:
+            column.set("table", exp.to_identifier(renamed[column.table.lower()]))
+    return tree.sql(dialect="sqlite") if renamed else quoted
+
+def fix_date_literals(sql: str) -> str:
+    """
+    Rewrites '1997/6/1', '1997.06.01' and '06/01/1997' (month first) literals to ISO '1997-06-01'.
+    """
+    def iso(match):
+        year = match.group("y1") or match.group("y2")
+        month = match.group("m1") or match.group("m2")
+        day = match.group("d1") or match.group("d2")
+        if not (1 <= int(month) <= 12 and 1 <= int(day) <= 31):
+            return match.group(0)
+        return f"'{year}-{int(month):02d}-{int(day):02d}'"
+
+    return _DATE_LITERAL.sub(iso, sql)
+
+class RetryDecision(NamedTuple):
+    action: str
+    cause: str
+    sql: Optional[str] = None
+    repair: Optional[str] = None
+    feedback: Optional[str] = None
+
+class RetryPolicy:
+    """
+    Decides what happens after each SQL validation/execution:
+
+    - `success`: rows came back, or the query failed in a way another
+      attempt won't fix (`terminal_causes`, e.g. a timeout)
+    - `repair`: a cheap local rewrite (base tables to the allowed views,
+      ISO date literals) changed the SQL; it is validated and run again
+      without asking the LLM, at most `max_repairs` times per question
+    - `retry`: the LLM regenerates the SQL with `feedback` on what went
+      wrong, up to `max_attempts` generations
+    - `fallback`: out of attempts; the synthesizer answers with what there is
+
+    An empty result from a query that ran is terminal when the plan had
+    filters (date ranges, categories) and the SQL applies all of them: the
+    data has no rows for that slice, and regenerating won't change that.
+    """
+    def __init__(self, max_attempts: int = 3, max_repairs: int = 2, auto_repair: bool = True,
+                 empty_is_terminal: bool = True, terminal_causes=("timeout",), table_aliases=None):
+        self.max_attempts = max_attempts
+        self.max_repairs = max_repairs
+        self.auto_repair = auto_repair
+        self.empty_is_terminal = empty_is_terminal
+        self.terminal_causes = set(terminal_causes)
+        self.table_aliases = dict(TABLE_ALIASES if table_aliases is None else table_aliases)
+        self._lock = threading.Lock()
+        self.causes = Counter()
+        self.actions = Counter()
+        self.repairs = Counter()
+
+    def max_steps(self):
+        # Graph steps the SQL loop can take: validate/execute/decide per repair, plus generate per attempt.
+        return 4 * self.max_attempts + 3 * self.max_repairs
+
+    def _repair(self, sql, cause, table_names):
+        repairs = []
+        if cause in ("syntax", "no_such_table"):
+            repairs.append(("rewrite_table_names", lambda s: rewrite_table_names(s, self.table_aliases, table_names)))
+        if cause == "empty":
+            repairs.append(("fix_date_literals", fix_date_literals))
+
+        for name, repair in repairs:
+            repaired = repair(sql)
+            if repaired != sql:
+                return name, repaired
+        return None, None
+
+    @staticmethod
+    def _empty_is_expected(sql, constraints):
+        constraints = constraints or {}
+        dates = [d for r in constraints.get("date_ranges") or [] for d in re.findall(r"\d{4}-\d{2}-\d{2}", str(r))]
+        categories = [str(c) for c in constraints.get("categories") or []]
+        if not dates and not categories:
+            return False
+        return all(value.lower() in sql.lower() for value in dates + categories)
+
+    def decide(self, state: Dict[str, Any]) -> RetryDecision:
+        sql = state.get("sql_query") or ""
+        result = state.get("sql_result") or {}
+        error = result.get("error")
+        cause = classify_error(error)
+        if cause == "ok" and not result.get("rows"):
+            cause = "empty"
+
+        repairs_done = len(state.get("sql_repairs") or [])
+        generations = state["attempt_count"] - repairs_done
+
+        if cause == "ok":
+            decision = RetryDecision("success", cause)
+        elif cause in self.terminal_causes:
+            decision = RetryDecision("success", cause)
+        elif cause == "empty" and self.empty_is_terminal and self._empty_is_expected(sql, state.get("constraints")):
+            decision = RetryDecision("success", "empty_expected")
+        else:
+            repair, repaired = (None, None)
+            if self.auto_repair and repairs_done < self.max_repairs:
+                repair, repaired = self._repair(sql, cause, state.get("table_names") or [])
+            if repaired is not None:
+                decision = RetryDecision("repair", cause, sql=repaired, repair=repair)
+            elif generations < self.max_attempts:
+                feedback = error or "The query ran but returned no rows. Check the filters, joins and date formats against the schema."
+                decision = RetryDecision("retry", cause, feedback=feedback)
+            else:
+                decision = RetryDecision("fallback", cause)
+
+        with self._lock:
+            self.causes[decision.cause] += 1
+            self.actions[decision.action] += 1
+            if decision.repair:
+                self.repairs[decision.repair] += 1
+        logger.info("retry_policy: %s (%s)", decision.action, decision.cause, extra={"repair": decision.repair})
+        return decision
+
+    def stats(self):
+        with self._lock:
+            return {"causes": dict(self.causes), "actions": dict(self.actions), "repairs": dict(self.repairs)}
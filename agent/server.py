@@ -0,0 +1,289 @@
+"""
+ASGI service around the agent, for running it as a long-lived local server
+instead of paying startup (doc loading, index fit, client construction) on
+every batch run. No web framework is required; any ASGI server can host
+`create_app()` (see run_agent_server.py for uvicorn).
+
+    POST /invoke   {"id", "question", "format_hint"} -> agent output
+    POST /stream   {"id", "question", "format_hint"} -> NDJSON events as the run progresses
+    POST /batch    JSON list or JSON lines of records -> NDJSON outputs as they finish
+    GET  /health   readiness (clients built)
+    GET  /stats    request, queue, cache and retry statistics
+"""
+import json
+import time
+import asyncio
+import logging
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from agent.graph_hybrid import ainvoke_agent, astream_agent, build_run
+from helper.clients import (get_db, get_llm, get_llm_cache, get_fast_router, get_constraint_resolver,
+                            get_sql_templates, get_retry_policy, get_retriever, get_tracer)
+
+logger = logging.getLogger(__name__)
+
+class QueueFull(Exception):
+    pass
+
+def coalesce_key(question: str, format_hint: Optional[str], llm: Optional[str]):
+    return " ".join((question or "").split()).casefold(), format_hint or "", llm or ""
+
+class AgentService:
+    """
+    Runs agent questions on the event loop with shared, pre-built clients.
+
+    - Concurrent requests for the same question (and format hint and LLM)
+      share one graph run; each caller gets the output under its own id.
+    - At most `max_concurrency` graph runs execute at once, and at most
+      `max_queue` distinct questions are admitted (running or waiting).
+      `submit(wait=False)` raises QueueFull beyond that, `wait=True` waits
+      for room instead (used by the streaming batch endpoint).
+    """
+    def __init__(self, llm: str = None, max_queue: int = 64, max_concurrency: int = 8):
+        self.llm = llm
+        self.max_queue = max_queue
+        self.max_concurrency = max_concurrency
+        self._admitted = asyncio.Semaphore(max_queue)
+        self._running = asyncio.Semaphore(max_concurrency)
+        self._inflight: Dict[Any, asyncio.Future] = {}
+        self.warm = False
+
+        self.requests = 0
+        self.coalesced = 0
+        self.rejected = 0
+        self.failed = 0
+        self.run_time = 0.0
+        self.runs = 0
+
+    def warm_up(self):
+        """
+        Builds every shared client (retriever index, DB pool and schema catalog, LLM, caches) up front.
+        """
+        started = time.perf_counter()
+        build_run("warmup", "", "", self.llm)
+        self.warm = True
+        logger.info("Agent service warm in %.2fs", time.perf_counter() - started)
+
+    async def _run(self, key, id, question, format_hint):
+        try:
+            async with self._running:
+                started = time.perf_counter()
+                out = await ainvoke_agent(id, question, format_hint, llm=self.llm)
+                self.run_time += time.perf_counter() - started
+                self.runs += 1
+                return out
+        except Exception:
+            self.failed += 1
+            raise
+        finally:
+            self._inflight.pop(key, None)
+            self._admitted.release()
+
+    async def admit(self, wait=False):
+        if not wait and self._admitted.locked():
+            self.rejected += 1
+            raise QueueFull(f"{self.max_queue} questions already queued")
+        await self._admitted.acquire()
+
+    async def stream(self, id, question, format_hint) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Streams the events of one run (not coalesced). The caller must `admit()` first; the slot is released here.
+        """
+        self.requests += 1
+        try:
+            async with self._running:
+                started = time.perf_counter()
+                async for event in astream_agent(id, question, format_hint, llm=self.llm):
+                    yield event
+                self.run_time += time.perf_counter() - started
+                self.runs += 1
+        except Exception:
+            self.failed += 1
+            raise
+        finally:
+            self._admitted.release()
+
+    async def submit(self, id, question, format_hint, wait=False) -> Dict[str, Any]:
+        self.requests += 1
+        key = coalesce_key(question, format_hint, self.llm)
+        future = self._inflight.get(key)
+        if future is not None:
+            self.coalesced += 1
+        else:
+            await self.admit(wait)
+            # Another request may have started the same question while this one waited.
+            future = self._inflight.get(key)
+            if future is None:
+                future = asyncio.ensure_future(self._run(key, id, question, format_hint))
+                self._inflight[key] = future
+            else:
+                self._admitted.release()
+                self.coalesced += 1
+
+        out = await asyncio.shield(future)
+        return {**out, "id": id}
+
+    def stats(self):
+        stats = {
+            "warm": self.warm,
+            "requests": self.requests,
+            "coalesced": self.coalesced,
+            "rejected": self.rejected,
+            "failed": self.failed,
+            "in_flight": len(self._inflight),
+            "max_queue": self.max_queue,
+            "max_concurrency": self.max_concurrency,
+            "avg_run_s": round(self.run_time / self.runs, 3) if self.runs else None,
+        }
+        if get_db.is_built():
+            stats["sqlite_pool"] = get_db().pool_stats()
+            stats["sql_result_cache"] = get_db().cache_stats()
+        optional = {
+            "llm_cache": get_llm_cache, "fast_router": get_fast_router, "constraint_resolver": get_constraint_resolver,
+            "sql_templates": get_sql_templates, "sql_retries": get_retry_policy,
+        }
+        for name, getter in optional.items():
+            if getter.is_built() and getter() is not None:
+                stats[name] = getter().stats()
+        if get_llm.is_built("gateway"):
+            stats["llm_gateway"] = get_llm("gateway").stats()
+        if get_tracer.is_built() and get_tracer() is not None:
+            stats["trace"] = get_tracer().summary()
+        return stats
+
+def parse_record(body: bytes) -> Dict[str, Any]:
+    """
+    Accepts one JSON object with a `question`.
+    """
+    record = json.loads(body)
+    if not isinstance(record, dict):
+        raise ValueError("the body must be a JSON object")
+    if not record.get("question"):
+        raise ValueError("'question' is required")
+    return record
+
+def parse_records(body: bytes) -> List[Dict[str, Any]]:
+    """
+    Accepts a JSON list of records or JSON lines; every record must be a JSON object.
+    """
+    text = body.decode("utf-8").strip()
+    if text.startswith("["):
+        records = json.loads(text)
+    else:
+        records = [json.loads(line) for line in text.splitlines() if line.strip()]
+    if not isinstance(records, list) or not all(isinstance(record, dict) for record in records):
+        raise ValueError("every record must be a JSON object")
+    return records
+
+async def _read_body(receive) -> bytes:
+    body, more = b"", True
+    while more:
+        message = await receive()
+        body += message.get("body", b"")
+        more = message.get("more_body", False)
+    return body
+
+async def _send_json(send, status, payload, headers=()):
+    body = json.dumps(payload, default=str).encode("utf-8")
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode()), *headers],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+class AgentApp:
+    """
+    The ASGI application: routes requests to an `AgentService` and warms it on lifespan startup.
+    """
+    def __init__(self, service: AgentService):
+        self.service = service
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            return await self._lifespan(receive, send)
+        if scope["type"] != "http":
+            return
+
+        route = (scope["method"], scope["path"].rstrip("/") or "/")
+        try:
+            if route == ("GET", "/health"):
+                return await _send_json(send, 200 if self.service.warm else 503, {"status": "ok" if self.service.warm else "starting"})
+            if route == ("GET", "/stats"):
+                return await _send_json(send, 200, self.service.stats())
+            if route == ("POST", "/invoke"):
+                return await self._invoke(receive, send)
+            if route == ("POST", "/stream"):
+                return await self._stream(receive, send)
+            if route == ("POST", "/batch"):
+                return await self._batch(receive, send)
+            return await _send_json(send, 404, {"error": f"no route for {scope['method']} {scope['path']}"})
+        except (ValueError, KeyError, TypeError) as e:
+            return await _send_json(send, 400, {"error": f"invalid request: {e}"})
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                try:
+                    await asyncio.to_thread(self.service.warm_up)
+                except Exception as e:
+                    logger.error("Agent service failed to start: %s", e)
+                    await send({"type": "lifespan.startup.failed", "message": str(e)})
+                    return
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                if get_retriever.is_built() and getattr(get_retriever(), "watcher", None) is not None:
+                    get_retriever().watcher.stop()
+                if get_tracer.is_built() and get_tracer() is not None:
+                    get_tracer().close()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def _invoke(self, receive, send):
+        record = parse_record(await _read_body(receive))
+        try:
+            out = await self.service.submit(record.get("id"), record["question"], record.get("format_hint"))
+        except QueueFull as e:
+            return await _send_json(send, 503, {"error": str(e)}, headers=[(b"retry-after", b"1")])
+        except Exception as e:
+            logger.error("Error during processing %s: %s", record.get("id"), e)
+            return await _send_json(send, 500, {"id": record.get("id"), "error": str(e)})
+        await _send_json(send, 200, out)
+
+    async def _stream(self, receive, send):
+        record = parse_record(await _read_body(receive))
+        try:
+            await self.service.admit()
+        except QueueFull as e:
+            return await _send_json(send, 503, {"error": str(e)}, headers=[(b"retry-after", b"1")])
+
+        await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", b"application/x-ndjson")]})
+        try:
+            async for event in self.service.stream(record.get("id"), record["question"], record.get("format_hint")):
+                line = json.dumps(event, default=str) + "\n"
+                await send({"type": "http.response.body", "body": line.encode("utf-8"), "more_body": True})
+        except Exception as e:
+            logger.error("Error during processing %s: %s", record.get("id"), e)
+            line = json.dumps({"event": "error", "id": record.get("id"), "error": str(e)}) + "\n"
+            await send({"type": "http.response.body", "body": line.encode("utf-8"), "more_body": True})
+        await send({"type": "http.response.body", "body": b""})
+
+    async def _batch(self, receive, send):
+        records = parse_records(await _read_body(receive))
+
+        async def run(record):
+            try:
+                return await self.service.submit(record.get("id"), record.get("question"), record.get("format_hint"), wait=True)
+            except Exception as e:
+                logger.error("Error during processing %s: %s", record.get("id"), e)
+                return {"id": record.get("id"), "error": str(e)}
+
+        await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", b"application/x-ndjson")]})
+        for done in asyncio.as_completed([asyncio.ensure_future(run(record)) for record in records]):
+            line = json.dumps(await done, default=str) + "\n"
+            await send({"type": "http.response.body", "body": line.encode("utf-8"), "more_body": True})
+        await send({"type": "http.response.body", "body": b""})
+
+def create_app(llm: str = None, max_queue: int = 64, max_concurrency: int = 8) -> AgentApp:
+    return AgentApp(AgentService(llm, max_queue=max_queue, max_concurrency=max_concurrency))
@@ -0,0 +1,250 @@
+import os
+import re
+import json
+import logging
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, NamedTuple, Optional
+
+logger = logging.getLogger(__name__)
+
+_DATE = re.compile(r"\d{4}-\d{2}-\d{2}")
+_YEAR = re.compile(r"\b(?:19|20)\d\d\b")
+_TOP_N = re.compile(r"\btop\s+(\d+)\b", re.IGNORECASE)
+_QUOTED = re.compile(r"'[^']{2,}'|\"[^\"]{2,}\"")
+_LIMIT = re.compile(r"\bLIMIT\s+(\d+)\b", re.IGNORECASE)
+_LITERAL = re.compile(r"'([^']*)'|\b(\d+)\b")
+_FIELD = re.compile(r"(\w+)\s*:")
+
+def template_parameters(question: str, constraints: Dict[str, Any]) -> Dict[str, List[str]]:
+    """
+    The values a question can vary in while keeping the same SQL shape.
+    """
+    constraints = constraints or {}
+    return {
+        "dates": [d for r in constraints.get("date_ranges") or [] for d in _DATE.findall(str(r))],
+        "categories": [str(c) for c in constraints.get("categories") or []],
+        "years": _YEAR.findall(question),
+        "top_n": _TOP_N.findall(question),
+    }
+
+def template_text(question: str, constraints: Dict[str, Any]) -> str:
+    """
+    The question with its parameters masked, plus its KPI formulas: what similarity is computed on.
+    """
+    text = question
+    for category in (constraints or {}).get("categories") or []:
+        text = re.sub(re.escape(str(category)), " category ", text, flags=re.IGNORECASE)
+    text = _QUOTED.sub(" name ", text)
+    text = _TOP_N.sub(" top n ", text)
+    text = _YEAR.sub(" year ", text)
+    kpis = " ".join(str(k) for k in (constraints or {}).get("kpis") or [])
+    return " ".join(f"{text} {kpis}".lower().split())
+
+def unverified_reason(sql: str, constraints: Dict[str, Any], columns: List[str], rows: List[Any],
+                      format_hint: str = None, top_n: List[str] = None) -> Optional[str]:
+    """
+    Why a successful query should not become a template, or None if it can.
+    Rows alone say little: the SQL must also apply every date and category
+    of the plan, and the result must have the shape the format hint asks for.
+    """
+    constraints = constraints or {}
+    values = [d for r in constraints.get("date_ranges") or [] for d in _DATE.findall(str(r))]
+    values += [str(c) for c in constraints.get("categories") or []]
+    missing = [v for v in values if v.lower() not in sql.lower()]
+    if missing:
+        return f"filters not applied: {missing}"
+    if not rows:
+        return "no rows"
+
+    hint = (format_hint or "").strip()
+    fields = _FIELD.findall(hint)
+    expected_columns = len(fields) or 1
+    if hint and len(columns or []) != expected_columns:
+        return f"{len(columns or [])} columns for a {expected_columns}-field answer"
+    if hint and not hint.startswith("list") and len(rows) != 1:
+        return f"{len(rows)} rows for a single-value answer"
+    if top_n and len(rows) > int(top_n[0]):
+        return f"{len(rows)} rows for top {top_n[0]}"
+    return None
+
+def substitute(sql: str, old: Dict[str, List[str]], new: Dict[str, List[str]]) -> Optional[str]:
+    """
+    Rewrites the literals of `sql` from the `old` parameters to the `new`
+    ones. Returns None when that cannot be done safely: the parameter lists
+    differ in length, a changed value is not in the SQL, or one is left over.
+    """
+    if any(len(old[kind]) != len(new[kind]) for kind in old):
+        return None
+    literals = {o: n for kind in ("dates", "categories", "years") for o, n in zip(old[kind], new[kind]) if o != n}
+    limits = {o: n for o, n in zip(old["top_n"], new["top_n"]) if o != n}
+    if any(o not in sql for o in literals) or any(o not in _LIMIT.findall(sql) for o in limits):
+        return None
+
+    def replace(match):
+        quoted, number = match.groups()
+        if quoted is not None:
+            return f"'{literals.get(quoted, quoted)}'"
+        return literals.get(number, number)
+
+    rewritten = _LITERAL.sub(replace, sql)
+    rewritten = _LIMIT.sub(lambda m: f"LIMIT {limits.get(m.group(1), m.group(1))}", rewritten)
+    kept = {value for values in new.values() for value in values}
+    if any(o in rewritten and o not in kept for o in literals):
+        return None
+    return rewritten
+
+def format_examples(examples: List[Dict[str, Any]]) -> str:
+    if not examples:
+        return "None"
+    return "\n\n".join(
+        f"Question: {e['question']}\nConstraints: {json.dumps(e.get('constraints') or {}, default=str)}\n"
+        f"SQL: {e['sql']}\nResult columns: {json.dumps(e.get('columns') or [])}"
+        for e in examples
+    )
+
+class TemplateMatch(NamedTuple):
+    sql: Optional[str]
+    examples: List[Dict[str, Any]]
+    score: float
+
+class SQLTemplateStore:
+    """
+    Verified (question, constraints, SQL, result columns) entries, added
+    when generated SQL passes `unverified_reason`, and optionally persisted
+    as JSON lines at `path`. Only the last `max_entries` are kept; once older
+    ones are dropped the file is rewritten to the kept entries.
+
+    SQL is only reused for a question whose masked text (see `template_text`)
+    equals a stored one, with the same format hint and KPIs, so that the two
+    differ in their parameters alone; its literals are then rewritten to the
+    new parameters. Similar but different questions ("during" / "excluding",
+    "customers" / "products") never reuse SQL: the `examples` closest
+    entries by TF-IDF cosine similarity, scoring at least
+    `example_threshold`, are offered to the SQL prompt as few-shot examples.
+    """
+    def __init__(self, path: str = None, example_threshold: float = 0.4, examples: int = 2,
+                 max_entries: int = 500):
+        self.path = Path(path) if path else None
+        self.example_threshold = example_threshold
+        self.examples = examples
+        self.max_entries = max_entries
+        self.entries = []
+        self._lock = threading.Lock()
+        self._vectorizer = None
+        self._matrix = None
+
+        self.reused = 0
+        self.few_shot = 0
+        self.misses = 0
+        self.added = 0
+        self.rejected = 0
+
+        self._file_records = 0
+        if self.path is not None and self.path.exists():
+            with open(self.path, "r", encoding="utf-8") as file:
+                for line in file:
+                    if line.strip():
+                        self._append(json.loads(line))
+                        self._file_records += 1
+            logger.info("Loaded %d SQL templates from %s", len(self.entries), self.path)
+            if self._file_records > len(self.entries):
+                self._compact()
+
+    def _append(self, record):
+        entry = {
+            **record,
+            "params": template_parameters(record["question"], record.get("constraints")),
+            "text": template_text(record["question"], record.get("constraints")),
+        }
+        if any(e["text"] == entry["text"] and e["sql"] == entry["sql"] for e in self.entries):
+            return False
+        self.entries.append(entry)
+        del self.entries[:-self.max_entries]
+        self._vectorizer = None
+        return True
+
+    def add(self, question: str, constraints: Dict[str, Any], sql: str, columns: List[str], rows: List[Any],
+            format_hint: str = None):
+        reason = unverified_reason(sql, constraints, columns, rows, format_hint, _TOP_N.findall(question))
+        if reason is not None:
+            logger.info("SQL template not added: %s", reason, extra={"sql": sql})
+            with self._lock:
+                self.rejected += 1
+            return False
+
+        record = {"question": question, "constraints": constraints or {}, "sql": sql,
+                  "columns": columns, "format_hint": format_hint}
+        with self._lock:
+            if not self._append(record):
+                return False
+            self.added += 1
+            if self.path is not None:
+                self._file_records += 1
+                if self._file_records > len(self.entries):
+                    self._compact()
+                else:
+                    self.path.parent.mkdir(parents=True, exist_ok=True)
+                    with open(self.path, "a", encoding="utf-8") as file:
+                        file.write(json.dumps(record, default=str) + "\n")
+        return True
+
+    def _compact(self):
+        # Rewrites the file with the kept entries only; called with `_lock` held (or from __init__).
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            for entry in self.entries:
+                record = {k: v for k, v in entry.items() if k not in ("params", "text")}
+                file.write(json.dumps(record, default=str) + "\n")
+        os.replace(tmp_path, self.path)
+        logger.info("Compacted %s from %d to %d SQL templates", self.path, self._file_records, len(self.entries))
+        self._file_records = len(self.entries)
+
+    def _search(self, text):
+        from sklearn.metrics.pairwise import linear_kernel
+        from sklearn.feature_extraction.text import TfidfVectorizer
+
+        if not self.entries:
+            return []
+        if self._vectorizer is None:
+            self._vectorizer = TfidfVectorizer(ngram_range=(1, 2), sublinear_tf=True)
+            self._matrix = self._vectorizer.fit_transform([e["text"] for e in self.entries])
+        scores = linear_kernel(self._vectorizer.transform([text]), self._matrix).ravel()
+        return sorted(zip(scores, self.entries), key=lambda item: -item[0])
+
+    def match(self, question: str, constraints: Dict[str, Any], format_hint: str = None) -> TemplateMatch:
+        text = template_text(question, constraints)
+        params = template_parameters(question, constraints)
+        with self._lock:
+            ranked = self._search(text)
+
+        for score, entry in ranked:
+            if entry["text"] != text or entry.get("format_hint") != format_hint:
+                continue
+            if (entry.get("constraints") or {}).get("kpis") != (constraints or {}).get("kpis"):
+                continue
+            sql = substitute(entry["sql"], entry["params"], params)
+            if sql is not None:
+                with self._lock:
+                    self.reused += 1
+                return TemplateMatch(sql, [], float(score))
+
+        examples = [entry for score, entry in ranked[:self.examples] if score >= self.example_threshold]
+        with self._lock:
+            if examples:
+                self.few_shot += 1
+            else:
+                self.misses += 1
+        return TemplateMatch(None, examples, float(ranked[0][0]) if ranked else 0.0)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "templates": len(self.entries),
+                "reused": self.reused,
+                "few_shot": self.few_shot,
+                "misses": self.misses,
+                "added": self.added,
+                "rejected": self.rejected,
+            }
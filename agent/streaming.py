@@ -0,0 +1,119 @@
+"""
+Node-level events for streaming agent runs (see `stream_agent` / `astream_agent`
+in agent/graph_hybrid.py). Every event is a JSON-serializable dict with an
+`event` key:
+
+    route        the router's decision
+    docs         retrieved chunks (citations and scores)
+    constraints  the planner's constraints
+    sql          generated or reused SQL
+    retry        the retry policy repairs or regenerates the SQL
+    rows         the query result (columns, rows kept, truncation, first rows)
+    token        a piece of the synthesizer's answer as the LLM streams it
+    answer       the synthesizer's answer
+    final        the agent output, as returned by `invoke_agent`
+"""
+from typing import Any, Callable, Dict, Iterator, Optional
+
+from langchain_core.utils.json import parse_partial_json
+
+PREVIEW_ROWS = 20
+
+def citation(chunk) -> str:
+    return f"{chunk.metadata['source']}:chunk_{chunk.metadata['chunk_id']}"
+
+def node_events(node: str, update: Optional[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+    """
+    Turns one node's state update into the events callers see; internal nodes emit nothing.
+    """
+    update = update or {}
+    if node == "router":
+        yield {"event": "route", "route": update.get("route")}
+    elif node == "retriever":
+        docs = update.get("retrieved_docs") or []
+        yield {"event": "docs", "citations": [citation(d) for d in docs], "scores": [round(float(d.score), 4) for d in docs]}
+    elif node == "planner":
+        yield {"event": "constraints", "constraints": update.get("constraints")}
+    elif node == "nl_to_sql":
+        yield {"event": "sql", "sql": update.get("sql_query"), "source": update.get("sql_source")}
+    elif node == "sql_validator" and not (update.get("sql_validation") or {}).get("ok", True):
+        yield {"event": "retry", "action": "validate", "cause": (update.get("sql_result") or {}).get("error")}
+    elif node == "sql_executor":
+        result = update.get("sql_result") or {}
+        yield {
+            "event": "rows",
+            "columns": result.get("columns"),
+            "rows_kept": result.get("rows_kept", 0),
+            "truncated": result.get("truncated", False),
+            "rows": (result.get("rows") or [])[:PREVIEW_ROWS],
+            "error": result.get("error"),
+        }
+    elif node == "retry_policy" and update.get("retry_action") != "success":
+        event = {"event": "retry", "action": update.get("retry_action"), "cause": update.get("retry_cause")}
+        if update.get("retry_action") == "repair":
+            event["sql"] = update.get("sql_query")
+        yield event
+    elif node == "Synthesizer":
+        yield {"event": "answer", "final_answer": update.get("final_answer"), "explanation": update.get("explanation")}
+
+def message_json(chunk) -> Iterator[str]:
+    """
+    The structured-output JSON carried by a chat model chunk: the message
+    text for JSON-mode models (ChatOllama), the tool call arguments for
+    function calling (ChatGroq's default for `with_structured_output`).
+    """
+    if isinstance(chunk.content, str) and chunk.content:
+        yield chunk.content
+    for call in getattr(chunk, "tool_call_chunks", None) or []:
+        if call.get("index") in (None, 0) and isinstance(call.get("args"), str):
+            yield call["args"]
+
+class FieldDeltas:
+    """
+    Follows a structured-output LLM stream (raw JSON text arriving in
+    pieces) and reports what each string field gained since the last piece,
+    e.g. `final_answer: "14 da"` -> `"ys"`.
+    """
+    def __init__(self, emit: Callable[[str, str], None], fields=("final_answer", "explanation")):
+        self.emit = emit
+        self.fields = fields
+        self.text = ""
+        self.sent = {field: "" for field in fields}
+
+    def feed(self, piece: str):
+        self.text += piece
+        partial = parse_partial_json(self.text) if self.text.strip() else None
+        if not isinstance(partial, dict):
+            return
+        for field in self.fields:
+            value = partial.get(field)
+            if isinstance(value, str) and value.startswith(self.sent[field]) and len(value) > len(self.sent[field]):
+                self.emit(field, value[len(self.sent[field]):])
+                self.sent[field] = value
+
+class RunEvents:
+    """
+    Turns the items of `northwind_agent.stream(..., stream_mode=["updates",
+    "messages", "values"])` into events, keeping the latest full state.
+    Message chunks from the synthesizer's chat model become `token` events,
+    whether the answer streams as text or as tool call arguments.
+    """
+    def __init__(self, token_node: str = "Synthesizer"):
+        self.token_node = token_node
+        self.state = {}
+        self._pending = []
+        self._deltas = FieldDeltas(lambda field, text: self._pending.append({"event": "token", "field": field, "text": text}))
+
+    def feed(self, mode: str, payload) -> Iterator[Dict[str, Any]]:
+        if mode == "values":
+            self.state.update(payload)
+        elif mode == "messages":
+            chunk, metadata = payload
+            if metadata.get("langgraph_node") == self.token_node:
+                for piece in message_json(chunk):
+                    self._deltas.feed(piece)
+                yield from self._pending
+                self._pending.clear()
+        else:
+            for node, update in payload.items():
+                yield from node_events(node, update)
@@ -0,0 +1,38 @@
+import time
+import sqlite3
+import logging
+import argparse
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+ANALYTICS_TABLES = ["fact_order_lines"]
+ANALYTICS_SQL = Path(__file__).resolve().parents[2] / "data" / "queries" / "create-analytics-tables.sql"
+
+def build_analytics_tables(db_name, sql_path=ANALYTICS_SQL):
+    """
+    (Re)builds the materialized analytics tables and their indexes in `db_name`.
+
+    Needs a writable database; the agent itself only opens read-only
+    connections. Returns the row count of each analytics table.
+    """
+    started = time.perf_counter()
+    conn = sqlite3.connect(db_name)
+    try:
+        with open(sql_path, "r", encoding="utf-8") as file:
+            conn.executescript(file.read())
+        conn.commit()
+        counts = {t: conn.execute(f'SELECT COUNT(*) FROM "{t}";').fetchone()[0] for t in ANALYTICS_TABLES}
+    finally:
+        conn.close()
+
+    logger.info("Built analytics tables %s in %.2fs", counts, time.perf_counter() - started)
+    return counts
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Materialize analytics tables in the Northwind database")
+    parser.add_argument("--db", type=str, required=True, help="Path to the SQLite database")
+    parser.add_argument("--sql", type=str, default=str(ANALYTICS_SQL), help="SQL script to run")
+    args = parser.parse_args()
+
+    print(build_analytics_tables(args.db, args.sql))
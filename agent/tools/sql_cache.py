@@ -0,0 +1,118 @@
+import os
+import json
+import hashlib
+import logging
+import threading
+import sqlglot
+from sqlglot import exp
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+def canonical_sql(sql: str) -> str:
+    """
+    Canonical text of a query: parsed with sqlglot, table aliases renamed to
+    t0, t1, ... in order of appearance, identifiers and keywords normalized,
+    whitespace and comments dropped. Falls back to whitespace-collapsed text
+    when the query does not parse.
+    """
+    try:
+        tree = sqlglot.parse_one(sql, read="sqlite")
+    except sqlglot.errors.ParseError:
+        return " ".join(sql.split()).lower()
+
+    aliases = {}
+    for table in tree.find_all(exp.Table):
+        if table.alias:
+            aliases.setdefault(table.alias.lower(), f"t{len(aliases)}")
+            table.set("alias", exp.TableAlias(this=exp.to_identifier(aliases[table.alias.lower()])))
+    for column in tree.find_all(exp.Column):
+        if column.table and column.table.lower() in aliases:
+            column.set("table", exp.to_identifier(aliases[column.table.lower()]))
+    return tree.sql(dialect="sqlite", normalize=True, comments=False)
+
+def db_file_version(db_name):
+    """
+    Content version of a SQLite database: mtime and size of the file and its WAL.
+    """
+    version = []
+    for path in (db_name, f"{db_name}-wal"):
+        try:
+            stat = os.stat(path)
+            version.append((stat.st_mtime_ns, stat.st_size))
+        except OSError:
+            version.append(None)
+    return tuple(version)
+
+class SQLResultCache:
+    """
+    LRU cache of query results, bounded by the estimated size of the cached rows.
+
+    Keys combine the canonical SQL, the parameters and the row/byte limits.
+    When the database version changes all entries are dropped. Note that
+    unaliased expression columns keep the name from the first query that
+    filled the entry (e.g. `SUM(t0.Quantity)` vs `SUM(d.Quantity)`).
+    """
+    def __init__(self, max_bytes=32 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._version = None
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def make_key(sql, params=(), *limits) -> str:
+        payload = json.dumps([canonical_sql(sql), list(params), list(limits)], default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _check_version(self, version):
+        if version != self._version:
+            if self._entries:
+                self.invalidations += 1
+                logger.info("SQL result cache invalidated (%d entries)", len(self._entries))
+            self._entries.clear()
+            self._bytes = 0
+            self._version = version
+
+    def get(self, key, version):
+        with self._lock:
+            self._check_version(version)
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key, version, value, size):
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            self._check_version(version)
+            if key in self._entries:
+                self._bytes -= self._entries.pop(key)[1]
+            self._entries[key] = (value, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 3) if total else 0.0,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
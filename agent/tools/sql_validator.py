@@ -0,0 +1,212 @@
+import re
+import math
+import sqlite3
+import logging
+import sqlglot
+from collections import defaultdict
+from sqlglot import exp
+from typing import List, NamedTuple, Optional
+
+logger = logging.getLogger(__name__)
+
+class ValidationResult(NamedTuple):
+    ok: bool
+    sql: str
+    error: Optional[str] = None
+    warnings: List[str] = []
+    estimated_rows: Optional[int] = None
+
+_FENCE = re.compile(r"^\s*```(?:sql)?\s*|\s*```\s*$", re.IGNORECASE)
+_SCAN = re.compile(r"^SCAN (?:TABLE )?(.+?)(?: AS \w+)?(?: USING (?:COVERING )?INDEX .*)?$")
+
+def clean_sql(sql: str) -> str:
+    """
+    Strips markdown code fences and trailing semicolons the LLM sometimes adds.
+    """
+    return _FENCE.sub("", sql or "").strip().rstrip(";").strip()
+
+class SQLValidator:
+    """
+    Checks generated SQL before it reaches the executor.
+
+    Parses with sqlglot (SQLite dialect), accepts a single read-only query,
+    checks tables and columns against the cached schema catalog, and uses
+    `EXPLAIN QUERY PLAN` to compile the statement and estimate the rows
+    touched by full scans. Cartesian joins above `max_cartesian_rows` and
+    scans above `max_scan_rows` are rejected.
+    """
+    def __init__(self, db, max_scan_rows=50_000_000, max_cartesian_rows=100_000):
+        self.db = db
+        self.max_scan_rows = max_scan_rows
+        self.max_cartesian_rows = max_cartesian_rows
+
+    def validate(self, sql: str, table_names: List[str]) -> ValidationResult:
+        sql = clean_sql(sql)
+        if not sql:
+            return ValidationResult(False, sql, "Empty query.")
+
+        try:
+            statements = [s for s in sqlglot.parse(sql, read="sqlite") if s is not None]
+        except sqlglot.errors.ParseError as e:
+            detail = e.errors[0] if e.errors else {}
+            return ValidationResult(False, sql, f"Syntax error: {detail.get('description', e)} (line {detail.get('line')}, col {detail.get('col')}).")
+
+        if len(statements) != 1:
+            return ValidationResult(False, sql, "Only a single SELECT statement is allowed.")
+        tree = statements[0]
+        if not isinstance(tree, exp.Query):
+            return ValidationResult(False, sql, f"Only SELECT queries are allowed, got {tree.key.upper()}.")
+
+        warnings = []
+        error = self._check_identifiers(tree, table_names, warnings)
+        if error:
+            return ValidationResult(False, sql, error)
+
+        for rows in self._cartesian_products(tree):
+            if rows > self.max_cartesian_rows:
+                return ValidationResult(False, sql, f"Cartesian join without a join condition would produce ~{rows} rows; join the tables on their key columns.")
+            warnings.append(f"cartesian join of ~{rows} rows")
+
+        try:
+            tables, _ = self._tables(tree)
+            estimated_rows = self._plan_cost(sql, {t.alias.lower(): t.name for t in tables if t.alias})
+        except sqlite3.Error as e:
+            return ValidationResult(False, sql, str(e))
+
+        if estimated_rows > self.max_scan_rows:
+            return ValidationResult(False, sql, f"Query plan scans ~{estimated_rows} rows; add join conditions or filters.", warnings, estimated_rows)
+        return ValidationResult(True, sql, None, warnings, estimated_rows)
+
+    def _tables(self, tree):
+        cte_names = {cte.alias_or_name.lower() for cte in tree.find_all(exp.CTE)}
+        return [t for t in tree.find_all(exp.Table) if t.name.lower() not in cte_names], cte_names
+
+    def _check_identifiers(self, tree, table_names, warnings):
+        allowed = {name.lower(): name for name in table_names}
+        tables, cte_names = self._tables(tree)
+
+        columns_by_alias = {}
+        all_columns = set()
+        for table in tables:
+            name = table.name.lower()
+            if name not in allowed:
+                return f"Unknown table '{table.name}'. Available tables: {', '.join(table_names)}."
+            columns = {c.lower() for c in self.db.catalog.columns(allowed[name])}
+            columns_by_alias[table.alias_or_name.lower()] = columns
+            all_columns |= columns
+
+        # Output aliases, derived-table aliases and CTE names can be referenced too.
+        aliases = {a.alias.lower() for a in tree.find_all(exp.Alias)}
+        derived = {s.alias_or_name.lower() for s in tree.find_all(exp.Subquery) if s.alias_or_name} | cte_names
+
+        for column in tree.find_all(exp.Column):
+            name = column.name.lower()
+            if not name or isinstance(column.this, exp.Star):
+                continue
+            qualifier = column.table.lower()
+            if qualifier:
+                if qualifier in derived:
+                    continue
+                if qualifier not in columns_by_alias:
+                    return f"Unknown table alias '{column.table}' in '{column.sql()}'."
+                if name not in columns_by_alias[qualifier]:
+                    return f"Unknown column '{column.name}' in table '{column.table}'."
+            elif name not in all_columns and name not in aliases and not derived:
+                if column.this.quoted:
+                    # SQLite reads a double-quoted name that matches no column as a string literal.
+                    warnings.append(f'"{column.name}" is not a column; SQLite treats it as a string literal')
+                    continue
+                return f"Unknown column '{column.name}'."
+        return None
+
+    def _cartesian_products(self, tree):
+        """
+        Yields the estimated row count of every SELECT whose FROM/JOIN
+        sources are not all connected by column equality predicates.
+        """
+        _, cte_names = self._tables(tree)
+        for select in tree.find_all(exp.Select):
+            sources = [select.args.get("from_") or select.args.get("from")] + (select.args.get("joins") or [])
+            tables = [
+                s.this for s in sources
+                if s is not None and isinstance(s.this, exp.Table) and s.this.name.lower() not in cte_names
+            ]
+            if len(tables) < 2:
+                continue
+
+            alias_of = {t.alias_or_name.lower(): t for t in tables}
+            parent = {alias: alias for alias in alias_of}
+
+            def find(alias):
+                while parent[alias] != alias:
+                    alias = parent[alias]
+                return alias
+
+            predicates = [select.args.get("where")] + [j.args.get("on") for j in select.args.get("joins") or []]
+            for predicate in filter(None, predicates):
+                for eq in predicate.find_all(exp.EQ):
+                    left, right = eq.this, eq.expression
+                    if isinstance(left, exp.Column) and isinstance(right, exp.Column):
+                        a, b = self._owner(left, alias_of), self._owner(right, alias_of)
+                        if a and b and a != b:
+                            parent[find(a)] = find(b)
+            for join in select.args.get("joins") or []:
+                if join.args.get("using") and isinstance(join.this, exp.Table):
+                    for alias in alias_of:
+                        if alias != join.this.alias_or_name.lower():
+                            parent[find(join.this.alias_or_name.lower())] = find(alias)
+                            break
+
+            groups = {}
+            for alias, table in alias_of.items():
+                groups.setdefault(find(alias), []).append(table)
+            if len(groups) > 1:
+                yield math.prod(
+                    max(self.db.catalog.row_count(t.name) for t in group) for group in groups.values()
+                )
+
+    def _owner(self, column, alias_of):
+        if column.table:
+            return column.table.lower() if column.table.lower() in alias_of else None
+        owners = [
+            alias for alias, table in alias_of.items()
+            if column.name.lower() in {c.lower() for c in self.db.catalog.columns(table.name)}
+        ]
+        return owners[0] if len(owners) == 1 else None
+
+    def _plan_cost(self, sql, aliases=None):
+        """
+        Compiles the query with EXPLAIN QUERY PLAN and estimates the rows it
+        reads. Within one level of the plan tree the fully scanned tables are
+        nested loops, so their row counts multiply; independent subtrees
+        (scalar and list subqueries, materialized CTEs, compound arms) add
+        their own cost. A correlated subquery runs once per outer row, so its
+        cost is multiplied by the loops of its level. SQLite names aliased
+        tables by their alias in the plan; `aliases` maps them back.
+        """
+        aliases = aliases or {}
+        with self.db.connection() as conn:
+            plan = conn.execute(f"EXPLAIN QUERY PLAN {sql}").fetchall()
+
+        children = defaultdict(list)
+        for node_id, parent, _, detail in plan:
+            children[parent].append((node_id, detail))
+
+        def level_cost(parent):
+            loops = 1
+            subtrees = []
+            for node_id, detail in children[parent]:
+                match = _SCAN.match(detail)
+                if match and "INDEX" not in detail:
+                    try:
+                        table = aliases.get(match.group(1).lower(), match.group(1))
+                        loops *= max(self.db.catalog.row_count(table), 1)
+                    except sqlite3.Error:
+                        # CTEs, subqueries and constant rows are not tables.
+                        pass
+                if children[node_id]:
+                    subtrees.append((detail, level_cost(node_id)))
+            return loops + sum(cost * loops if detail.startswith("CORRELATED") else cost
+                               for detail, cost in subtrees)
+
+        return level_cost(0)
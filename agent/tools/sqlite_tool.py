@@ -1,83 +1,494 @@
+import os
+import re
+import time
+import queue
+import itertools
 import sqlite3
 import logging
+import threading
+from pathlib import Path
+from contextlib import contextmanager
+from typing import List, NamedTuple, Optional
 
-logging.basicConfig(
-    filename="logs/agentlog.log",
-    format='%(asctime)s %(levelname)s %(message)s',
-    filemode='a',
-    level=logging.INFO)
+from .sql_cache import db_file_version
 
-logger = logging.getLogger()
+logger = logging.getLogger(__name__)
 
-class SQLiteClient:
-    def __init__(self, db_name):
+class QueryResult(NamedTuple):
+    rows: List[tuple]
+    columns: List[str]
+    error: Optional[Exception]
+    truncated: bool = False
+    rows_kept: int = 0
+
+def _row_size(row) -> int:
+    # Cheap estimate: text/blob length, 8 bytes for anything else.
+    return sum(len(v) if isinstance(v, (str, bytes)) else 8 for v in row)
+
+class SQLiteConnectionPool:
+    """
+    Thread-safe pool of read-only SQLite connections.
+
+    Connections are opened lazily up to `size` and handed out LIFO so the most
+    recently used (warmest) connection is reused first. With `in_memory=True`
+    the database file is copied once into a shared in-memory database and
+    every pooled connection reads from that copy.
+    """
+    _memory_ids = itertools.count(1)
+
+    def __init__(self, db_name, size=4, in_memory=False, cache_size=-65536, mmap_size=268435456, timeout=30.0):
         self.db_name = db_name
-        self.conn = None
-        self.cursor = None
+        self.size = size
+        self.in_memory = in_memory
+        self.cache_size = cache_size
+        self.mmap_size = mmap_size
+        self.timeout = timeout
 
-    def connect(self):
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._memory_lock = threading.Lock()
+        self._created = 0
+        self._closed = False
+        self._anchor = None
+        self._memory_name = f"northwind_pool_{next(self._memory_ids)}"
+
+        self.hits = 0
+        self.misses = 0
+        self.waits = 0
+        self.wait_time = 0.0
+
+    def _file_uri(self):
+        return f"{Path(self.db_name).resolve().as_uri()}?mode=ro"
+
+    def _memory_uri(self):
+        return f"file:{self._memory_name}?mode=memory&cache=shared"
+
+    def _load_in_memory_copy(self):
+        # The anchor connection keeps the shared in-memory database alive for
+        # as long as the pool is open.
+        self._anchor = sqlite3.connect(self._memory_uri(), uri=True, check_same_thread=False)
+        source = sqlite3.connect(self._file_uri(), uri=True)
+        try:
+            source.backup(self._anchor)
+        finally:
+            source.close()
+        logger.info("Loaded in-memory copy of %s", self.db_name)
+
+    def _open_connection(self):
+        if self.in_memory:
+            with self._memory_lock:
+                if self._anchor is None:
+                    self._load_in_memory_copy()
+
+        uri = self._memory_uri() if self.in_memory else self._file_uri()
+        conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        conn.execute(f"PRAGMA cache_size = {int(self.cache_size)};")
+        conn.execute("PRAGMA temp_store = MEMORY;")
+        conn.execute("PRAGMA query_only = ON;")
+        if not self.in_memory:
+            conn.execute(f"PRAGMA mmap_size = {int(self.mmap_size)};")
+        logger.info("Opened pooled connection to %s", self.db_name)
+        return conn
+
+    def acquire(self):
+        try:
+            conn = self._idle.get_nowait()
+            with self._lock:
+                self.hits += 1
+            return conn
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            if self._closed:
+                raise sqlite3.ProgrammingError("Connection pool is closed")
+            create = self._created < self.size
+            if create:
+                self._created += 1
+                self.misses += 1
+
+        if create:
+            try:
+                return self._open_connection()
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+
+        started = time.perf_counter()
+        try:
+            conn = self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            raise sqlite3.OperationalError(f"Timed out after {self.timeout}s waiting for a connection to {self.db_name}")
+        finally:
+            with self._lock:
+                self.waits += 1
+                self.wait_time += time.perf_counter() - started
+        return conn
+
+    def release(self, conn):
+        if conn.in_transaction:
+            conn.rollback()
+        if self._closed:
+            conn.close()
+            return
+        self._idle.put(conn)
+
+    @contextmanager
+    def connection(self):
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+        if self._anchor is not None:
+            self._anchor.close()
+            self._anchor = None
+        logger.info("Closed connection pool for %s", self.db_name)
+
+    def stats(self):
+        with self._lock:
+            borrows = self.hits + self.misses + self.waits
+            return {
+                "size": self.size,
+                "open": self._created,
+                "idle": self._idle.qsize(),
+                "hits": self.hits,
+                "misses": self.misses,
+                "waits": self.waits,
+                "wait_time_s": round(self.wait_time, 4),
+                "hit_rate": round(self.hits / borrows, 3) if borrows else 0.0,
+            }
+
+class SchemaCatalog:
+    """
+    Precomputed schema descriptions keyed by table list.
+
+    Table metadata is read once and rendered descriptions are cached; the
+    whole catalog is rebuilt when the database file mtime or
+    `PRAGMA schema_version` changes. Foreign keys, row counts and sample
+    distinct values of text columns can be added to the description.
+    """
+    def __init__(self, client, include_foreign_keys=False, include_row_counts=False, sample_values=0):
+        self.client = client
+        self.include_foreign_keys = include_foreign_keys
+        self.include_row_counts = include_row_counts
+        self.sample_values = sample_values
+
+        self._lock = threading.Lock()
+        self._version = None
+        self._tables = {}
+        self._rendered = {}
+        self._row_counts = {}
+
+    def _db_version(self, conn):
+        try:
+            mtime = os.stat(self.client.db_name).st_mtime_ns
+        except OSError:
+            mtime = None
+        schema_version = conn.execute("PRAGMA schema_version;").fetchone()[0]
+        return mtime, schema_version
+
+    def _check_version(self, conn):
+        version = self._db_version(conn)
+        if version != self._version:
+            if self._version is not None:
+                logger.info("Schema catalog invalidated for %s", self.client.db_name)
+            self._version = version
+            self._tables = {}
+            self._rendered = {}
+            self._row_counts = {}
+
+    @staticmethod
+    def _view_base_table(conn, name):
+        row = conn.execute(
+            "SELECT sql FROM sqlite_master WHERE type='view' AND name=?;", (name,)
+        ).fetchone()
+        if not row or not row[0]:
+            return None
+        match = re.search(r'SELECT\s+\*\s+FROM\s+(?:"([^"]+)"|(\w+))\s*;?\s*$', row[0], re.IGNORECASE)
+        return (match.group(1) or match.group(2)) if match else None
+
+    def _load_table(self, conn, table):
+        columns = [
+            {"name": name, "type": ctype, "pk": bool(pk)}
+            for cid, name, ctype, notnull, dflt, pk in conn.execute(f"PRAGMA table_info('{table}');").fetchall()
+        ]
+        info = {"columns": columns, "base_table": self._view_base_table(conn, table)}
+
+        if self.include_foreign_keys:
+            source = info["base_table"] or table
+            info["foreign_keys"] = [
+                {"column": row[3], "table": row[2], "to": row[4]}
+                for row in conn.execute(f"PRAGMA foreign_key_list('{source}');").fetchall()
+            ]
+
+        if self.include_row_counts:
+            info["row_count"] = conn.execute(f'SELECT COUNT(*) FROM "{table}";').fetchone()[0]
+
+        if self.sample_values:
+            samples = {}
+            for col in columns:
+                if "CHAR" not in col["type"].upper() and "TEXT" not in col["type"].upper():
+                    continue
+                values = conn.execute(
+                    f'SELECT DISTINCT "{col["name"]}" FROM "{table}" WHERE "{col["name"]}" IS NOT NULL LIMIT ?;',
+                    (self.sample_values + 1,)
+                ).fetchall()
+                # Only low-cardinality columns carry useful sample values.
+                if 0 < len(values) <= self.sample_values and all(len(str(v[0])) <= 40 for v in values):
+                    samples[col["name"]] = [v[0] for v in values]
+            info["samples"] = samples
+
+        return info
+
+    def _render(self, tables):
+        base_to_view = {
+            self._tables[t]["base_table"]: t for t in tables if self._tables[t]["base_table"]
+        }
+        lines = []
+        for t in tables:
+            info = self._tables[t]
+            lines.append("")
+            header = f"Table Name: **{t}**"
+            if "row_count" in info:
+                header += f" ({info['row_count']} rows)"
+            lines.append(header)
+            for col in info["columns"]:
+                line = f"  - {col['name']} {col['type']}"
+                if col["name"] in info.get("samples", {}):
+                    line += f" (e.g. {', '.join(repr(v) for v in info['samples'][col['name']])})"
+                lines.append(line)
+            for fk in info.get("foreign_keys", []):
+                target = base_to_view.get(fk["table"], fk["table"])
+                lines.append(f"  * {fk['column']} -> {target}.{fk['to'] or fk['column']}")
+        return "\n".join(lines) + "\n"
+
+    def _table_info(self, conn, table):
+        # Callers hold `_lock` and have checked the version, so an invalidation can't drop the entry midway.
+        if table not in self._tables:
+            self._tables[table] = self._load_table(conn, table)
+        return self._tables[table]
+
+    def describe(self, tables) -> str:
+        key = tuple(tables)
+        with self.client.connection() as conn, self._lock:
+            self._check_version(conn)
+            if key not in self._rendered:
+                for t in tables:
+                    self._table_info(conn, t)
+                self._rendered[key] = self._render(tables)
+            return self._rendered[key]
+
+    def columns(self, table):
+        """
+        Returns the column names of `table` from the catalog.
+        """
+        with self.client.connection() as conn, self._lock:
+            self._check_version(conn)
+            return [col["name"] for col in self._table_info(conn, table)["columns"]]
+
+    def row_count(self, table):
+        """
+        Returns the cached row count of a table or view.
+        """
+        with self.client.connection() as conn, self._lock:
+            self._check_version(conn)
+            if table not in self._row_counts:
+                self._row_counts[table] = conn.execute(f'SELECT COUNT(*) FROM "{table}";').fetchone()[0]
+            return self._row_counts[table]
+
+    def warm(self, tables):
         try:
-            self.conn = sqlite3.connect(self.db_name)
-            self.cursor = self.conn.cursor()
-            logger.info(f"Connected to {self.db_name}")
+            self.describe(tables)
+            logger.info("Schema catalog warmed for %s", tables)
         except sqlite3.Error as e:
-            print(f"Error connecting to database: {e}")
+            logger.error("Error warming schema catalog: %s", e)
+
+class SQLiteClient:
+    def __init__(self, db_name, pool_size=4, in_memory=False, schema_options=None,
+                 max_rows=1000, max_bytes=1_000_000, timeout=10.0, result_cache=None):
+        self.db_name = db_name
+        self.result_cache = result_cache
+        self.max_rows = max_rows
+        self.max_bytes = max_bytes
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self.in_memory = in_memory
+        self.pool = None
+        self._pool_lock = threading.Lock()
+        self.catalog = SchemaCatalog(self, **(schema_options or {}))
+
+    def connect(self):
+        with self._pool_lock:
+            if self.pool is None:
+                self.pool = SQLiteConnectionPool(self.db_name, size=self.pool_size, in_memory=self.in_memory)
+                logger.info("Connected to %s", self.db_name)
+        return self.pool
 
     def disconnect(self):
-        if self.conn:
-            self.conn.close()
-            logger.info(f"Disconnected from {self.db_name}")
+        with self._pool_lock:
+            if self.pool:
+                self.pool.close()
+                self.pool = None
+                logger.info("Disconnected from %s", self.db_name)
+
+    @contextmanager
+    def connection(self):
+        """
+        Borrows a pooled read-only connection for the duration of the block.
+        """
+        pool = self.pool or self.connect()
+        with pool.connection() as conn:
+            yield conn
+
+    def pool_stats(self):
+        return self.pool.stats() if self.pool else {}
+
+    def cache_stats(self):
+        return self.result_cache.stats() if self.result_cache is not None else {}
 
     def fetch_all(self, table_name):
         try:
-            self.cursor.execute(f"SELECT * FROM {table_name}")
-            rows = self.cursor
-            return rows
+            with self.connection() as conn:
+                return conn.execute(f'SELECT * FROM "{table_name}"').fetchall()
         except sqlite3.Error as e:
-            logger.error(f"Error fetching data: {e}")
+            logger.error("Error fetching data: %s", e)
             return []
 
+    def existing_tables(self, table_names):
+        """
+        Returns the subset of `table_names` that exist as tables or views, in the given order.
+        """
+        with self.connection() as conn:
+            existing = {row[0].lower() for row in conn.execute(
+                "SELECT name FROM sqlite_master WHERE type IN ('table', 'view');"
+            ).fetchall()}
+        return [t for t in table_names if t.lower() in existing]
+
     def extract_schema(self, table_name = None) -> str:
         if isinstance(table_name, str):
             tables = [table_name]
         elif isinstance(table_name, list):
             tables = table_name
         else:
-            tables = self.cursor.execute(
-                "SELECT name FROM sqlite_master WHERE type='table';"
-            ).fetchall()
-            
-        schema_text = ""
+            with self.connection() as conn:
+                tables = [row[0] for row in conn.execute(
+                    "SELECT name FROM sqlite_master WHERE type='table';"
+                ).fetchall()]
+        return self.catalog.describe(tables)
 
-        for t in tables:
-            cols = self.cursor.execute(f"PRAGMA table_info('{t}');").fetchall()
-            schema_text += f"\nTable Name: **{t}**\n"
-            for col in cols:
-                cid, name, ctype, notnull, dflt, pk = col
-                schema_text += f"  - {name} {ctype}\n"
-        return schema_text 
-
-    def execute_query(self, query, params=(), return_with_columns_names=False):
+    @contextmanager
+    def _deadline(self, conn, timeout):
         """
-        Executes a custom SQL query.
+        Aborts the running statement with `OperationalError: interrupted` once `timeout` seconds pass.
         """
+        if not timeout:
+            yield
+            return
+
+        deadline = time.monotonic() + timeout
+        conn.set_progress_handler(lambda: int(time.monotonic() > deadline), 10000)
         try:
-            self.cursor.execute(query, params, )
-            self.conn.commit()
-            rows = self.cursor.fetchall()
-        except sqlite3.Error as e:
-            logger.error(f"Error executing query: {e}")
-            return [], [], e
-        
-        column_names = [description[0] for description in self.cursor.description]
+            yield
+        finally:
+            conn.set_progress_handler(None, 0)
+
+    def iter_query(self, query, params=(), batch_size=256, timeout=None):
+        """
+        Streams the rows of a query in batches from a pooled connection.
+
+        The first item yielded is the list of column names.
+        """
+        timeout = self.timeout if timeout is None else timeout
+        with self.connection() as conn, self._deadline(conn, timeout):
+            cursor = conn.execute(query, params)
+            yield [description[0] for description in cursor.description or []]
+            while True:
+                batch = cursor.fetchmany(batch_size)
+                if not batch:
+                    break
+                yield batch
+
+    def execute_query(self, query, params=(), return_with_columns_names=False,
+                      max_rows=None, max_bytes=None, timeout=None) -> QueryResult:
+        """
+        Executes a custom SQL query on a pooled read-only connection.
+
+        Reading stops at `max_rows` rows or `max_bytes` of (estimated) row
+        data, and the statement is interrupted after `timeout` seconds; the
+        result is then flagged as truncated and `rows_kept` is a lower bound
+        on the rows the query would return. With a `result_cache`, complete
+        results are served from and stored in the cache.
+        """
+        max_rows = self.max_rows if max_rows is None else max_rows
+        max_bytes = self.max_bytes if max_bytes is None else max_bytes
+
+        result = None
+        if self.result_cache is not None:
+            key = self.result_cache.make_key(query, params, max_rows, max_bytes)
+            version = db_file_version(self.db_name)
+            result = self.result_cache.get(key, version)
+            if result is not None:
+                result = result._replace(rows=list(result.rows))
+
+        if result is None:
+            result, size, interrupted = self._read_query(query, params, max_rows, max_bytes, timeout)
+            # Interrupted reads depend on timing, so only complete results are cached.
+            if self.result_cache is not None and result.error is None and not interrupted:
+                self.result_cache.set(key, version, result._replace(rows=tuple(result.rows)), size)
+
         if return_with_columns_names:
             results_with_names = [
-                {col_name: row[i] for i, col_name in enumerate(column_names)}
-                for row in rows
+                {col_name: row[i] for i, col_name in enumerate(result.columns)}
+                for row in result.rows
             ]
-            return results_with_names, column_names
-        return rows, column_names, None
-    
+            return results_with_names, result.columns
+        return result
+
+    def _read_query(self, query, params, max_rows, max_bytes, timeout):
+        rows, column_names, size, truncated = [], [], 0, False
+        stream = self.iter_query(query, params, timeout=timeout)
+        try:
+            column_names = next(stream)
+            for batch in stream:
+                for row in batch:
+                    size += _row_size(row)
+                    if (max_rows and len(rows) >= max_rows) or (max_bytes and size > max_bytes):
+                        truncated = True
+                        break
+                    rows.append(row)
+                if truncated:
+                    break
+        except sqlite3.OperationalError as e:
+            if str(e) != "interrupted":
+                logger.error("Error executing query: %s", e)
+                return QueryResult([], [], e), 0, False
+            if not rows:
+                e = sqlite3.OperationalError(f"Query interrupted: exceeded the {timeout or self.timeout}s timeout")
+                logger.error("Error executing query: %s", e)
+                return QueryResult([], [], e), 0, True
+            logger.warning("Query result truncated at %s rows / %s bytes", len(rows), size)
+            return QueryResult(rows, column_names, None, True, len(rows)), size, True
+        except sqlite3.Error as e:
+            logger.error("Error executing query: %s", e)
+            return QueryResult([], [], e), 0, False
+        finally:
+            stream.close()
+
+        if truncated:
+            logger.warning("Query result truncated at %s rows / %s bytes", len(rows), size)
+        return QueryResult(rows, column_names, None, truncated, len(rows)), size, False
+
 if __name__ == "__main__":
     db = SQLiteClient(r"data\database\northwind.db")
     try:
@@ -86,7 +497,8 @@ if __name__ == "__main__":
         table_names = ["Orders", "Order Details", "Products"]
         print( db.extract_schema(table_names) )
         print( db.execute_query("SELECT CategoryID, CategoryName, Description FROM Categories LIMIT 2", return_with_columns_names=True) )
+        print( db.pool_stats() )
     except Exception as e:
         print(e)
     finally:
-        db.disconnect()
\ No newline at end of file
+        db.disconnect()
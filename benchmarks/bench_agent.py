@@ -0,0 +1,228 @@
+"""
+Agent benchmark and regression check with the stub LLM (no Ollama/Groq needed).
+
+Measures end-to-end throughput and latency over the eval questions,
+per-node latency from the tracer, the memory high-water mark, and
+retriever / SQL micro-benchmarks. Results are compared against a stored
+baseline (benchmarks/baseline.json, recorded with the stub) and the
+command exits with status 1 when a metric regresses by more than
+`--tolerance`, or when there is no baseline to compare against.
+
+The baseline stores the row counts of the agent's tables; on a database
+with other counts the SQL timings are not comparable, so the comparison
+is skipped until the baseline is re-recorded there.
+
+    python -m benchmarks.bench_agent --update-baseline
+    python -m benchmarks.bench_agent --repeats 3 --workers 4
+"""
+import sys
+import json
+import time
+import argparse
+import tracemalloc
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+from agent.graph_hybrid import invoke_agent
+from helper.clients import get_db, get_retriever, get_sql_validator, get_table_names
+from helper.tracing import Tracer, latency_stats
+from benchmarks.stub_llm import StubLLM, DEFAULT_RESPONSES
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+DEFAULT_BASELINE = Path(__file__).with_name("baseline.json")
+
+def time_calls(fn, args_list, repeats):
+    latencies = []
+    for args in args_list:
+        for _ in range(repeats):
+            started = time.perf_counter()
+            fn(*args)
+            latencies.append((time.perf_counter() - started) * 1000)
+    return latencies
+
+def bench_micro(questions, stub, repeats):
+    retriever = get_retriever()
+    db = get_db()
+    validator = get_sql_validator()
+    table_names = get_table_names()
+
+    queries = [(q["responses"]["SQLGeneration"]["sql"],) for q in stub.questions if "SQLGeneration" in q["responses"]]
+    report = {
+        "retriever_query": latency_stats(time_calls(retriever.query, [(q["question"], 4) for q in questions], repeats)),
+        "sql_execute": latency_stats(time_calls(db.execute_query, queries, repeats)),
+    }
+    if validator is not None:
+        report["sql_validate"] = latency_stats(
+            time_calls(validator.validate, [(sql, table_names) for sql, in queries], repeats)
+        )
+    return report
+
+def run_batch(questions, stub, tracer, workers, repeats):
+    records = [q for q in questions for _ in range(repeats)]
+    configurable = {"llm": stub, "llm_cache": None, "tracer": tracer}
+
+    def run(record):
+        started = time.perf_counter()
+        invoke_agent(record["id"], record["question"], record["format_hint"], configurable=configurable)
+        return (time.perf_counter() - started) * 1000
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        latencies = list(executor.map(run, records))
+    return latencies, time.perf_counter() - started
+
+def bench_end_to_end(questions, stub, workers, repeats):
+    # Warm-up run builds the clients and imports lazily loaded modules.
+    run_batch(questions[:1], stub, None, 1, 1)
+
+    tracer = Tracer()
+    latencies, wall_s = run_batch(questions, stub, tracer, workers, repeats)
+    summary = tracer.summary()
+    return {
+        "throughput_qps": round(len(latencies) / wall_s, 3),
+        "latency": latency_stats(latencies),
+        "nodes": summary["spans"],
+        "llm": summary["llm"],
+    }
+
+def bench_memory(questions, stub):
+    tracemalloc.start()
+    run_batch(questions, stub, None, 1, 1)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    report = {"peak_traced_mb": round(peak / 1024 / 1024, 3)}
+    if resource is not None:
+        # ru_maxrss is in KiB on Linux, bytes on macOS.
+        scale = 1024 if sys.platform != "darwin" else 1024 * 1024
+        report["max_rss_mb"] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale, 1)
+    return report
+
+def database_fingerprint():
+    return {table: get_db().catalog.row_count(table) for table in sorted(get_table_names())}
+
+def flatten(report, prefix=""):
+    metrics = {}
+    for key, value in report.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            metrics.update(flatten(value, name + "."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            metrics[name] = value
+    return metrics
+
+def envelope(reports, key=""):
+    """
+    Merges several runs into one baseline holding the worst value of each
+    metric (lowest throughput, highest latency and memory), so the normal
+    run-to-run spread does not read as a regression.
+    """
+    first = reports[0]
+    if isinstance(first, dict):
+        return {k: envelope([r[k] for r in reports if k in r], k) for k in first}
+    if isinstance(first, (int, float)) and not isinstance(first, bool) and key != "count":
+        return min(reports) if key.endswith("_qps") else max(reports)
+    return first
+
+def compare(current, baseline, tolerance, min_delta_ms, min_delta_mb, min_samples=20):
+    """
+    Returns (metric, baseline, current) for every regressed metric. Throughput
+    must not drop, p50/p95 latencies and memory must not grow, by more than
+    `tolerance`; deltas under `min_delta_*` are treated as noise, and so are
+    p95s over fewer than `min_samples` calls (they are just the slowest call).
+    Per-node spans are compared on p50 only: their p95 under concurrent
+    workers mostly measures how long a thread waited for the GIL.
+    """
+    regressions = []
+    current, baseline = flatten(current), flatten(baseline)
+    for name, base in baseline.items():
+        if name not in current or name.endswith("max_ms"):
+            continue
+        if name.endswith("p95_ms"):
+            count = name.rsplit(".", 1)[0] + ".count"
+            if name.startswith("end_to_end.nodes.") or min(current.get(count, 0), baseline.get(count, 0)) < min_samples:
+                continue
+        value = current[name]
+        if name.endswith("_qps"):
+            regressed = value < base * (1 - tolerance)
+        elif name.endswith("_ms"):
+            regressed = value > base * (1 + tolerance) and value - base > min_delta_ms
+        elif name.endswith("_mb"):
+            regressed = value > base * (1 + tolerance) and value - base > min_delta_mb
+        else:
+            continue
+        if regressed:
+            regressions.append((name, base, value))
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the agent with a stub LLM and check for regressions")
+    parser.add_argument("--questions", type=str, default="sample_questions_hybrid_eval.jsonl")
+    parser.add_argument("--responses", type=str, default=str(DEFAULT_RESPONSES), help="Recorded stub LLM responses")
+    parser.add_argument("--latency-ms", type=float, default=None, help="Stub latency per LLM call (default: recorded per node)")
+    parser.add_argument("--repeats", type=int, default=5, help="Times each question is run")
+    parser.add_argument("--workers", type=int, default=4, help="Questions processed concurrently")
+    parser.add_argument("--baseline", type=str, default=str(DEFAULT_BASELINE))
+    parser.add_argument("--update-baseline", action="store_true", help="Store the worst of --baseline-runs runs as the new baseline")
+    parser.add_argument("--baseline-runs", type=int, default=3, help="Runs merged into a new baseline (default: 3)")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed relative slowdown (default: 25%%)")
+    parser.add_argument("--min-delta-ms", type=float, default=10.0, help="Latency changes below this are ignored")
+    parser.add_argument("--min-delta-mb", type=float, default=2.0, help="Memory changes below this are ignored")
+    parser.add_argument("--min-samples", type=int, default=20, help="p95 latencies over fewer calls are ignored")
+    args = parser.parse_args()
+
+    baseline_path = Path(args.baseline)
+    if not args.update_baseline and not baseline_path.exists():
+        sys.exit(f"No baseline at {baseline_path}; run with --update-baseline to create one")
+
+    with open(args.questions, "r", encoding="utf-8") as file:
+        questions = [json.loads(line) for line in file if line.strip()]
+    stub = StubLLM(args.responses, latency_ms=args.latency_ms)
+
+    def run():
+        return {
+            "config": {"repeats": args.repeats, "workers": args.workers, "stub_latency_ms": stub.latency_ms,
+                       "database": database_fingerprint()},
+            "micro": bench_micro(questions, stub, args.repeats),
+            "end_to_end": bench_end_to_end(questions, stub, args.workers, args.repeats),
+            "memory": bench_memory(questions, stub),
+        }
+
+    if args.update_baseline:
+        report = envelope([run() for _ in range(max(args.baseline_runs, 1))])
+        print(json.dumps(report, indent=2))
+        with open(baseline_path, "w", encoding="utf-8") as file:
+            json.dump(report, file, indent=2)
+        print(f"Baseline written to {baseline_path}")
+        return
+
+    report = run()
+    print(json.dumps(report, indent=2))
+
+    with open(baseline_path, "r", encoding="utf-8") as file:
+        baseline = json.load(file)
+    database = report["config"]["database"]
+    if (baseline.get("config") or {}).get("database") != database:
+        print(f"\nSkipping the comparison: {baseline_path} was recorded on a database with row counts "
+              f"{(baseline.get('config') or {}).get('database')}, this one has {database}. "
+              "Re-record it here with --update-baseline.")
+        return
+    if baseline.get("config") != report["config"]:
+        print(f"WARNING: baseline was recorded with {baseline.get('config')}, this run used {report['config']}")
+
+    baseline.pop("config", None)
+    measured = {key: value for key, value in report.items() if key != "config"}
+    regressions = compare(measured, baseline, args.tolerance, args.min_delta_ms, args.min_delta_mb, args.min_samples)
+    if regressions:
+        print(f"\nPERFORMANCE REGRESSION ({len(regressions)} metrics beyond {args.tolerance:.0%}):")
+        for name, base, value in regressions:
+            print(f"  {name}: {base} -> {value}")
+        sys.exit(1)
+    print(f"\nNo regressions against {baseline_path} (tolerance {args.tolerance:.0%})")
+
+if __name__ == "__main__":
+    main()
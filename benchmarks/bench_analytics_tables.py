@@ -0,0 +1,110 @@
+"""
+Analytics-table benchmark: eval-set queries over the demo_* views vs the
+materialized fact_order_lines table.
+
+Build the table first with `python -m agent.tools.analytics_tables --db <path>`.
+
+    python -m benchmarks.bench_analytics_tables --db data/database/northwind.db
+"""
+import json
+import time
+import sqlite3
+import argparse
+import statistics
+from pathlib import Path
+
+# (views query, fact table query) per eval question that needs SQL.
+QUERIES = {
+    "hybrid_top_category_qty_summer_1997": (
+        """SELECT c.CategoryName, SUM(d.Quantity) AS quantity
+           FROM demo_order_details d
+           JOIN demo_orders o ON o.OrderID = d.OrderID
+           JOIN demo_products p ON p.ProductID = d.ProductID
+           JOIN Categories c ON c.CategoryID = p.CategoryID
+           WHERE date(o.OrderDate) BETWEEN '1997-06-01' AND '1997-06-30'
+           GROUP BY c.CategoryName ORDER BY quantity DESC LIMIT 1""",
+        """SELECT CategoryName, SUM(Quantity) AS quantity
+           FROM fact_order_lines
+           WHERE OrderDate BETWEEN '1997-06-01' AND '1997-06-30'
+           GROUP BY CategoryName ORDER BY quantity DESC LIMIT 1""",
+    ),
+    "hybrid_aov_winter_1997": (
+        """SELECT ROUND(SUM(d.UnitPrice * d.Quantity * (1 - d.Discount)) / COUNT(DISTINCT o.OrderID), 2)
+           FROM demo_order_details d
+           JOIN demo_orders o ON o.OrderID = d.OrderID
+           WHERE date(o.OrderDate) BETWEEN '1997-12-01' AND '1997-12-31'""",
+        """SELECT ROUND(SUM(Revenue) / COUNT(DISTINCT OrderID), 2)
+           FROM fact_order_lines
+           WHERE OrderDate BETWEEN '1997-12-01' AND '1997-12-31'""",
+    ),
+    "sql_top3_products_by_revenue_alltime": (
+        """SELECT p.ProductName, ROUND(SUM(d.UnitPrice * d.Quantity * (1 - d.Discount)), 2) AS revenue
+           FROM demo_order_details d
+           JOIN demo_products p ON p.ProductID = d.ProductID
+           GROUP BY p.ProductID ORDER BY revenue DESC LIMIT 3""",
+        """SELECT ProductName, ROUND(SUM(Revenue), 2) AS revenue
+           FROM fact_order_lines
+           GROUP BY ProductID ORDER BY revenue DESC LIMIT 3""",
+    ),
+    "hybrid_revenue_beverages_summer_1997": (
+        """SELECT ROUND(SUM(d.UnitPrice * d.Quantity * (1 - d.Discount)), 2)
+           FROM demo_order_details d
+           JOIN demo_orders o ON o.OrderID = d.OrderID
+           JOIN demo_products p ON p.ProductID = d.ProductID
+           JOIN Categories c ON c.CategoryID = p.CategoryID
+           WHERE c.CategoryName = 'Beverages'
+             AND date(o.OrderDate) BETWEEN '1997-06-01' AND '1997-06-30'""",
+        """SELECT ROUND(SUM(Revenue), 2)
+           FROM fact_order_lines
+           WHERE CategoryName = 'Beverages'
+             AND OrderDate BETWEEN '1997-06-01' AND '1997-06-30'""",
+    ),
+    "hybrid_best_customer_margin_1997": (
+        """SELECT cu.CompanyName, ROUND(SUM((d.UnitPrice - 0.7 * d.UnitPrice) * d.Quantity * (1 - d.Discount)), 2) AS margin
+           FROM demo_order_details d
+           JOIN demo_orders o ON o.OrderID = d.OrderID
+           JOIN Customers cu ON cu.CustomerID = o.CustomerID
+           WHERE strftime('%Y', o.OrderDate) = '1997'
+           GROUP BY cu.CompanyName ORDER BY margin DESC LIMIT 1""",
+        """SELECT CustomerName, ROUND(SUM(0.3 * UnitPrice * Quantity * (1 - Discount)), 2) AS margin
+           FROM fact_order_lines
+           WHERE OrderYear = 1997
+           GROUP BY CustomerName ORDER BY margin DESC LIMIT 1""",
+    ),
+}
+
+def time_query(conn, sql, repeats):
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        rows = conn.execute(sql).fetchall()
+        timings.append(time.perf_counter() - started)
+    return rows, statistics.median(timings)
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare eval-set query latency on views vs fact_order_lines")
+    parser.add_argument("--db", type=str, required=True, help="Path to the SQLite database")
+    parser.add_argument("--repeats", type=int, default=20)
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(f"{Path(args.db).resolve().as_uri()}?mode=ro", uri=True)
+    report = {}
+    for question_id, (views_sql, fact_sql) in QUERIES.items():
+        views_rows, views_s = time_query(conn, views_sql, args.repeats)
+        fact_rows, fact_s = time_query(conn, fact_sql, args.repeats)
+        report[question_id] = {
+            "views_ms": round(views_s * 1000, 3),
+            "fact_ms": round(fact_s * 1000, 3),
+            "speedup": round(views_s / fact_s, 2) if fact_s else None,
+            "same_result": [list(r) for r in views_rows] == [list(r) for r in fact_rows],
+        }
+    conn.close()
+
+    report["total"] = {
+        "views_ms": round(sum(r["views_ms"] for r in report.values()), 3),
+        "fact_ms": round(sum(r["fact_ms"] for r in report.values()), 3),
+    }
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
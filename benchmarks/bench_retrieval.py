@@ -0,0 +1,112 @@
+"""
+Retriever benchmark: TfidfRetriever vs HybridRetriever.
+
+Reports build time, resident memory, per-query latency and hit@k on the
+eval questions (a hit is a top-k chunk from a doc that answers the
+question). Each retriever is built and queried in its own process, so the
+RSS figures include native allocations (faiss, torch) and one retriever's
+peak does not carry over to the next.
+
+    python -m benchmarks.bench_retrieval --docs docs --k 3
+"""
+import sys
+import json
+import time
+import argparse
+import statistics
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from agent.rag.retrieval import MarkdownLoaderAndSplitter, TfidfRetriever
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Docs that hold the answer for each eval question; sql-only questions are not scored.
+RELEVANT_DOCS = {
+    "rag_policy_beverages_return_days": {"product_policy.md"},
+    "hybrid_top_category_qty_summer_1997": {"marketing_calendar.md"},
+    "hybrid_aov_winter_1997": {"kpi_definitions.md", "marketing_calendar.md"},
+    "hybrid_revenue_beverages_summer_1997": {"marketing_calendar.md"},
+    "hybrid_best_customer_margin_1997": {"kpi_definitions.md"},
+}
+
+def max_rss_mb():
+    if resource is None:
+        return None
+    # ru_maxrss is in KiB on Linux, bytes on macOS.
+    scale = 1024 if sys.platform != "darwin" else 1024 * 1024
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale, 1)
+
+def build(name, chunks, args):
+    if name == "tfidf":
+        return TfidfRetriever(chunks, k=args.k)
+
+    from agent.rag.hybrid_retrieval import HybridRetriever, SentenceTransformerEmbedder
+
+    # Model loading counts towards the hybrid build time and memory.
+    return HybridRetriever(chunks, SentenceTransformerEmbedder(args.embedding_model), k=args.k, ef_search=args.ef_search)
+
+def measure(name, args, questions):
+    """
+    Builds and evaluates one retriever; runs in a fresh process.
+    """
+    chunks = MarkdownLoaderAndSplitter(args.docs).chunks
+    rss_before = max_rss_mb()
+    started = time.perf_counter()
+    retriever = build(name, chunks, args)
+    build_s = time.perf_counter() - started
+    rss_built = max_rss_mb()
+
+    report = {"build_s": round(build_s, 4)}
+    if rss_before is not None:
+        report["build_rss_mb"] = round(rss_built - rss_before, 1)
+        report["peak_rss_mb"] = rss_built
+    return {**report, **evaluate(retriever, questions, args.k, args.repeats)}
+
+def evaluate(retriever, questions, k, repeats):
+    latencies = []
+    hits = 0
+    for record in questions:
+        for _ in range(repeats):
+            started = time.perf_counter()
+            results = retriever.query(record["question"], k)
+            latencies.append(time.perf_counter() - started)
+
+        sources = {r.metadata["source"].replace("\\", "/").rsplit("/", 1)[-1] for r in results}
+        hits += bool(sources & RELEVANT_DOCS[record["id"]])
+
+    latencies.sort()
+    return {
+        "latency_ms_p50": round(statistics.median(latencies) * 1000, 3),
+        "latency_ms_p95": round(latencies[int(0.95 * (len(latencies) - 1))] * 1000, 3),
+        f"hit@{k}": round(hits / len(questions), 3),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare TF-IDF and hybrid retrievers")
+    parser.add_argument("--docs", type=str, default="docs")
+    parser.add_argument("--questions", type=str, default="sample_questions_hybrid_eval.jsonl")
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--repeats", type=int, default=20)
+    parser.add_argument("--embedding-model", type=str, default="sentence-transformers/all-MiniLM-L6-v2")
+    parser.add_argument("--ef-search", type=int, default=64)
+    parser.add_argument("--skip-hybrid", action="store_true", help="Only benchmark TfidfRetriever")
+    args = parser.parse_args()
+
+    with open(args.questions, "r", encoding="utf-8") as file:
+        questions = [json.loads(line) for line in file if line.strip()]
+    questions = [q for q in questions if q["id"] in RELEVANT_DOCS]
+
+    names = ["tfidf"] if args.skip_hybrid else ["tfidf", "hybrid"]
+    report = {}
+    for name in names:
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+            report[name] = pool.submit(measure, name, args, questions).result()
+
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
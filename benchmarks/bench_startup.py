@@ -0,0 +1,62 @@
+"""
+Startup benchmark: import time of the agent and time to the first answer.
+
+Each measurement runs in a fresh interpreter so module caches are cold.
+
+    python -m benchmarks.bench_startup --runs 5 --llm ollama
+"""
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+IMPORT_SNIPPET = """
+import time, json
+started = time.perf_counter()
+import agent.graph_hybrid
+print(json.dumps({"import_s": time.perf_counter() - started}))
+"""
+
+FIRST_ANSWER_SNIPPET = """
+import time, json
+started = time.perf_counter()
+from agent.graph_hybrid import invoke_agent
+imported = time.perf_counter()
+invoke_agent({id!r}, {question!r}, {format_hint!r}, llm={llm!r})
+print(json.dumps({{"import_s": imported - started, "first_answer_s": time.perf_counter() - started}}))
+"""
+
+def run_snippet(snippet):
+    out = subprocess.run([sys.executable, "-c", snippet], capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+def summarize(values):
+    return {
+        "min": round(min(values), 4),
+        "median": round(statistics.median(values), 4),
+        "max": round(max(values), 4),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure agent import time and time to first answer")
+    parser.add_argument("--runs", type=int, default=5, help="Number of cold runs per measurement")
+    parser.add_argument("--question-file", type=str, default="sample_questions_hybrid_eval.jsonl")
+    parser.add_argument("--llm", type=str, default=None, help="LLM backend used for the first answer")
+    parser.add_argument("--skip-answer", action="store_true", help="Only measure import time (no LLM needed)")
+    args = parser.parse_args()
+
+    report = {"import_s": summarize([run_snippet(IMPORT_SNIPPET)["import_s"] for _ in range(args.runs)])}
+
+    if not args.skip_answer:
+        with open(args.question_file, "r", encoding="utf-8") as file:
+            record = json.loads(file.readline())
+        snippet = FIRST_ANSWER_SNIPPET.format(
+            id=record["id"], question=record["question"], format_hint=record["format_hint"], llm=args.llm
+        )
+        report["first_answer_s"] = summarize([run_snippet(snippet)["first_answer_s"] for _ in range(args.runs)])
+
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
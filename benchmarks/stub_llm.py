@@ -0,0 +1,83 @@
+"""
+Deterministic stand-in for the chat model, for benchmarks without Ollama/Groq.
+
+`StubLLM` is a drop-in for `config["configurable"]["llm"]`: it supports
+`with_structured_output(schema, include_raw=...)` and answers from recorded
+responses, sleeping a configurable time per call to mimic model latency.
+It is registered as the `stub` backend, so `--llm stub` works in the runner.
+
+The recorded responses file (see benchmarks/stub_responses.json) holds
+    {"latency_ms": {<schema>: ms}, "defaults": {<schema>: {...}},
+     "questions": [{"id", "question", "responses": {<schema>: {...}}}]}
+A question's responses are used when its text appears in the rendered
+prompt (the last one to appear, if several do); otherwise the schema
+default is returned.
+"""
+import json
+import time
+import random
+import threading
+from pathlib import Path
+from langchain_core.messages import AIMessage
+from langchain_core.runnables import RunnableLambda
+
+DEFAULT_RESPONSES = Path(__file__).with_name("stub_responses.json")
+
+class StubLLM:
+    model = "stub"
+
+    def __init__(self, responses_path=DEFAULT_RESPONSES, latency_ms=None, jitter=0.0, seed=111):
+        """
+        `latency_ms` overrides the recorded per-schema latency (a number for
+        every call, or a {schema: ms} mapping); `jitter` adds up to that
+        fraction of random extra latency from a seeded generator.
+        """
+        with open(responses_path, "r", encoding="utf-8") as file:
+            recorded = json.load(file)
+
+        self.defaults = recorded.get("defaults", {})
+        self.questions = recorded.get("questions", [])
+        self.latency_ms = recorded.get("latency_ms", {})
+        if isinstance(latency_ms, dict):
+            self.latency_ms = {**self.latency_ms, **latency_ms}
+        elif latency_ms is not None:
+            self.latency_ms = {name: float(latency_ms) for name in self.latency_ms}
+        self.jitter = jitter
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls = 0
+
+    def respond(self, schema_name, prompt_text):
+        # The question asked comes after any few-shot examples in the prompt.
+        matches = [(prompt_text.rfind(record["question"]), record) for record in self.questions
+                   if record["question"] in prompt_text and schema_name in record["responses"]]
+        if matches:
+            return max(matches, key=lambda match: match[0])[1]["responses"][schema_name]
+        return self.defaults[schema_name]
+
+    def simulate_latency(self, schema_name):
+        delay = self.latency_ms.get(schema_name, 0) / 1000
+        with self._lock:
+            self.calls += 1
+            if self.jitter:
+                delay *= 1 + self.jitter * self._random.random()
+        if delay:
+            time.sleep(delay)
+
+    def with_structured_output(self, schema, include_raw=False, **kwargs):
+        def run(prompt):
+            text = prompt.to_string()
+            self.simulate_latency(schema.__name__)
+            response = self.respond(schema.__name__, text)
+            parsed = schema.model_validate(response)
+            if not include_raw:
+                return parsed
+
+            raw = AIMessage(content=json.dumps(response), usage_metadata={
+                "input_tokens": len(text) // 4,
+                "output_tokens": len(json.dumps(response)) // 4,
+                "total_tokens": len(text) // 4 + len(json.dumps(response)) // 4,
+            })
+            return {"raw": raw, "parsed": parsed, "parsing_error": None}
+
+        return RunnableLambda(run)
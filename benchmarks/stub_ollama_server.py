@@ -0,0 +1,106 @@
+"""
+Local Ollama-compatible HTTP server that answers from the stub LLM's recorded responses.
+
+Point `OLLAMA_BASE_URL` at it to exercise the real `ChatOllama` client,
+HTTP connection pooling and the LLM gateway without a model:
+
+    python -m benchmarks.stub_ollama_server --port 11435 --latency-ms 200
+    OLLAMA_BASE_URL=http://127.0.0.1:11435 python run_agent_hybrid.py --llm gateway ...
+
+Structured-output requests carry the JSON schema in `format`; its `title`
+selects the recorded response. `--fail-rate` makes a share of requests
+return HTTP 500 to test fallbacks.
+"""
+import json
+import random
+import argparse
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from benchmarks.stub_llm import StubLLM, DEFAULT_RESPONSES
+
+class StubOllamaHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    stub = None
+    fail_rate = 0.0
+    chunk_chars = 8
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == "/api/tags":
+            self._send_json(200, {"models": [{"name": "stub", "model": "stub"}]})
+        elif self.path == "/api/version":
+            self._send_json(200, {"version": "0.0.0-stub"})
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        if self.path != "/api/chat":
+            return self._send_json(404, {"error": "not found"})
+        if random.random() < self.fail_rate:
+            return self._send_json(500, {"error": "stub failure"})
+
+        schema_name = (request.get("format") or {}).get("title", "") if isinstance(request.get("format"), dict) else ""
+        prompt = "\n".join(message.get("content", "") for message in request.get("messages", []))
+        try:
+            self.stub.simulate_latency(schema_name)
+            content = json.dumps(self.stub.respond(schema_name, prompt))
+        except KeyError:
+            return self._send_json(400, {"error": f"no recorded response for schema '{schema_name}'"})
+
+        created_at = datetime.now(timezone.utc).isoformat()
+        message = {"model": request.get("model"), "created_at": created_at, "message": {"role": "assistant", "content": content}, "done": False}
+        final = {
+            "model": request.get("model"), "created_at": created_at, "message": {"role": "assistant", "content": ""},
+            "done": True, "done_reason": "stop", "prompt_eval_count": len(prompt) // 4, "eval_count": len(content) // 4,
+        }
+        if not request.get("stream", True):
+            message.update({key: value for key, value in final.items() if key != "message"})
+            return self._send_json(200, message)
+
+        # Streamed replies arrive in small pieces, like model tokens.
+        pieces = [content[i:i + self.chunk_chars] for i in range(0, len(content), self.chunk_chars)]
+        lines = [{**message, "message": {"role": "assistant", "content": piece}} for piece in pieces] + [final]
+        body = "".join(json.dumps(line) + "\n" for line in lines).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+def serve(host="127.0.0.1", port=11435, responses=DEFAULT_RESPONSES, latency_ms=None, fail_rate=0.0):
+    handler = type("Handler", (StubOllamaHandler,), {
+        "stub": StubLLM(responses, latency_ms=latency_ms),
+        "fail_rate": fail_rate,
+    })
+    return ThreadingHTTPServer((host, port), handler)
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve recorded stub LLM responses over the Ollama chat API")
+    parser.add_argument("--host", type=str, default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--responses", type=str, default=str(DEFAULT_RESPONSES))
+    parser.add_argument("--latency-ms", type=float, default=None, help="Latency per request (default: recorded per node)")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="Share of requests answered with HTTP 500")
+    args = parser.parse_args()
+
+    server = serve(args.host, args.port, args.responses, args.latency_ms, args.fail_rate)
+    print(f"Stub Ollama server on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+-- Denormalized order-line fact table for analytics queries.
+-- Dates are normalized to ISO 'YYYY-MM-DD' text with integer year/month
+-- columns, and line revenue is precomputed.
+
+DROP TABLE IF EXISTS fact_order_lines;
+
+CREATE TABLE fact_order_lines (
+    OrderID INTEGER NOT NULL,
+    ProductID INTEGER NOT NULL,
+    CustomerID TEXT,
+    CustomerName TEXT,
+    EmployeeID INTEGER,
+    OrderDate DATE,
+    OrderYear INTEGER,
+    OrderMonth INTEGER,
+    ProductName TEXT,
+    CategoryID INTEGER,
+    CategoryName TEXT,
+    UnitPrice REAL,
+    Quantity INTEGER,
+    Discount REAL,
+    Revenue REAL,
+    PRIMARY KEY (OrderID, ProductID)
+);
+
+INSERT INTO fact_order_lines
+SELECT
+    od.OrderID,
+    od.ProductID,
+    o.CustomerID,
+    c.CompanyName,
+    o.EmployeeID,
+    date(o.OrderDate),
+    CAST(strftime('%Y', o.OrderDate) AS INTEGER),
+    CAST(strftime('%m', o.OrderDate) AS INTEGER),
+    p.ProductName,
+    p.CategoryID,
+    cat.CategoryName,
+    od.UnitPrice,
+    od.Quantity,
+    od.Discount,
+    od.UnitPrice * od.Quantity * (1 - od.Discount)
+FROM "Order Details" od
+JOIN Orders o ON o.OrderID = od.OrderID
+JOIN Products p ON p.ProductID = od.ProductID
+LEFT JOIN Categories cat ON cat.CategoryID = p.CategoryID
+LEFT JOIN Customers c ON c.CustomerID = o.CustomerID;
+
+CREATE INDEX IF NOT EXISTS idx_fact_order_lines_date
+    ON fact_order_lines (OrderDate, CategoryName, Revenue, Quantity);
+CREATE INDEX IF NOT EXISTS idx_fact_order_lines_category
+    ON fact_order_lines (CategoryName, OrderDate, Revenue, Quantity);
+CREATE INDEX IF NOT EXISTS idx_fact_order_lines_customer
+    ON fact_order_lines (CustomerID, OrderDate, Revenue, UnitPrice, Quantity, Discount);
+CREATE INDEX IF NOT EXISTS idx_fact_order_lines_product
+    ON fact_order_lines (ProductID, ProductName, Revenue);
+
+ANALYZE fact_order_lines;
@@ -1,28 +1,322 @@
-import os 
+import os
+import logging
+import threading
+from functools import wraps
 from dotenv import dotenv_values
-from langchain_ollama import ChatOllama
-from langchain_groq import ChatGroq
 
-from agent.rag.retrieval import MarkdownLoaderAndSplitter, TfidfRetriever
-from agent.tools.sqlite_tool import SQLiteClient
+logger = logging.getLogger(__name__)
 
 app_setting = dotenv_values()
 
-docs = MarkdownLoaderAndSplitter(app_setting.get("DOCS_PATH"))
-retriever = TfidfRetriever(docs.chunks, k=app_setting.get("RETRIEVAL_RESULTS"))
+_registry_lock = threading.RLock()
 
-db = SQLiteClient(app_setting.get("DATABASE_PATH"))
+def setting(name, default=None):
+    """
+    Reads a setting from the environment, falling back to the `.env` file.
+    A variable set to an empty string in the environment overrides `.env`
+    and reads as unset.
+    """
+    value = os.environ[name] if name in os.environ else app_setting.get(name)
+    return value if value not in (None, "") else default
 
-ollama_llm = ChatOllama(
-    model=app_setting.get("OLLAMA_LLM_MODEL_ID"),
-    temperature=0,
-    num_ctx=1024,
-    seed=111
-)
+def setting_flag(name, default=False):
+    return str(setting(name, default)).lower() == "true"
 
-groq_llm = ChatGroq(
-    model=app_setting.get("GROQ_LLM_MODEL_ID"),
-    temperature=0,
-    max_tokens=1024,
-    api_key=app_setting.get("GROQ_API_KEY")
-)
+def lazy(factory):
+    """
+    Builds the wrapped resource on first use and returns the same instance afterwards.
+    """
+    instance = []
+
+    @wraps(factory)
+    def get():
+        if not instance:
+            with _registry_lock:
+                if not instance:
+                    instance.append(factory())
+        return instance[0]
+
+    get.is_built = lambda: bool(instance)
+    return get
+
+@lazy
+def get_retriever():
+    """
+    With DOCS_WATCH_INTERVAL (seconds) set, a `DocsWatcher` polls DOCS_PATH
+    and applies doc edits to the TF-IDF index while the process runs.
+    """
+    from agent.rag.retrieval import MarkdownLoaderAndSplitter, TfidfRetriever, DocsWatcher
+
+    watch_interval = float(setting("DOCS_WATCH_INTERVAL", 0))
+    if setting("RETRIEVER", "tfidf") == "hybrid":
+        from agent.rag.hybrid_retrieval import HybridRetriever, SentenceTransformerEmbedder
+
+        if watch_interval > 0:
+            logger.warning("DOCS_WATCH_INTERVAL is ignored: the hybrid retriever does not re-index docs")
+        return HybridRetriever(
+            MarkdownLoaderAndSplitter(setting("DOCS_PATH")).chunks,
+            embedder=SentenceTransformerEmbedder(setting("EMBEDDING_MODEL_ID", "sentence-transformers/all-MiniLM-L6-v2")),
+            k=int(setting("RETRIEVAL_RESULTS", 4)),
+            index_path=setting("RETRIEVAL_INDEX_PATH"),
+            ef_search=int(setting("ANN_EF_SEARCH", 64))
+        )
+
+    retriever = TfidfRetriever.from_directory(
+        setting("DOCS_PATH"),
+        index_dir=setting("RETRIEVAL_INDEX_PATH"),
+        k=int(setting("RETRIEVAL_RESULTS", 4))
+    )
+    if watch_interval > 0:
+        retriever.watcher = DocsWatcher(retriever, watch_interval).start()
+    return retriever
+
+@lazy
+def get_table_names():
+    """
+    Tables exposed to the agent: DATABASE_TABLES plus any materialized
+    analytics tables (see agent/tools/analytics_tables.py) built in the DB.
+    """
+    from agent.tools.analytics_tables import ANALYTICS_TABLES
+
+    table_names = setting("DATABASE_TABLES", "demo_orders,demo_order_details,demo_products").split(",")
+    if setting_flag("USE_ANALYTICS_TABLES", True):
+        table_names += [t for t in get_db().existing_tables(ANALYTICS_TABLES) if t not in table_names]
+    get_db().catalog.warm(table_names)
+    return table_names
+
+@lazy
+def get_db():
+    from agent.tools.sqlite_tool import SQLiteClient
+    from agent.tools.sql_cache import SQLResultCache
+
+    result_cache = None
+    if setting_flag("SQL_RESULT_CACHE", True):
+        result_cache = SQLResultCache(max_bytes=int(float(setting("SQL_RESULT_CACHE_MAX_MB", 32)) * 1024 * 1024))
+
+    db = SQLiteClient(
+        setting("DATABASE_PATH"),
+        pool_size=int(setting("DATABASE_POOL_SIZE", 4)),
+        in_memory=setting_flag("DATABASE_IN_MEMORY"),
+        schema_options={
+            "include_foreign_keys": setting_flag("SCHEMA_FOREIGN_KEYS"),
+            "include_row_counts": setting_flag("SCHEMA_ROW_COUNTS"),
+            "sample_values": int(setting("SCHEMA_SAMPLE_VALUES", 0)),
+        },
+        max_rows=int(setting("SQL_MAX_ROWS", 1000)),
+        max_bytes=int(setting("SQL_MAX_BYTES", 1_000_000)),
+        timeout=float(setting("SQL_TIMEOUT_S", 10)),
+        result_cache=result_cache
+    )
+    return db
+
+@lazy
+def get_sql_validator():
+    if not setting_flag("SQL_VALIDATION", True):
+        return None
+
+    from agent.tools.sql_validator import SQLValidator
+
+    return SQLValidator(
+        get_db(),
+        max_scan_rows=int(setting("SQL_MAX_SCAN_ROWS", 50_000_000)),
+        max_cartesian_rows=int(setting("SQL_MAX_CARTESIAN_ROWS", 100_000))
+    )
+
+@lazy
+def get_llm_cache():
+    if not setting("LLM_CACHE_PATH"):
+        return None
+
+    from helper.llm_cache import SQLiteLLMCache
+
+    return SQLiteLLMCache(
+        setting("LLM_CACHE_PATH"),
+        ttl=float(setting("LLM_CACHE_TTL")) if setting("LLM_CACHE_TTL") else None,
+        max_bytes=int(float(setting("LLM_CACHE_MAX_MB", 64)) * 1024 * 1024)
+    )
+
+@lazy
+def get_fast_router():
+    if not setting_flag("FAST_ROUTER", True):
+        return None
+
+    from agent.fast_router import FastRouter, ROUTER_LABELS
+
+    return FastRouter.from_labeled_files(
+        setting("ROUTER_LABELS_PATH", str(ROUTER_LABELS)).split(","),
+        threshold=float(setting("FAST_ROUTER_THRESHOLD", 0.8)),
+        shadow_rate=float(setting("FAST_ROUTER_SHADOW_RATE", 0))
+    )
+
+@lazy
+def get_constraint_resolver():
+    if not setting_flag("CONSTRAINT_RESOLVER", True):
+        return None
+
+    from agent.constraint_resolver import ConstraintResolver
+
+    return ConstraintResolver.from_directory(
+        setting("DOCS_PATH"),
+        fuzzy_threshold=float(setting("CONSTRAINT_FUZZY_THRESHOLD", 0.85))
+    )
+
+@lazy
+def get_tracer():
+    if not setting_flag("TRACING", True):
+        return None
+
+    from helper.tracing import Tracer
+
+    return Tracer(setting("TRACE_PATH"))
+
+@lazy
+def get_context_packer():
+    from agent.context_packer import ContextPacker
+
+    return ContextPacker(
+        budgets={
+            "planner": int(setting("PLANNER_CONTEXT_TOKENS", 500)),
+            "synthesizer": int(setting("SYNTH_CONTEXT_TOKENS", 600)),
+        },
+        max_rows=int(setting("SYNTH_MAX_ROWS", 20))
+    )
+
+@lazy
+def get_sql_templates():
+    if not setting_flag("SQL_TEMPLATES", True):
+        return None
+
+    from agent.sql_templates import SQLTemplateStore
+
+    return SQLTemplateStore(
+        setting("SQL_TEMPLATES_PATH"),
+        example_threshold=float(setting("SQL_TEMPLATE_EXAMPLE_SIMILARITY", 0.4)),
+        examples=int(setting("SQL_TEMPLATE_EXAMPLES", 2)),
+        max_entries=int(setting("SQL_TEMPLATES_MAX", 500))
+    )
+
+@lazy
+def get_retry_policy():
+    from agent.retry_policy import RetryPolicy
+
+    return RetryPolicy(
+        max_attempts=int(setting("SQL_MAX_ATTEMPTS", 3)),
+        max_repairs=int(setting("SQL_MAX_REPAIRS", 2)),
+        auto_repair=setting_flag("SQL_AUTO_REPAIR", True),
+        empty_is_terminal=setting_flag("SQL_EMPTY_IS_TERMINAL", True)
+    )
+
+def _http_limits():
+    import httpx
+
+    connections = int(setting("LLM_HTTP_MAX_CONNECTIONS", 8))
+    return httpx.Limits(max_connections=connections, max_keepalive_connections=connections)
+
+def _build_ollama_llm(model_setting="OLLAMA_LLM_MODEL_ID"):
+    from langchain_ollama import ChatOllama
+
+    return ChatOllama(
+        model=setting(model_setting) or setting("OLLAMA_LLM_MODEL_ID"),
+        base_url=setting("OLLAMA_BASE_URL"),
+        temperature=0,
+        num_ctx=1024,
+        seed=111,
+        client_kwargs={"limits": _http_limits()}
+    )
+
+def _build_groq_llm():
+    import httpx
+    from langchain_groq import ChatGroq
+
+    return ChatGroq(
+        model=setting("GROQ_LLM_MODEL_ID"),
+        temperature=0,
+        max_tokens=1024,
+        api_key=setting("GROQ_API_KEY"),
+        http_client=httpx.Client(limits=_http_limits())
+    )
+
+def _build_stub_llm():
+    from benchmarks.stub_llm import StubLLM, DEFAULT_RESPONSES
+
+    return StubLLM(
+        setting("STUB_LLM_RESPONSES", DEFAULT_RESPONSES),
+        latency_ms=float(setting("STUB_LLM_LATENCY_MS")) if setting("STUB_LLM_LATENCY_MS") else None
+    )
+
+def _parse_routes(value):
+    # "router=ollama_small|groq,nl_to_sql=groq|ollama" -> {"router": ["ollama_small", "groq"], ...}
+    routes = {}
+    for item in filter(None, (value or "").split(",")):
+        node, chain = item.split("=", 1)
+        routes[node.strip()] = [name.strip() for name in chain.split("|") if name.strip()]
+    return routes
+
+def _build_gateway():
+    """
+    `LLMGateway` over the backends named in `LLM_ROUTES` / `LLM_DEFAULT_ROUTE`.
+    Per-backend limits come from `LLM_<NAME>_MAX_CONCURRENCY`, `_RATE_PER_S`,
+    `_TIMEOUT_S` and `_COALESCE`.
+    """
+    from helper.llm_gateway import Backend, LLMGateway
+
+    routes = _parse_routes(setting("LLM_ROUTES"))
+    default_route = [n.strip() for n in setting("LLM_DEFAULT_ROUTE", "ollama").split("|")]
+
+    backends = {}
+    for name in dict.fromkeys(default_route + [n for chain in routes.values() for n in chain]):
+        if name == "gateway":
+            raise ValueError("LLM_ROUTES cannot route to the gateway itself")
+        prefix = f"LLM_{name.upper()}_"
+        backends[name] = Backend(
+            name,
+            get_llm(name),
+            max_concurrency=int(setting(prefix + "MAX_CONCURRENCY", 4)),
+            rate_per_s=float(setting(prefix + "RATE_PER_S")) if setting(prefix + "RATE_PER_S") else None,
+            timeout_s=float(setting(prefix + "TIMEOUT_S", 60)),
+            coalesce=setting_flag(prefix + "COALESCE", True)
+        )
+    return LLMGateway(backends, routes, default_route)
+
+LLM_FACTORIES = {
+    "ollama": _build_ollama_llm,
+    "ollama_small": lambda: _build_ollama_llm("OLLAMA_SMALL_LLM_MODEL_ID"),
+    "groq": _build_groq_llm,
+    "stub": _build_stub_llm,
+    "gateway": _build_gateway,
+}
+
+_llms = {}
+
+def get_llm(name=None):
+    """
+    Returns the chat model registered under `name` (default: `LLM_BACKEND`, then ollama),
+    building it on first use.
+    """
+    name = name or setting("LLM_BACKEND", "ollama")
+    if name not in LLM_FACTORIES:
+        raise ValueError(f"Unknown LLM backend '{name}', expected one of {sorted(LLM_FACTORIES)}")
+
+    if name not in _llms:
+        with _registry_lock:
+            if name not in _llms:
+                _llms[name] = LLM_FACTORIES[name]()
+    return _llms[name]
+
+get_llm.is_built = lambda name: name in _llms
+
+_LAZY_ATTRIBUTES = {
+    "retriever": get_retriever,
+    "db": get_db,
+    "llm_cache": get_llm_cache,
+    "table_names": get_table_names,
+    "fast_router": get_fast_router,
+    "ollama_llm": lambda: get_llm("ollama"),
+    "groq_llm": lambda: get_llm("groq"),
+}
+
+def __getattr__(name):
+    # Keeps `from helper.clients import db` working; the resource is built on access.
+    if name in _LAZY_ATTRIBUTES:
+        return _LAZY_ATTRIBUTES[name]()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
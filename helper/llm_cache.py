@@ -0,0 +1,139 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from abc import ABC, abstractmethod
+
+logger = logging.getLogger(__name__)
+
+class BaseLLMCache(ABC):
+    """
+    Interface for LLM response caches used by the graph nodes.
+
+    Subclasses implement `_get` / `_set`; hit and miss counting is shared.
+    """
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self._stats_lock = threading.Lock()
+
+    @staticmethod
+    def make_key(model_id, template, rendered, schema_name) -> str:
+        payload = json.dumps([model_id, template, rendered, schema_name], ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        value = self._get(key)
+        with self._stats_lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def set(self, key, value):
+        self._set(key, value)
+
+    def stats(self):
+        with self._stats_lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            }
+
+    @abstractmethod
+    def _get(self, key):
+        ...
+
+    @abstractmethod
+    def _set(self, key, value):
+        ...
+
+class SQLiteLLMCache(BaseLLMCache):
+    """
+    On-disk LLM response cache stored in a local SQLite file.
+
+    Entries older than `ttl` seconds are treated as misses, and once the
+    stored values exceed `max_bytes` the least recently used entries are
+    evicted. The stored size is summed once on open and then kept as a
+    running total, so writes by other processes sharing the file are only
+    seen on the next open.
+    """
+    def __init__(self, path, ttl=None, max_bytes=64 * 1024 * 1024):
+        super().__init__()
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode = WAL;")
+        self.conn.execute("PRAGMA synchronous = NORMAL;")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS llm_cache (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            );
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_accessed ON llm_cache (accessed_at);")
+        self.conn.commit()
+        self.total_bytes = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM llm_cache;").fetchone()[0]
+
+    def _get(self, key):
+        now = time.time()
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT value, size, created_at FROM llm_cache WHERE key = ?;", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            value, size, created_at = row
+            if self.ttl is not None and now - created_at > self.ttl:
+                self.conn.execute("DELETE FROM llm_cache WHERE key = ?;", (key,))
+                self.conn.commit()
+                self.total_bytes -= size
+                return None
+            self.conn.execute("UPDATE llm_cache SET accessed_at = ? WHERE key = ?;", (now, key))
+            self.conn.commit()
+        return value
+
+    def _set(self, key, value):
+        now = time.time()
+        size = len(value.encode("utf-8"))
+        with self._lock:
+            row = self.conn.execute("SELECT size FROM llm_cache WHERE key = ?;", (key,)).fetchone()
+            self.conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, value, size, created_at, accessed_at) VALUES (?, ?, ?, ?, ?);",
+                (key, value, size, now, now)
+            )
+            self.total_bytes += size - (row[0] if row else 0)
+            self._evict()
+            self.conn.commit()
+
+    def _evict(self):
+        if self.total_bytes <= self.max_bytes:
+            return
+
+        evicted = 0
+        for key, size in self.conn.execute(
+            "SELECT key, size FROM llm_cache ORDER BY accessed_at ASC;"
+        ).fetchall():
+            if self.total_bytes <= self.max_bytes:
+                break
+            self.conn.execute("DELETE FROM llm_cache WHERE key = ?;", (key,))
+            self.total_bytes -= size
+            evicted += 1
+        logger.info("LLM cache evicted %s entries", evicted)
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
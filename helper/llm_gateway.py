@@ -0,0 +1,232 @@
+import time
+import logging
+import threading
+import contextvars
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeout
+from contextlib import contextmanager
+from langchain_core.runnables import RunnableLambda
+
+from helper.tracing import span
+
+logger = logging.getLogger(__name__)
+
+# Graph node behind each structured-output schema, used for per-node routing.
+NODE_SCHEMAS = {
+    "RouterState": "router",
+    "ConstraintPlan": "planner",
+    "SQLGeneration": "nl_to_sql",
+    "SynthesizerOutput": "synthesizer",
+}
+
+def backend_model(llm) -> str:
+    name = getattr(llm, "model", None) or getattr(llm, "model_name", None)
+    return f"{type(llm).__name__}:{name}"
+
+class RateLimiter:
+    """
+    Token bucket: `rate` requests per second with bursts of up to `burst`.
+    """
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+class InFlight:
+    """
+    Merges identical concurrent requests: while a call for `key` is running,
+    later callers with the same key wait for its result instead of sending
+    their own request. Nothing is kept once the call returns.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def run(self, key, call):
+        """
+        Returns `(result, shared)`; `shared` is True when another caller's request produced it.
+        """
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+        if not leader:
+            return future.result(), True
+
+        try:
+            result = call()
+            future.set_result(result)
+            return result, False
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+class Backend:
+    """
+    One chat model behind the gateway, with its own concurrency limit,
+    request rate and timeout. With `coalesce`, identical prompts for the
+    same schema that are in flight together go out as one request (see
+    `InFlight`); only that request takes a concurrency slot and rate-limit
+    token.
+    """
+    def __init__(self, name, llm, max_concurrency=4, rate_per_s=None, timeout_s=60.0, coalesce=True):
+        self.name = name
+        self.llm = llm
+        self.max_concurrency = max_concurrency
+        self.timeout_s = timeout_s
+        self.coalesce = coalesce
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._rate = RateLimiter(rate_per_s) if rate_per_s else None
+        self._lock = threading.Lock()
+        self._runnables = {}
+        self._in_flight = InFlight()
+
+        self.calls = 0
+        self.requests = 0
+        self.coalesced = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.wait_time = 0.0
+
+    @contextmanager
+    def _slot(self):
+        started = time.perf_counter()
+        if self._rate is not None:
+            self._rate.acquire()
+        self._slots.acquire()
+        with self._lock:
+            self.wait_time += time.perf_counter() - started
+        try:
+            yield
+        finally:
+            self._slots.release()
+
+    def _runnable(self, schema):
+        with self._lock:
+            if schema not in self._runnables:
+                self._runnables[schema] = self.llm.with_structured_output(schema, include_raw=True)
+            return self._runnables[schema]
+
+    def _invoke_one(self, schema, prompt_value):
+        with self._slot():
+            with self._lock:
+                self.requests += 1
+            return self._runnable(schema).invoke(prompt_value)
+
+    def invoke(self, prompt_value, schema):
+        """
+        Returns the `include_raw` dict; unparseable output raises so the gateway can fall back.
+        """
+        with self._lock:
+            self.calls += 1
+        with span(f"llm_backend.{self.name}", kind="llm_backend"):
+            if self.coalesce:
+                key = (schema.__name__, prompt_value.to_string())
+                out, shared = self._in_flight.run(key, lambda: self._invoke_one(schema, prompt_value))
+                if shared:
+                    self.record("coalesced")
+            else:
+                out = self._invoke_one(schema, prompt_value)
+        if out.get("parsing_error") is not None:
+            raise out["parsing_error"]
+        if out.get("parsed") is None:
+            raise ValueError(f"{self.name} returned no {schema.__name__}")
+        return out
+
+    def record(self, counter):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "requests": self.requests,
+                "coalesced": self.coalesced,
+                "errors": self.errors,
+                "timeouts": self.timeouts,
+                "wait_time_s": round(self.wait_time, 4),
+            }
+
+class LLMGateway:
+    """
+    Chat-model facade over several backends, usable wherever a LangChain
+    chat model is (`with_structured_output(schema, include_raw=...)`).
+
+    Each call is routed by the graph node behind its schema to a chain of
+    backends (`routes`, else `default_route`). A backend that errors or
+    exceeds its `timeout_s` is skipped in favour of the next one; a timed-out
+    call keeps its concurrency slot until it actually returns.
+
+    `model` names the routes and every backend's model, so it changes (and
+    with it the LLM cache key) whenever either does. The `include_raw` output
+    carries the `backend` that answered and whether it was a `fallback`.
+    """
+    def __init__(self, backends, routes=None, default_route=None):
+        self.backends = backends
+        self.routes = routes or {}
+        self.default_route = default_route or list(backends)
+        self.model = ";".join([
+            ",".join(f"{node}={'|'.join(chain)}" for node, chain in sorted(self.routes.items())),
+            "default=" + "|".join(self.default_route),
+            ",".join(f"{name}={backend_model(backend.llm)}" for name, backend in sorted(backends.items())),
+        ])
+        self._executor = ThreadPoolExecutor(
+            max_workers=4 * sum(b.max_concurrency for b in backends.values()) + 4,
+            thread_name_prefix="llm-gateway",
+        )
+        self._lock = threading.Lock()
+        self.fallbacks = 0
+
+    def route(self, schema):
+        return self.routes.get(NODE_SCHEMAS.get(schema.__name__)) or self.default_route
+
+    def with_structured_output(self, schema, include_raw=False, **kwargs):
+        def run(prompt_value):
+            out = self._invoke(self.route(schema), schema, prompt_value)
+            return out if include_raw else out["parsed"]
+
+        return RunnableLambda(run)
+
+    def _invoke(self, chain, schema, prompt_value):
+        last_error = None
+        for position, name in enumerate(chain):
+            backend = self.backends[name]
+            future = self._executor.submit(contextvars.copy_context().run, backend.invoke, prompt_value, schema)
+            try:
+                out = future.result(timeout=backend.timeout_s)
+                if position:
+                    with self._lock:
+                        self.fallbacks += 1
+                return {**out, "backend": name, "fallback": position > 0}
+            except FutureTimeout:
+                backend.record("timeouts")
+                last_error = TimeoutError(f"LLM backend '{name}' timed out after {backend.timeout_s}s")
+            except Exception as e:
+                backend.record("errors")
+                last_error = e
+            logger.warning("LLM backend %s failed for %s: %s", name, schema.__name__, last_error)
+        raise last_error
+
+    def stats(self):
+        return {
+            "fallbacks": self.fallbacks,
+            "backends": {name: backend.stats() for name, backend in self.backends.items()},
+        }
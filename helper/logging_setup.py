@@ -0,0 +1,140 @@
+import os
+import copy
+import json
+import queue
+import atexit
+import logging
+import reprlib
+import threading
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+from helper.clients import setting
+
+# Attributes every LogRecord has; anything else came in through `extra=`.
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime", "taskName"}
+
+_setup_lock = threading.Lock()
+_listener = None
+_handler = None
+
+class _BoundedRepr(reprlib.Repr):
+    """
+    `reprlib` repr with limits on every container and string, so rendering a
+    result set costs the same whether it has 10 rows or 10 million.
+    """
+    def __init__(self, max_chars):
+        super().__init__()
+        self.maxstring = max_chars
+        self.maxother = max_chars
+        self.maxlist = self.maxtuple = self.maxset = self.maxfrozenset = self.maxdeque = 10
+        self.maxdict = 10
+        self.maxlevel = 3
+
+def bound(value, repr_):
+    if value is None or isinstance(value, (bool, int, float)):
+        return value
+    if isinstance(value, str):
+        return value if len(value) <= repr_.maxstring else value[:repr_.maxstring] + "..."
+    return repr_.repr(value)
+
+class BoundedQueueHandler(QueueHandler):
+    """
+    Hands records to the listener thread without blocking the caller.
+
+    The message arguments and `extra` fields are rendered with size limits
+    in the calling thread (the objects may change after the call returns);
+    formatting to JSON and file I/O happen on the listener thread. When the
+    queue is full the record is dropped and counted.
+    """
+    def __init__(self, log_queue, max_field_chars=500):
+        super().__init__(log_queue)
+        self.repr = _BoundedRepr(max_field_chars)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Other handlers may still read the original record.
+        record = copy.copy(record)
+        if record.args:
+            args = record.args if isinstance(record.args, tuple) else (record.args,)
+            try:
+                record.msg = str(record.msg) % tuple(bound(a, self.repr) for a in args)
+            except (TypeError, ValueError):
+                record.msg = f"{record.msg} {[bound(a, self.repr) for a in args]}"
+            record.args = None
+        record.msg = bound(str(record.msg), self.repr)
+
+        for key, value in list(vars(record).items()):
+            if key not in _RECORD_ATTRIBUTES:
+                setattr(record, key, bound(value, self.repr))
+
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+class JsonFormatter(logging.Formatter):
+    """
+    One JSON object per line: timestamp, level, logger, message, any `extra` fields and the traceback.
+    """
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        entry.update((key, value) for key, value in vars(record).items() if key not in _RECORD_ATTRIBUTES)
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+def setup_logging():
+    """
+    Routes all logging through a bounded queue to a JSON-lines file
+    (`LOG_PATH`). `LOG_LEVEL` sets the default level and `LOG_LEVELS`
+    per-logger overrides, e.g. `agent.tools.sqlite_tool=WARNING,httpx=WARNING`.
+    Safe to call more than once.
+    """
+    global _listener, _handler
+    with _setup_lock:
+        if _listener is not None:
+            return
+
+        path = setting("LOG_PATH", "logs/agentlog.log")
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        file_handler = logging.FileHandler(path, mode="a", encoding="utf-8")
+        file_handler.setFormatter(JsonFormatter())
+
+        log_queue = queue.Queue(maxsize=int(setting("LOG_QUEUE_SIZE", 10_000)))
+        root = logging.getLogger()
+        _handler = BoundedQueueHandler(log_queue, max_field_chars=int(setting("LOG_MAX_FIELD_CHARS", 500)))
+        root.addHandler(_handler)
+        root.setLevel(setting("LOG_LEVEL", "INFO").upper())
+
+        for item in filter(None, setting("LOG_LEVELS", "").split(",")):
+            name, level = item.split("=", 1)
+            logging.getLogger(name.strip()).setLevel(level.strip().upper())
+
+        _listener = QueueListener(log_queue, file_handler, respect_handler_level=True)
+        _listener.start()
+        atexit.register(stop_logging)
+
+def stop_logging():
+    """
+    Flushes queued records and stops the listener thread.
+    """
+    global _listener, _handler
+    with _setup_lock:
+        if _listener is not None:
+            logging.getLogger().removeHandler(_handler)
+            _listener.stop()
+            for handler in _listener.handlers:
+                handler.close()
+            _listener, _handler = None, None
@@ -0,0 +1,171 @@
+import os
+import json
+import math
+import time
+import threading
+import contextvars
+from collections import deque
+from contextlib import contextmanager
+
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+class Span:
+    """
+    One timed operation. `to_dict` follows the OpenTelemetry span data model
+    (hex trace/span ids, unix-nano timestamps, attributes, status).
+    """
+    def __init__(self, tracer, name, trace_id, parent_id=None, attributes=None):
+        self.tracer = tracer
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.attributes = dict(attributes or {})
+        self.status = "OK"
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self._started = time.perf_counter()
+        self.duration_ms = None
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def finish(self):
+        self.duration_ms = (time.perf_counter() - self._started) * 1000
+        self.end_ns = self.start_ns + int(self.duration_ms * 1e6)
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_span_id": self.parent_id,
+            "start_time_unix_nano": self.start_ns,
+            "end_time_unix_nano": self.end_ns,
+            "attributes": self.attributes,
+            "status": {"code": self.status},
+        }
+
+class _NoopSpan:
+    def set(self, **attributes):
+        pass
+
+NOOP_SPAN = _NoopSpan()
+
+def percentile(values, p):
+    """
+    Nearest-rank percentile of `values` (0 < p <= 100).
+    """
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+def latency_stats(values):
+    return {
+        "count": len(values),
+        "p50_ms": round(percentile(values, 50), 2),
+        "p95_ms": round(percentile(values, 95), 2),
+        "max_ms": round(max(values), 2),
+    }
+
+class Tracer:
+    """
+    Records spans for agent runs, graph nodes and LLM/DB calls.
+
+    Finished spans are appended to `path` as JSON lines (when set) and kept
+    in memory, up to `max_spans`, for the latency summary.
+    """
+    def __init__(self, path=None, max_spans=100_000):
+        self.path = path
+        self._lock = threading.Lock()
+        self._records = deque(maxlen=max_spans)
+        self._file = None
+        if path:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            self._file = open(path, "a", encoding="utf-8")
+
+    @contextmanager
+    def span(self, name, parent=None, **attributes):
+        """
+        Times the enclosed block. Without an explicit `parent` the span nests
+        under the current span of this context, or starts a new trace.
+        """
+        parent = parent or _current_span.get()
+        span = Span(
+            self,
+            name,
+            parent.trace_id if parent else os.urandom(16).hex(),
+            parent.span_id if parent else None,
+            attributes,
+        )
+        token = _current_span.set(span)
+        try:
+            yield span
+        except Exception as e:
+            span.status = "ERROR"
+            span.set(error=f"{type(e).__name__}: {str(e)[:200]}")
+            raise
+        finally:
+            _current_span.reset(token)
+            span.finish()
+            self._export(span)
+
+    def _export(self, span):
+        with self._lock:
+            self._records.append((span.trace_id, span.name, span.duration_ms, span.attributes))
+            if self._file is not None:
+                self._file.write(json.dumps(span.to_dict(), ensure_ascii=False, default=str) + "\n")
+                self._file.flush()
+
+    def summary(self):
+        """
+        p50/p95 latency per span name and per route (routes come from the
+        root `agent` span of each trace), plus LLM token, cache and retry totals.
+        """
+        with self._lock:
+            records = list(self._records)
+
+        route_of = {trace_id: attrs.get("route") for trace_id, name, _, attrs in records if name == "agent"}
+        by_name, by_route = {}, {}
+        llm = {"calls": 0, "cache_hits": 0, "prompt_tokens": 0, "completion_tokens": 0}
+        retries = 0
+        for trace_id, name, duration_ms, attrs in records:
+            if name == "agent":
+                by_route.setdefault(attrs.get("route"), {}).setdefault("total", []).append(duration_ms)
+                retries += max(attrs.get("attempt_count", 0) - 1, 0)
+                continue
+            by_name.setdefault(name, []).append(duration_ms)
+            if trace_id in route_of:
+                by_route.setdefault(route_of[trace_id], {}).setdefault(name, []).append(duration_ms)
+            if attrs.get("kind") == "llm":
+                llm["calls"] += 1
+                llm["cache_hits"] += bool(attrs.get("cache_hit"))
+                llm["prompt_tokens"] += attrs.get("prompt_tokens", 0)
+                llm["completion_tokens"] += attrs.get("completion_tokens", 0)
+
+        return {
+            "spans": {name: latency_stats(values) for name, values in by_name.items()},
+            "routes": {
+                route: {name: latency_stats(values) for name, values in names.items()}
+                for route, names in by_route.items()
+            },
+            "llm": llm,
+            "sql_retries": retries,
+        }
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+@contextmanager
+def span(name, **attributes):
+    """
+    Child span of the current span; a no-op outside a traced run.
+    """
+    parent = _current_span.get()
+    if parent is None:
+        yield NOOP_SPAN
+        return
+    with parent.tracer.span(name, parent=parent, **attributes) as child:
+        yield child
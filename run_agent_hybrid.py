@@ -3,9 +3,10 @@ import sys
 import json
 import argparse
 
-from typing import List, Dict, Any, Iterator
+from typing import List, Dict, Any, Iterator, Set
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
-from agent.graph_hybrid import invoke_agent
+from helper.clients import LLM_FACTORIES, get_llm, get_db, get_llm_cache, get_fast_router, get_constraint_resolver, get_sql_templates, get_retry_policy, get_tracer
 
 
 def main():
@@ -18,6 +19,10 @@ def main():
     mode_group = parser.add_mutually_exclusive_group(required=True)
     mode_group.add_argument('--batch', type=str, help='Process input in batch mode with input file name')
     parser.add_argument('--out', type=str, required=True, help='Output file path')
+    parser.add_argument('--workers', type=int, default=1, help='Number of questions processed concurrently (default: 1)')
+    parser.add_argument('--resume', action='store_true', help='Skip ids already answered in the output file (failed ones run again)')
+    parser.add_argument('--llm', type=str, choices=sorted(LLM_FACTORIES), default=None, help='LLM backend (default: LLM_BACKEND setting, then ollama)')
+    parser.add_argument('--progress', action='store_true', help='Print each step of every question as it happens')
 
     args = parser.parse_args()
     
@@ -29,7 +34,11 @@ def main():
         print(f"Running in BATCH mode")
         print(f"Input file: {input_file}")
     
+    if args.workers < 1:
+        parser.error("--workers must be >= 1")
+
     print(f"Output path: {args.out}")
+    print(f"Workers: {args.workers}")
     process_agent(args)
 
 def read_jsonl_file(file_path: str) -> List[Dict[str, Any]]:
@@ -89,31 +98,181 @@ def save_jsonl_file(data: List[Dict[str, Any]], file_path: str, mode: str = 'w')
                 raise ValueError(f"All items must be dictionaries. Found: {type(item)}")
             file.write(json.dumps(item, ensure_ascii=False) + '\n')
 
+def load_completed_ids(file_path: str) -> Set[str]:
+    """
+    Collect the ids already answered in a (possibly partial) JSONL output file.
+
+    A trailing line cut short by an interrupted run is dropped by rewriting
+    the file with the records that parse, so results appended afterwards
+    start on a line of their own. Error results (see `run_record`) are not
+    counted as completed, so their records are processed again.
+
+    Args:
+        file_path (str): Path to the JSONL output file
+
+    Returns:
+        Set[str]: Ids of the records that are already complete
+    """
+    if not os.path.exists(file_path):
+        return set()
+
+    records, truncated = [], False
+    with open(file_path, 'r', encoding='utf-8') as file:
+        for line in file:
+            truncated = truncated or not line.endswith('\n')
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError:
+                truncated = True
+
+    if truncated:
+        print(f"Rewriting {file_path} without its unfinished lines")
+        tmp_path = file_path + ".tmp"
+        save_jsonl_file(records, tmp_path)
+        os.replace(tmp_path, file_path)
+    return {item.get("id") for item in records if "error" not in item}
+
+def sort_jsonl_file(file_path: str, order: List[str]) -> None:
+    """
+    Rewrite a JSONL output file so its records follow the input order.
+
+    Records are de-duplicated by id (last one wins) and ids missing from
+    `order` are kept at the end.
+
+    Args:
+        file_path (str): Path to the JSONL output file
+        order (List[str]): Record ids in input order
+    """
+    by_id = {}
+    with open(file_path, 'r', encoding='utf-8') as file:
+        for line in file:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                item = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            by_id[item.get("id")] = item
+
+    position = {record_id: idx for idx, record_id in enumerate(order)}
+    results = sorted(by_id.values(), key=lambda item: position.get(item.get("id"), len(position)))
+
+    tmp_path = file_path + ".tmp"
+    save_jsonl_file(results, tmp_path)
+    os.replace(tmp_path, file_path)
+
+def describe_event(event: Dict[str, Any]) -> str:
+    """
+    One-line progress summary of a streamed agent event.
+    """
+    name = event["event"]
+    if name == "route":
+        return f"route={event['route']}"
+    if name == "docs":
+        return f"docs={len(event['citations'])}"
+    if name == "sql":
+        return f"sql ({event.get('source')})"
+    if name == "rows":
+        return f"rows={event['rows_kept']}" + ("+" if event.get("truncated") else "") + (f" error={event['error']}" if event.get("error") else "")
+    if name == "retry":
+        return f"retry {event['action']} ({event['cause']})"
+    return name
+
+def run_record(record: Dict[str, Any], llm: str = None, progress: bool = False) -> Dict[str, Any]:
+    """
+    Run the agent on a single input record, turning failures into an error
+    result (marked with an `error` key, so `--resume` runs it again).
+    With `progress`, the run is streamed and each step is printed as it happens.
+    """
+    from agent.graph_hybrid import invoke_agent, stream_agent
+
+    try:
+        if not progress:
+            return invoke_agent(record.get("id"), record.get("question"), record.get("format_hint"), llm=llm)
+        for event in stream_agent(record.get("id"), record.get("question"), record.get("format_hint"), llm=llm):
+            if event["event"] == "final":
+                return event["output"]
+            if event["event"] != "token":
+                print(f"  {record.get('id')}: {describe_event(event)}")
+        raise RuntimeError("the run ended without a final answer")
+    except Exception as e:
+        print(f"Error during processing {record.get('id')}: {e}")
+        return {"id": record.get("id"), "final_answer": str(e), "error": str(e)}
+
+def print_trace_summary(summary: Dict[str, Any]) -> None:
+    """
+    Print the tracer's p50/p95 latency per span and per route as plain tables.
+
+    Args:
+        summary (Dict[str, Any]): Output of `Tracer.summary()`
+    """
+    def table(title, stats):
+        print(f"\n{title}")
+        print(f"  {'span':<28}{'count':>7}{'p50 ms':>12}{'p95 ms':>12}")
+        for name, row in sorted(stats.items(), key=lambda item: -item[1]["p95_ms"]):
+            print(f"  {name:<28}{row['count']:>7}{row['p50_ms']:>12.2f}{row['p95_ms']:>12.2f}")
+
+    table("Latency per span", summary["spans"])
+    for route, stats in sorted(summary["routes"].items(), key=lambda item: str(item[0])):
+        table(f"Latency for route '{route}'", stats)
+    print(f"\nLLM: {summary['llm']}, SQL retries: {summary['sql_retries']}")
+
 def process_agent(args):
     """
-    Process the agent based on the provided arguments
+    Process the agent based on the provided arguments.
+
+    Records run on a pool of `args.workers` threads; each result is appended
+    to `args.out` as soon as it is ready, and the file is re-sorted into
+    input order once the batch is done.
     """
     print(f"Processing batch from {args.batch}")
+    data = []
     try:
         data = read_jsonl_file(args.batch)
-        results = []
-        for record in data:
-            try:
-                result = invoke_agent(record.get("id"), record.get("question"), record.get("format_hint"))
-            except Exception as e:
-                print(f"Error during processing: {e}")
-                result = {"id": record.get("id"), "final_answer": str(e)}
-            
-            results.append(result)
+
+        completed = load_completed_ids(args.out) if args.resume else set()
+        if not args.resume:
+            save_jsonl_file([], args.out)
+        pending = [record for record in data if record.get("id") not in completed]
+        print(f"Skipping {len(data) - len(pending)} completed records, {len(pending)} to go")
+
+        with ThreadPoolExecutor(max_workers=args.workers) as executor:
+            futures = {executor.submit(run_record, record, args.llm, args.progress): record for record in pending}
+            for done, future in enumerate(as_completed(futures), 1):
+                result = future.result()
+                save_jsonl_file([result], args.out, mode='a')
+                print(f"[{done}/{len(pending)}] {result.get('id')}")
 
     except Exception as e:
         print(f"Error during processing: {e}")
 
     finally:
-        save_jsonl_file(results, args.out)
+        if os.path.exists(args.out):
+            sort_jsonl_file(args.out, [record.get("id") for record in data])
+        if get_db.is_built():
+            print(f"SQLite pool: {get_db().pool_stats()}")
+            print(f"SQL result cache: {get_db().cache_stats()}")
+        if get_llm_cache.is_built() and get_llm_cache() is not None:
+            print(f"LLM cache: {get_llm_cache().stats()}")
+        if get_fast_router.is_built() and get_fast_router() is not None:
+            print(f"Fast router: {get_fast_router().stats()}")
+        if get_constraint_resolver.is_built() and get_constraint_resolver() is not None:
+            print(f"Constraint resolver: {get_constraint_resolver().stats()}")
+        if get_sql_templates.is_built() and get_sql_templates() is not None:
+            print(f"SQL templates: {get_sql_templates().stats()}")
+        if get_retry_policy.is_built():
+            print(f"SQL retries: {get_retry_policy().stats()}")
+        if get_llm.is_built("gateway"):
+            print(f"LLM gateway: {get_llm('gateway').stats()}")
+        if get_tracer.is_built() and get_tracer() is not None:
+            print_trace_summary(get_tracer().summary())
+            get_tracer().close()
         print("Processing completed successfully!")
         sys.exit(1)
 
 if __name__ == '__main__':
     main()
-
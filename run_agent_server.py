@@ -0,0 +1,33 @@
+import argparse
+
+from helper.clients import LLM_FACTORIES, setting
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Serve the hybrid agent over HTTP with warm clients',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog='''Examples:
+  python run_agent_server.py --port 8000
+  curl -s localhost:8000/invoke -d '{"id": "q1", "question": "...", "format_hint": "int"}'
+  curl -sN localhost:8000/batch --data-binary @sample_questions_hybrid_eval.jsonl'''
+    )
+    parser.add_argument('--host', type=str, default=setting("SERVER_HOST", "127.0.0.1"))
+    parser.add_argument('--port', type=int, default=int(setting("SERVER_PORT", 8000)))
+    parser.add_argument('--llm', type=str, choices=sorted(LLM_FACTORIES), default=None, help='LLM backend (default: LLM_BACKEND setting, then ollama)')
+    parser.add_argument('--max-queue', type=int, default=int(setting("SERVER_MAX_QUEUE", 64)), help='Distinct questions admitted at once; /invoke answers 503 beyond this')
+    parser.add_argument('--max-concurrency', type=int, default=int(setting("SERVER_MAX_CONCURRENCY", 8)), help='Graph runs executing at once')
+    args = parser.parse_args()
+
+    try:
+        import uvicorn
+    except ImportError:
+        raise SystemExit("The agent server needs an ASGI server: pip install uvicorn")
+
+    from agent.server import create_app
+
+    app = create_app(args.llm, max_queue=args.max_queue, max_concurrency=args.max_concurrency)
+    uvicorn.run(app, host=args.host, port=args.port, lifespan="on", log_config=None)
+
+if __name__ == '__main__':
+    main()
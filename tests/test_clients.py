@@ -0,0 +1,14 @@
+from helper import clients
+
+def test_environment_overrides_env_file(monkeypatch):
+    monkeypatch.setitem(clients.app_setting, "LLM_CACHE_PATH", ".cache/llm.sqlite")
+    assert clients.setting("LLM_CACHE_PATH") == ".cache/llm.sqlite"
+
+    monkeypatch.setenv("LLM_CACHE_PATH", "/tmp/other.sqlite")
+    assert clients.setting("LLM_CACHE_PATH") == "/tmp/other.sqlite"
+
+def test_empty_environment_variable_unsets_env_file_value(monkeypatch):
+    monkeypatch.setitem(clients.app_setting, "LLM_CACHE_PATH", ".cache/llm.sqlite")
+    monkeypatch.setenv("LLM_CACHE_PATH", "")
+    assert clients.setting("LLM_CACHE_PATH") is None
+    assert clients.setting("LLM_CACHE_PATH", "default") == "default"
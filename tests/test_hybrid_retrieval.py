@@ -0,0 +1,76 @@
+import hashlib
+
+import numpy as np
+import pytest
+from langchain_core.documents import Document
+
+pytest.importorskip("faiss")
+
+from agent.rag.hybrid_retrieval import BM25Index, HybridRetriever
+
+class HashEmbedder:
+    """
+    Bag-of-words embeddings hashed into a few dimensions; stands in for a sentence-transformers model.
+    """
+    model_name = "hash-embedder"
+    dim = 16
+
+    def __init__(self):
+        self.calls = 0
+
+    def encode(self, texts):
+        self.calls += 1
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for word in text.lower().split():
+                vectors[row, int(hashlib.md5(word.encode()).hexdigest(), 16) % self.dim] += 1
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.where(norms == 0, 1, norms)
+
+DOCS = [
+    Document(page_content="Beverages can be returned within 14 days if unopened", metadata={"source": "product_policy.md", "chunk_id": 0}),
+    Document(page_content="Summer Beverages 1997 ran from June to August", metadata={"source": "marketing_calendar.md", "chunk_id": 0}),
+    Document(page_content="Average order value is revenue divided by the number of orders", metadata={"source": "kpi_definitions.md", "chunk_id": 0}),
+    Document(page_content="Gross margin is revenue minus the cost of goods", metadata={"source": "kpi_definitions.md", "chunk_id": 1}),
+]
+
+def test_bm25_scores_matching_chunk_highest():
+    scores = BM25Index([d.page_content for d in DOCS]).scores(["returned within days"])
+    assert scores.shape == (1, len(DOCS))
+    assert scores[0].argmax() == 0
+    assert scores[0][2] == 0
+
+def test_query_fuses_both_rankers():
+    retriever = HybridRetriever(DOCS, HashEmbedder(), k=2, candidates=4)
+    results = retriever.query("can unopened beverages be returned within 14 days")
+
+    assert len(results) == 2
+    assert results[0].metadata["source"] == "product_policy.md"
+    assert all(0 < r.score <= 1 for r in results)
+    assert results[0].score >= results[1].score
+
+def test_query_batch_matches_query():
+    retriever = HybridRetriever(DOCS, HashEmbedder(), k=3, candidates=4)
+    questions = ["average order value", "summer campaign dates"]
+    batch = retriever.query_batch(questions)
+
+    for question, results in zip(questions, batch):
+        single = retriever.query(question)
+        assert [(r.metadata["source"], r.metadata["chunk_id"], r.score) for r in results] == \
+               [(r.metadata["source"], r.metadata["chunk_id"], r.score) for r in single]
+
+def test_saved_dense_index_is_reused(tmp_path):
+    HybridRetriever(DOCS, HashEmbedder(), k=2, index_path=str(tmp_path))
+    assert (tmp_path / "dense.faiss").exists()
+
+    embedder = HashEmbedder()
+    retriever = HybridRetriever(DOCS, embedder, k=2, index_path=str(tmp_path))
+    assert embedder.calls == 0
+    assert retriever.query("gross margin")[0].metadata["chunk_id"] == 1
+
+def test_changed_docs_rebuild_dense_index(tmp_path):
+    HybridRetriever(DOCS, HashEmbedder(), k=2, index_path=str(tmp_path))
+
+    embedder = HashEmbedder()
+    HybridRetriever(DOCS[:3], embedder, k=2, index_path=str(tmp_path))
+    assert embedder.calls == 1
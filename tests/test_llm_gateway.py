@@ -0,0 +1,65 @@
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from langchain_core.messages import AIMessage
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.runnables import RunnableLambda
+from pydantic import BaseModel
+
+from helper.llm_gateway import Backend, LLMGateway
+
+class Answer(BaseModel):
+    text: str
+
+PROMPT = ChatPromptTemplate.from_messages([("human", "{question}")])
+
+class SlowLLM:
+    """
+    Chat model stand-in that counts the requests it receives.
+    """
+    model = "slow"
+
+    def __init__(self, latency_s=0.3):
+        self.latency_s = latency_s
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    def with_structured_output(self, schema, include_raw=False):
+        def run(prompt_value):
+            with self._lock:
+                self.requests += 1
+            time.sleep(self.latency_s)
+            return {"raw": AIMessage(content=""), "parsed": schema(text=prompt_value.to_string()), "parsing_error": None}
+
+        return RunnableLambda(run)
+
+def ask(gateway, questions):
+    chain = PROMPT | gateway.with_structured_output(Answer, include_raw=True)
+    with ThreadPoolExecutor(max_workers=len(questions)) as pool:
+        return list(pool.map(lambda q: chain.invoke({"question": q}), questions))
+
+def test_identical_prompts_in_flight_share_one_request():
+    llm = SlowLLM()
+    gateway = LLMGateway({"slow": Backend("slow", llm, max_concurrency=8)})
+    outs = ask(gateway, ["same question"] * 6 + ["other question"] * 2)
+
+    assert llm.requests == 2
+    assert [o["parsed"].text for o in outs] == ["Human: same question"] * 6 + ["Human: other question"] * 2
+    stats = gateway.stats()["backends"]["slow"]
+    assert (stats["calls"], stats["requests"], stats["coalesced"]) == (8, 2, 6)
+
+def test_without_coalescing_every_prompt_is_a_request():
+    llm = SlowLLM(latency_s=0.05)
+    gateway = LLMGateway({"slow": Backend("slow", llm, max_concurrency=8, coalesce=False)})
+    ask(gateway, ["same question"] * 4)
+
+    assert llm.requests == 4
+
+def test_finished_requests_are_not_reused():
+    llm = SlowLLM(latency_s=0)
+    gateway = LLMGateway({"slow": Backend("slow", llm)})
+    ask(gateway, ["same question"])
+    ask(gateway, ["same question"])
+
+    assert llm.requests == 2
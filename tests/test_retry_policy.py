@@ -0,0 +1,46 @@
+from agent.retry_policy import RetryPolicy, rewrite_table_names, TABLE_ALIASES
+
+TABLES = ["demo_orders", "demo_order_details", "demo_products", "fact_order_lines"]
+
+def test_base_table_becomes_allowed_view():
+    sql = 'SELECT SUM("Order Details".Quantity) FROM "Order Details" JOIN Orders o ON o.OrderID = "Order Details".OrderID'
+    assert rewrite_table_names(sql, TABLE_ALIASES, TABLES) == (
+        "SELECT SUM(demo_order_details.Quantity) FROM demo_order_details "
+        "JOIN demo_orders AS o ON o.OrderID = demo_order_details.OrderID"
+    )
+
+def test_string_literals_are_not_rewritten():
+    sql = "SELECT COUNT(*) FROM Order Details WHERE Notes = 'Order Details from Orders'"
+    assert rewrite_table_names(sql, TABLE_ALIASES, TABLES) == (
+        "SELECT COUNT(*) FROM demo_order_details WHERE Notes = 'Order Details from Orders'"
+    )
+
+def test_allowed_name_with_spaces_is_only_quoted():
+    sql = "SELECT * FROM Order Details"
+    assert rewrite_table_names(sql, TABLE_ALIASES, ["Order Details"]) == 'SELECT * FROM "Order Details"'
+
+def test_name_not_allowed_is_left_alone():
+    sql = 'SELECT * FROM "Order Details"'
+    assert rewrite_table_names(sql, TABLE_ALIASES, ["demo_orders"]) == sql
+
+def test_unknown_table_is_repaired_without_the_llm():
+    state = {
+        "sql_query": 'SELECT SUM(Quantity) FROM "Order Details"',
+        "sql_result": {"error": "Validation error: Unknown table 'Order Details'"},
+        "table_names": TABLES,
+        "attempt_count": 1,
+    }
+    decision = RetryPolicy().decide(state)
+
+    assert decision.action == "repair"
+    assert decision.repair == "rewrite_table_names"
+    assert decision.sql == "SELECT SUM(Quantity) FROM demo_order_details"
+
+def test_unrepairable_table_goes_back_to_the_llm():
+    state = {
+        "sql_query": 'SELECT SUM(Quantity) FROM "Order Details"',
+        "sql_result": {"error": "Validation error: Unknown table 'Order Details'"},
+        "table_names": ["demo_orders"],
+        "attempt_count": 1,
+    }
+    assert RetryPolicy().decide(state).action == "retry"
@@ -0,0 +1,17 @@
+import agent.graph_hybrid
+from run_agent_hybrid import run_record
+
+RECORD = {"id": "q1", "question": "How many orders?", "format_hint": "int"}
+
+def test_stream_without_final_event_returns_error_record(monkeypatch):
+    monkeypatch.setattr(agent.graph_hybrid, "stream_agent", lambda *args, **kwargs: iter([{"event": "route", "route": "sql"}]))
+    result = run_record(RECORD, progress=True)
+
+    assert result["id"] == "q1"
+    assert "final answer" in result["error"]
+    assert result["final_answer"] == result["error"]
+
+def test_stream_final_event_is_the_result(monkeypatch):
+    output = {"id": "q1", "final_answer": 830}
+    monkeypatch.setattr(agent.graph_hybrid, "stream_agent", lambda *args, **kwargs: iter([{"event": "final", "output": output}]))
+    assert run_record(RECORD, progress=True) == output
@@ -0,0 +1,46 @@
+import json
+import asyncio
+
+import pytest
+
+from agent.server import AgentApp
+
+class EchoService:
+    """
+    Answers every question with itself; stands in for `AgentService`.
+    """
+    warm = True
+
+    async def submit(self, id, question, format_hint=None, wait=False):
+        return {"id": id, "final_answer": question}
+
+def call(path, body):
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": body.encode("utf-8"), "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {"type": "http", "method": "POST", "path": path}
+    asyncio.run(AgentApp(EchoService())(scope, receive, send))
+    status = messages[0]["status"]
+    return status, b"".join(m.get("body", b"") for m in messages[1:]).decode("utf-8")
+
+@pytest.mark.parametrize("body", ['[1, 2]', '"x"', '{"id": "q1"}', 'not json'])
+def test_invoke_rejects_bad_bodies(body):
+    status, text = call("/invoke", body)
+    assert status == 400
+    assert "invalid request" in json.loads(text)["error"]
+
+@pytest.mark.parametrize("body", ['[1, 2]', '"x"', '{"id": "q1", "question": "a"}\n"x"'])
+def test_batch_rejects_non_object_records_before_streaming(body):
+    status, text = call("/batch", body)
+    assert status == 400
+    assert "JSON object" in json.loads(text)["error"]
+
+def test_batch_streams_one_line_per_record():
+    status, text = call("/batch", '{"id": "q1", "question": "a"}\n{"id": "q2", "question": "b"}')
+    assert status == 200
+    assert sorted(json.loads(line)["id"] for line in text.splitlines()) == ["q1", "q2"]
@@ -0,0 +1,101 @@
+import json
+
+from agent.sql_templates import SQLTemplateStore, unverified_reason
+
+SUMMER = {"date_ranges": [["1997-06-01", "1997-06-30"]], "categories": [], "kpis": []}
+WINTER = {"date_ranges": [["1997-12-01", "1997-12-31"]], "categories": [], "kpis": []}
+CATEGORY_HINT = "{category:str, quantity:int}"
+TOP_HINT = "list[{product:str, revenue:float}]"
+
+DURING_SQL = (
+    "SELECT category, SUM(quantity) AS quantity FROM fact_order_lines "
+    "WHERE order_date BETWEEN '1997-06-01' AND '1997-06-30' GROUP BY category ORDER BY quantity DESC LIMIT 1"
+)
+PRODUCTS_SQL = (
+    "SELECT product, SUM(revenue) AS revenue FROM fact_order_lines "
+    "GROUP BY product ORDER BY revenue DESC LIMIT 3"
+)
+
+def store_with(question, constraints, sql, columns, rows, format_hint):
+    store = SQLTemplateStore()
+    assert store.add(question, constraints, sql, columns, rows, format_hint)
+    return store
+
+def test_same_question_with_other_parameters_reuses_sql():
+    store = store_with(
+        "Which category had the highest total quantity sold during 'Summer Beverages 1997' dates?",
+        SUMMER, DURING_SQL, ["category", "quantity"], [("Beverages", 10)], CATEGORY_HINT
+    )
+    match = store.match(
+        "Which category had the highest total quantity sold during 'Winter Classics 1997' dates?",
+        WINTER, CATEGORY_HINT
+    )
+
+    assert match.sql == DURING_SQL.replace("1997-06-01", "1997-12-01").replace("1997-06-30", "1997-12-31")
+    assert store.stats()["reused"] == 1
+
+def test_excluding_does_not_reuse_during_sql():
+    store = store_with(
+        "Which category had the highest total quantity sold during 'Summer Beverages 1997' dates?",
+        SUMMER, DURING_SQL, ["category", "quantity"], [("Beverages", 10)], CATEGORY_HINT
+    )
+    match = store.match(
+        "Which category had the highest total quantity sold excluding 'Summer Beverages 1997' dates?",
+        SUMMER, CATEGORY_HINT
+    )
+
+    assert match.score > 0.9
+    assert match.sql is None
+    assert [e["sql"] for e in match.examples] == [DURING_SQL]
+
+def test_customers_do_not_reuse_products_sql():
+    store = store_with(
+        "Top 3 products by total revenue", {}, PRODUCTS_SQL,
+        ["product", "revenue"], [("A", 3.0), ("B", 2.0), ("C", 1.0)], TOP_HINT
+    )
+    match = store.match("Top 3 customers by total revenue", {}, TOP_HINT)
+
+    assert match.sql is None
+    assert match.examples
+
+def test_other_format_hint_does_not_reuse_sql():
+    store = store_with(
+        "Top 3 products by total revenue", {}, PRODUCTS_SQL,
+        ["product", "revenue"], [("A", 3.0), ("B", 2.0), ("C", 1.0)], TOP_HINT
+    )
+    assert store.match("Top 3 products by total revenue", {}, "list[{product:str}]").sql is None
+
+def test_rows_alone_do_not_verify_sql():
+    columns, rows = ["category", "quantity"], [("Beverages", 10)]
+
+    assert unverified_reason(DURING_SQL, SUMMER, columns, rows, CATEGORY_HINT) is None
+    assert "filters" in unverified_reason(DURING_SQL, WINTER, columns, rows, CATEGORY_HINT)
+    assert "columns" in unverified_reason(DURING_SQL, SUMMER, ["category"], [("Beverages",)], CATEGORY_HINT)
+    assert "rows" in unverified_reason(DURING_SQL, SUMMER, columns, rows * 2, CATEGORY_HINT)
+    assert "top 3" in unverified_reason(PRODUCTS_SQL, {}, ["product", "revenue"], [("A", 1.0)] * 5, TOP_HINT, ["3"])
+
+def test_unverified_sql_is_not_added():
+    store = SQLTemplateStore()
+    added = store.add(
+        "Which category had the highest total quantity sold during 'Winter Classics 1997' dates?",
+        WINTER, DURING_SQL, ["category", "quantity"], [("Beverages", 10)], CATEGORY_HINT
+    )
+
+    assert not added
+    assert store.stats()["templates"] == 0
+    assert store.stats()["rejected"] == 1
+
+def test_file_is_compacted_to_kept_entries(tmp_path):
+    path = tmp_path / "templates.jsonl"
+    store = SQLTemplateStore(str(path), max_entries=2)
+    for n in (3, 4, 5):
+        assert store.add(f"Top {n} products by total revenue", {}, PRODUCTS_SQL.replace("LIMIT 3", f"LIMIT {n}"),
+                         ["product", "revenue"], [("A", 1.0)], TOP_HINT)
+
+    lines = path.read_text(encoding="utf-8").splitlines()
+    assert [json.loads(line)["question"] for line in lines] == ["Top 4 products by total revenue", "Top 5 products by total revenue"]
+    assert "params" not in json.loads(lines[0])
+
+    reloaded = SQLTemplateStore(str(path), max_entries=1)
+    assert [e["question"] for e in reloaded.entries] == ["Top 5 products by total revenue"]
+    assert len(path.read_text(encoding="utf-8").splitlines()) == 1
@@ -0,0 +1,39 @@
+import sqlite3
+
+import pytest
+
+from agent.tools.sqlite_tool import SQLiteClient
+from agent.tools.sql_validator import SQLValidator
+
+TABLES = ["orders", "order_lines"]
+
+@pytest.fixture(scope="module")
+def validator(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("db") / "shop.db")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE orders (OrderID INTEGER PRIMARY KEY, CustomerID TEXT, Freight REAL)")
+    conn.execute("CREATE TABLE order_lines (OrderID INTEGER, ProductID INTEGER, Quantity INTEGER)")
+    conn.executemany("INSERT INTO orders VALUES (?, ?, ?)", [(i, f"C{i % 50}", i % 7) for i in range(1000)])
+    conn.executemany("INSERT INTO order_lines VALUES (?, ?, ?)", [(i % 1000, i % 77, 1) for i in range(5000)])
+    conn.commit()
+    conn.close()
+    # Scanning both tables in one nested loop would be 5M rows; each alone is far below the limit.
+    return SQLValidator(SQLiteClient(path, pool_size=1), max_scan_rows=100_000, max_cartesian_rows=10_000_000)
+
+def test_scalar_subquery_adds_its_scan(validator):
+    result = validator.validate(
+        "SELECT ProductID, SUM(Quantity) * 1.0 / (SELECT COUNT(*) FROM orders) FROM order_lines GROUP BY ProductID",
+        TABLES
+    )
+    assert result.ok, result.error
+    assert result.estimated_rows < 10_000
+
+def test_union_arms_add_up(validator):
+    result = validator.validate("SELECT OrderID FROM orders UNION SELECT OrderID FROM order_lines", TABLES)
+    assert result.ok, result.error
+    assert result.estimated_rows < 10_000
+
+def test_nested_loop_scans_multiply(validator):
+    result = validator.validate("SELECT COUNT(*) FROM orders o, order_lines l WHERE o.Freight > l.Quantity", TABLES)
+    assert not result.ok
+    assert "scans" in result.error
@@ -0,0 +1,34 @@
+from langchain_core.messages import AIMessageChunk
+
+from agent.streaming import RunEvents
+
+ANSWER = '{"final_answer": "14 days", "explanation": "From the product policy."}'
+PIECES = [ANSWER[:20], ANSWER[20:35], ANSWER[35:]]
+
+def tokens(chunks, node="Synthesizer"):
+    events = RunEvents()
+    out = []
+    for chunk in chunks:
+        out += list(events.feed("messages", (chunk, {"langgraph_node": node})))
+    return out
+
+def joined(events, field):
+    return "".join(e["text"] for e in events if e["field"] == field)
+
+def test_text_chunks_become_tokens():
+    events = tokens([AIMessageChunk(content=piece) for piece in PIECES])
+
+    assert joined(events, "final_answer") == "14 days"
+    assert joined(events, "explanation") == "From the product policy."
+
+def test_tool_call_chunks_become_tokens():
+    chunks = [AIMessageChunk(content="", tool_call_chunks=[
+        {"name": "SynthesizerOutput" if i == 0 else None, "args": piece, "id": None, "index": 0}
+    ]) for i, piece in enumerate(PIECES)]
+    events = tokens(chunks)
+
+    assert joined(events, "final_answer") == "14 days"
+    assert joined(events, "explanation") == "From the product policy."
+
+def test_other_nodes_send_no_tokens():
+    assert tokens([AIMessageChunk(content=ANSWER)], node="nl_to_sql") == []